@@ -0,0 +1,810 @@
+"""
+This script creates several PDF expense reports for ÉTS clubs in one run. The
+report template is read and parsed only once. Every YAML file in the given
+directory or matching the given glob pattern produces one report named after
+it. A summary of the successes and failures is printed at the end.
+
+The reports can be filled in parallel by several processes. Each process
+receives the parsed template once when it starts.
+
+With --cache, the reports are also saved in a cache directory under the hash
+of their inputs. A report whose template, YAML file, existing report and flags
+have not changed is copied from the cache rather than generated again.
+
+With --pipeline, reading the YAML files, filling the reports and writing them
+overlap. Slow storage then delays the filling of the next reports only when the
+pipeline's bounded queues are full.
+
+With --watch, the script keeps the template loaded after the first batch and
+regenerates the reports whose YAML file or existing report changes. A change
+to the template regenerates every report.
+
+With -c, all the reports are written in one PDF document instead. Their pages
+share the template's fonts and images, and the fields of each report are
+renamed with the YAML file's stem as a prefix.
+"""
+
+
+from argparse import ArgumentParser
+from glob import glob
+from io import BytesIO
+from os import cpu_count
+from pathlib import Path
+from sys import exit
+
+from fill_expense_report import\
+	check_template_path,\
+	make_filled_reader,\
+	make_radio_btn_groups,\
+	make_report_base,\
+	write_report
+from memory_guard import\
+	add_memory_args,\
+	limit_memory,\
+	peak_memory_report
+from path_arg_checks import check_ungenerable_path, plan_io_paths
+from stage_timings import\
+	add_instrumentation_args,\
+	enable_timings,\
+	instrumented_run,\
+	pop_stage_records,\
+	record_stages,\
+	timed_stage,\
+	timings_enabled
+
+
+_DFLT_CACHE_SIZE_MB = 500
+_DFLT_QUEUE_SIZE = 4
+
+_DFLT_TEMPLATE_PATH = Path(__file__).parents[0]/"rapport_depenses.pdf"
+
+_EXTENSION_PDF = ".pdf"
+_EXTENSION_YML = ".yml"
+
+_BYTES_PER_MB = 1 << 20
+
+# The number of reports that the pipeline writes at the same time
+_PIPELINE_WRITER_COUNT = 4
+
+# A YAML file's stem can contain these characters, but a field name cannot.
+_FIELD_NAME_SEPARATOR = "."
+
+# The arguments shared by all the tasks of a worker process
+_worker_args = None
+
+
+def add_report_from_files(combined_writer, template, radio_btn_groups,
+		yml_data_path, pdf_data_dir, combined_path, editable):
+	"""
+	Fills a report from a YAML file and, if it exists, the report with the
+	same stem in pdf_data_dir, then adds it to a combined document. The
+	report's fields are renamed with the YAML file's stem as a prefix.
+	Exceptions are not raised but returned so that one bad file does not stop
+	a batch.
+
+	Args:
+		combined_writer (CombinedReportWriter): the writer of the combined
+			document
+		template (ReportTemplate): the loaded report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_path (pathlib.Path): the path to the YAML field setting file
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		combined_path (pathlib.Path): the path to the combined document
+		editable (bool): If True, the report's fields can be modified.
+
+	Returns:
+		tuple: the YAML file's path, the combined document's path and an
+			error message. The error message is None if the report was added.
+	"""
+	try:
+		_, field_values = make_report_base(template, yml_data_path,
+			_find_pdf_data_path(yml_data_path, pdf_data_dir),
+			radio_btn_groups, False)
+		reader = make_filled_reader(
+			template, field_values, radio_btn_groups, editable)
+
+		with timed_stage("writing"):
+			combined_writer.add_report(reader, yml_data_path.stem.replace(
+				_FIELD_NAME_SEPARATOR, "_"))
+
+	except Exception as e:
+		return yml_data_path, combined_path, type(e).__name__ + ": " + str(e)
+
+	return yml_data_path, combined_path, None
+
+
+def _find_pdf_data_path(yml_data_path, pdf_data_dir):
+	from jazal import make_altered_name
+
+	if pdf_data_dir is None:
+		return None
+
+	pdf_data_path = pdf_data_dir/make_altered_name(
+		yml_data_path, extension=_EXTENSION_PDF)
+
+	return pdf_data_path if pdf_data_path.is_file() else None
+
+
+def _find_watched_paths(yml_data_arg, pdf_data_dir, template_path,
+		output_dir):
+	# The YAML files are searched again so that new files are watched. The
+	# reports created by this script are not watched.
+	yml_data_paths = _find_yml_files(yml_data_arg)
+	watched_paths = [template_path]
+	watched_paths.extend(yml_data_paths)
+
+	if pdf_data_dir is not None:
+		output_paths = {_make_output_path(yml_data_path, output_dir)
+			for yml_data_path in yml_data_paths}
+		watched_paths.extend(pdf_data_path for pdf_data_path
+			in pdf_data_dir.glob("*" + _EXTENSION_PDF)
+			if pdf_data_path not in output_paths)
+
+	return watched_paths
+
+
+def _find_yml_files(yml_data_arg):
+	yml_data_path = Path(yml_data_arg)
+
+	if yml_data_path.is_dir():
+		yml_paths = yml_data_path.glob("*" + _EXTENSION_YML)
+	else:
+		yml_paths = (Path(match) for match in glob(yml_data_arg))
+
+	return sorted(yml_paths)
+
+
+def fill_batch(template, radio_btn_groups, yml_data_paths, pdf_data_dir,
+		output_dir, combined_path, output_cache, editable, incremental, jobs,
+		queue_size):
+	"""
+	Creates the reports of the given YAML files in the way requested by the
+	script's arguments: in one combined document, through the cache, in a
+	pipeline, in parallel or one after the other.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_paths (list): the paths to the YAML field setting files
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		output_dir (pathlib.Path): the directory where the reports are created
+		combined_path (pathlib.Path): the path to the combined document. If it
+			is None, each report is written in its own file.
+		output_cache (OutputCache): the cache of the reports. It can be None.
+		editable (bool): If True, the created reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates.
+		jobs (int): the number of worker processes
+		queue_size (int): the capacity of the pipeline's queues. If it is
+			None, the reports are not created in a pipeline.
+
+	Returns:
+		list: the tuples returned by function fill_report_from_files or
+			add_report_from_files, in the order of yml_data_paths
+	"""
+	if combined_path is not None:
+		from combined_report import CombinedReportWriter
+
+		with combined_path.open(mode="wb") as combined_stream:
+			with timed_stage("writing"):
+				combined_writer = CombinedReportWriter(
+					template, combined_stream)
+
+			results = [add_report_from_files(combined_writer, template,
+					radio_btn_groups, yml_data_path, pdf_data_dir,
+					combined_path, editable)
+				for yml_data_path in yml_data_paths]
+
+			with timed_stage("writing"):
+				combined_writer.finish()
+
+		return results
+
+	if output_cache is not None:
+		return fill_reports_with_cache(output_cache, template,
+			radio_btn_groups, yml_data_paths, pdf_data_dir, output_dir,
+			editable, incremental, jobs, queue_size)
+
+	if queue_size is not None:
+		return fill_reports_in_pipeline(template, radio_btn_groups,
+			yml_data_paths, pdf_data_dir, output_dir, editable, incremental,
+			jobs, queue_size)
+
+	if jobs > 1 and len(yml_data_paths) > 1:
+		return fill_reports_in_parallel(template, radio_btn_groups,
+			yml_data_paths, pdf_data_dir, output_dir, editable, incremental,
+			min(jobs, len(yml_data_paths)))
+
+	return [fill_report_from_files(template, radio_btn_groups, yml_data_path,
+			pdf_data_dir, output_dir, editable, incremental)
+		for yml_data_path in yml_data_paths]
+
+
+def fill_report_from_files(template, radio_btn_groups, yml_data_path,
+		pdf_data_dir, output_dir, editable, incremental):
+	"""
+	Creates one report from a YAML file and, if it exists, the report with the
+	same stem in pdf_data_dir. Exceptions are not raised but returned so that
+	one bad file does not stop a batch.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_path (pathlib.Path): the path to the YAML field setting file
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		output_dir (pathlib.Path): the directory where the report is created
+		editable (bool): If True, the created report can be modified.
+		incremental (bool): If True, the report is written as an incremental
+			update of the template or of the existing report.
+
+	Returns:
+		tuple: the YAML file's path, the output path and an error message.
+			The error message is None if the report was created.
+	"""
+	output_path = _make_output_path(yml_data_path, output_dir)
+
+	try:
+		base, field_values = make_report_base(template, yml_data_path,
+			_find_pdf_data_path(yml_data_path, pdf_data_dir),
+			radio_btn_groups, incremental)
+
+		with output_path.open(mode="wb") as output_stream:
+			write_report(base, field_values, radio_btn_groups,
+				editable, incremental, output_stream)
+
+	except Exception as e:
+		return yml_data_path, output_path, type(e).__name__ + ": " + str(e)
+
+	return yml_data_path, output_path, None
+
+
+def _fill_report_from_text(template, radio_btn_groups, yml_text,
+		pdf_data_path, editable, incremental):
+	try:
+		base, field_values = make_report_base(template, yml_text,
+			pdf_data_path, radio_btn_groups, incremental)
+
+		report_stream = BytesIO()
+		write_report(base, field_values, radio_btn_groups, editable,
+			incremental, report_stream)
+
+	except Exception as e:
+		return None, type(e).__name__ + ": " + str(e)
+
+	return report_stream.getvalue(), None
+
+
+def _fill_report_from_text_in_worker(yml_text, pdf_data_path):
+	template, radio_btn_groups, _, _, editable, incremental = _worker_args
+	result = _fill_report_from_text(template, radio_btn_groups, yml_text,
+		pdf_data_path, editable, incremental)
+	return result, pop_stage_records()
+
+
+def fill_reports_in_parallel(template, radio_btn_groups, yml_data_paths,
+		pdf_data_dir, output_dir, editable, incremental, jobs):
+	"""
+	Creates one report for each YAML file with a pool of worker processes.
+	Every worker receives the template when it starts rather than once per
+	report. The results are in the same order as yml_data_paths. If the
+	timings are enabled, the stages measured by the workers are added to
+	this process's records.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_paths (list): the paths to the YAML field setting files
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		output_dir (pathlib.Path): the directory where the reports are created
+		editable (bool): If True, the created reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates.
+		jobs (int): the number of worker processes
+
+	Returns:
+		list: the tuples returned by function fill_report_from_files
+	"""
+	from multiprocessing import Pool
+
+	worker_args = (template, radio_btn_groups, pdf_data_dir, output_dir,
+		editable, incremental, timings_enabled())
+
+	with Pool(jobs, _init_worker, worker_args) as pool:
+		worker_results = pool.map(
+			_fill_report_in_worker, yml_data_paths, chunksize=1)
+
+	results = list()
+
+	for result, stage_records in worker_results:
+		results.append(result)
+		record_stages(stage_records)
+
+	return results
+
+
+def fill_reports_in_pipeline(template, radio_btn_groups, yml_data_paths,
+		pdf_data_dir, output_dir, editable, incremental, jobs, queue_size):
+	"""
+	Creates one report for each YAML file in a pipeline of three stages that
+	run at the same time: reading the YAML files, filling the reports and
+	writing them. The stages are coroutines of an asyncio event loop
+	connected by queues that hold queue_size reports at most, so the memory
+	used does not depend on the number of reports. Threads read and write the
+	files. The reports are filled by a pool of worker processes if jobs is
+	greater than 1 or by one thread otherwise. Slow storage therefore delays
+	the filling only when the queues are full.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_paths (list): the paths to the YAML field setting files
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		output_dir (pathlib.Path): the directory where the reports are created
+		editable (bool): If True, the created reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates.
+		jobs (int): the number of worker processes
+		queue_size (int): the capacity of the queues between the stages
+
+	Returns:
+		list: the tuples returned by function fill_report_from_files, in the
+			order of yml_data_paths
+	"""
+	from asyncio import run
+
+	return run(_run_pipeline(template, radio_btn_groups, yml_data_paths,
+		pdf_data_dir, output_dir, editable, incremental, jobs, queue_size))
+
+
+def fill_reports_with_cache(output_cache, template, radio_btn_groups,
+		yml_data_paths, pdf_data_dir, output_dir, editable, incremental,
+		jobs, queue_size):
+	"""
+	Copies the reports whose inputs are in the cache, then creates the others
+	and stores them in the cache. The reports are created by function
+	fill_reports_in_pipeline if queue_size is not None or by function
+	fill_reports_in_parallel if jobs is greater than 1.
+
+	Args:
+		output_cache (OutputCache): the cache of the reports
+		template (ReportTemplate): the loaded report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_paths (list): the paths to the YAML field setting files
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		output_dir (pathlib.Path): the directory where the reports are created
+		editable (bool): If True, the created reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates.
+		jobs (int): the number of worker processes
+		queue_size (int): the capacity of the pipeline's queues. It can be
+			None.
+
+	Returns:
+		list: the tuples returned by function fill_report_from_files, in the
+			order of yml_data_paths
+	"""
+	from output_cache import make_cache_key
+
+	# It maps the YAML files' paths to their result.
+	results = dict()
+	cache_keys = dict()
+
+	with timed_stage("cache"):
+		for yml_data_path in yml_data_paths:
+			output_path = _make_output_path(yml_data_path, output_dir)
+
+			try:
+				cache_key = make_cache_key(template, yml_data_path,
+					_find_pdf_data_path(yml_data_path, pdf_data_dir),
+					editable, incremental)
+
+			except OSError:
+				# The report's creation will report the error.
+				continue
+
+			if output_cache.fetch(cache_key, output_path):
+				results[yml_data_path] = (yml_data_path, output_path, None)
+			else:
+				cache_keys[yml_data_path] = cache_key
+
+	missing_paths = [yml_data_path for yml_data_path in yml_data_paths
+		if yml_data_path not in results]
+
+	if queue_size is not None:
+		new_results = fill_reports_in_pipeline(template, radio_btn_groups,
+			missing_paths, pdf_data_dir, output_dir, editable, incremental,
+			jobs, queue_size)
+
+	elif jobs > 1 and len(missing_paths) > 1:
+		new_results = fill_reports_in_parallel(template, radio_btn_groups,
+			missing_paths, pdf_data_dir, output_dir, editable, incremental,
+			min(jobs, len(missing_paths)))
+
+	else:
+		new_results = [fill_report_from_files(template, radio_btn_groups,
+				yml_data_path, pdf_data_dir, output_dir, editable,
+				incremental)
+			for yml_data_path in missing_paths]
+
+	with timed_stage("cache"):
+		for yml_data_path, output_path, error_msg in new_results:
+			results[yml_data_path] = (yml_data_path, output_path, error_msg)
+
+			if error_msg is None and yml_data_path in cache_keys:
+				output_cache.store(cache_keys[yml_data_path], output_path)
+
+	return [results[yml_data_path] for yml_data_path in yml_data_paths]
+
+
+def _fill_report_in_worker(yml_data_path):
+	template, radio_btn_groups, pdf_data_dir, output_dir, editable,\
+		incremental = _worker_args
+	result = fill_report_from_files(template, radio_btn_groups,
+		yml_data_path, pdf_data_dir, output_dir, editable, incremental)
+	return result, pop_stage_records()
+
+
+def _init_worker(*worker_args):
+	global _worker_args
+	_worker_args = worker_args[:-1]
+
+	if worker_args[-1]:
+		enable_timings()
+
+
+def _make_output_path(yml_data_path, output_dir):
+	from jazal import make_altered_name
+
+	return output_dir/make_altered_name(
+		yml_data_path, extension=_EXTENSION_PDF)
+
+
+def _make_parser():
+	parser = ArgumentParser(description=__doc__)
+
+	parser.add_argument("-c", "--combined", type=Path, default=None,
+		help="Path to a PDF file where all the reports are written instead of one file per report. -i, -j and -o are then ignored.")
+
+	parser.add_argument("--cache", type=Path, default=None,
+		help="Directory where the reports are cached. The reports whose inputs did not change are copied from it. It is not used with -c.")
+
+	parser.add_argument("--cache_size", type=int,
+		default=_DFLT_CACHE_SIZE_MB,
+		help="Maximum size of the cache in megabytes. The least recently used reports are deleted when it is exceeded. It defaults to "
+			+ str(_DFLT_CACHE_SIZE_MB) + ".")
+
+	parser.add_argument("-e", "--editable", action="store_true",
+		help="Makes the filled reports editable. Without this flag, the fields of incremental (-i) and combined (-c) reports are made read-only.")
+
+	parser.add_argument("-i", "--incremental", action="store_true",
+		help="Writes each report as the template, or its -p report, followed by an incremental update containing the filled fields.")
+
+	parser.add_argument("-j", "--jobs", type=int, default=1,
+		help="Number of processes that fill reports in parallel. 0 means one per processor. It defaults to 1.")
+
+	parser.add_argument("-o", "--output", type=Path, default=Path.cwd(),
+		help="Directory where the reports are created. It defaults to the current working directory.")
+
+	parser.add_argument("-p", "--pdf_data", type=Path, default=None,
+		help="Directory containing existing reports. A report bearing the stem of a YAML file provides field values for that file.")
+
+	parser.add_argument("--pipeline", action="store_true",
+		help="Reads the YAML files, fills the reports and writes them at the same time. It is not used with -c.")
+
+	parser.add_argument("--queue_size", type=int, default=_DFLT_QUEUE_SIZE,
+		help="Maximum number of reports waiting between two stages of the pipeline. It defaults to "
+			+ str(_DFLT_QUEUE_SIZE) + ".")
+
+	parser.add_argument("-t", "--template", type=Path,
+		default=_DFLT_TEMPLATE_PATH,
+		help="Path to the report template. It must be a PDF file.")
+
+	parser.add_argument("--watch", action="store_true",
+		help="After the first batch, keeps the template loaded and regenerates the reports whose YAML file, -p report or template changes until Ctrl+C is pressed.")
+
+	parser.add_argument("-y", "--yml_data", type=str, required=True,
+		help="Directory containing .yml field setting files or a glob pattern matching them")
+
+	add_instrumentation_args(parser)
+	add_memory_args(parser)
+
+	return parser
+
+
+def print_summary(results):
+	"""
+	Prints the outcome of each report of a batch and the number of successes
+	and failures.
+
+	Args:
+		results: tuples returned by function fill_report_from_files
+	"""
+	failure_count = 0
+
+	for yml_data_path, output_path, error_msg in results:
+		if error_msg is None:
+			print("OK " + str(yml_data_path) + " -> " + str(output_path))
+
+		else:
+			failure_count += 1
+			print("FAILED " + str(yml_data_path) + ": " + error_msg)
+
+	print(str(len(results) - failure_count) + " report(s) created, "
+		+ str(failure_count) + " failure(s)")
+
+
+def _read_pipeline_input(yml_data_path, pdf_data_dir):
+	yml_text = yml_data_path.read_text(encoding="utf8")
+	return yml_text, _find_pdf_data_path(yml_data_path, pdf_data_dir)
+
+
+async def _run_pipeline(template, radio_btn_groups, yml_data_paths,
+		pdf_data_dir, output_dir, editable, incremental, jobs, queue_size):
+	from asyncio import Queue, gather, get_running_loop, to_thread
+	from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+	loop = get_running_loop()
+	fill_queue = Queue(queue_size)
+	write_queue = Queue(queue_size)
+	filler_count = min(jobs, max(len(yml_data_paths), 1))
+	results = [None] * len(yml_data_paths)
+
+	if filler_count > 1:
+		executor = ProcessPoolExecutor(filler_count, initializer=_init_worker,
+			initargs=(template, radio_btn_groups, pdf_data_dir, output_dir,
+				editable, incremental, timings_enabled()))
+	else:
+		executor = ThreadPoolExecutor(1)
+
+	async def read_inputs():
+		for index, yml_data_path in enumerate(yml_data_paths):
+			output_path = _make_output_path(yml_data_path, output_dir)
+
+			try:
+				yml_text, pdf_data_path = await to_thread(
+					_read_pipeline_input, yml_data_path, pdf_data_dir)
+
+			except Exception as e:
+				results[index] = (yml_data_path, output_path,
+					type(e).__name__ + ": " + str(e))
+				continue
+
+			await fill_queue.put(
+				(index, yml_data_path, output_path, yml_text, pdf_data_path))
+
+		for _ in range(filler_count):
+			await fill_queue.put(None)
+
+	async def fill_reports():
+		while (task := await fill_queue.get()) is not None:
+			index, yml_data_path, output_path, yml_text, pdf_data_path = task
+
+			if filler_count > 1:
+				(report, error_msg), stage_records\
+					= await loop.run_in_executor(executor,
+						_fill_report_from_text_in_worker, yml_text,
+						pdf_data_path)
+				record_stages(stage_records)
+
+			else:
+				report, error_msg = await loop.run_in_executor(executor,
+					_fill_report_from_text, template, radio_btn_groups,
+					yml_text, pdf_data_path, editable, incremental)
+
+			if error_msg is None:
+				await write_queue.put(
+					(index, yml_data_path, output_path, report))
+			else:
+				results[index] = (yml_data_path, output_path, error_msg)
+
+	async def fill_all_reports():
+		await gather(*(fill_reports() for _ in range(filler_count)))
+
+		for _ in range(_PIPELINE_WRITER_COUNT):
+			await write_queue.put(None)
+
+	async def write_reports():
+		while (task := await write_queue.get()) is not None:
+			index, yml_data_path, output_path, report = task
+
+			try:
+				await to_thread(output_path.write_bytes, report)
+
+			except Exception as e:
+				results[index] = (yml_data_path, output_path,
+					type(e).__name__ + ": " + str(e))
+				continue
+
+			results[index] = (yml_data_path, output_path, None)
+
+	with executor:
+		await gather(read_inputs(), fill_all_reports(),
+			*(write_reports() for _ in range(_PIPELINE_WRITER_COUNT)))
+
+	return results
+
+
+def watch_inputs(template, template_path, radio_btn_groups, yml_data_arg,
+		pdf_data_dir, output_dir, combined_path, output_cache, editable,
+		incremental, jobs, queue_size):
+	"""
+	Regenerates reports whenever their inputs change until the user presses
+	Ctrl+C. A burst of changes causes one regeneration. A changed YAML file or
+	existing report regenerates only its report, while a changed template is
+	loaded again and regenerates every report. A combined document is always
+	written again completely. The summary of each regeneration is printed.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		template_path (pathlib.Path): the path to the report template
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		yml_data_arg (str): the directory containing the YAML files or a glob
+			pattern matching them
+		pdf_data_dir (pathlib.Path): the directory that contains existing
+			reports. It can be None.
+		output_dir (pathlib.Path): the directory where the reports are created
+		combined_path (pathlib.Path): the path to the combined document. If it
+			is None, each report is written in its own file.
+		output_cache (OutputCache): the cache of the reports. It can be None.
+		editable (bool): If True, the created reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates.
+		jobs (int): the number of worker processes
+		queue_size (int): the capacity of the pipeline's queues. If it is
+			None, the reports are not created in a pipeline.
+	"""
+	from file_watcher import FileWatcher
+	from report_template import ReportTemplate
+
+	watcher = FileWatcher(lambda: _find_watched_paths(
+		yml_data_arg, pdf_data_dir, template_path, output_dir))
+	print("Watching for changes. Press Ctrl+C to stop.")
+
+	try:
+		while True:
+			changed_paths = watcher.wait_for_changes()
+			yml_data_paths = _find_yml_files(yml_data_arg)
+
+			if template_path in changed_paths:
+				try:
+					with timed_stage("template_load"):
+						template = ReportTemplate(template_path)
+
+				except Exception as e:
+					print("ERROR! The template cannot be loaded. "
+						+ type(e).__name__ + ": " + str(e))
+					continue
+
+			elif combined_path is None:
+				yml_data_paths = [yml_data_path
+					for yml_data_path in yml_data_paths
+					if yml_data_path in changed_paths
+					or _find_pdf_data_path(yml_data_path, pdf_data_dir)
+					in changed_paths]
+
+			if len(yml_data_paths) == 0:
+				continue
+
+			results = fill_batch(template, radio_btn_groups, yml_data_paths,
+				pdf_data_dir, output_dir, combined_path, output_cache,
+				editable, incremental, jobs, queue_size)
+			print_summary(results)
+
+			if output_cache is not None:
+				print(output_cache.format_stats())
+
+	except KeyboardInterrupt:
+		print("Stopped watching.")
+
+
+if __name__ == "__main__":
+	parser = _make_parser()
+	args = parser.parse_args()
+	combined_path = args.combined # -c
+	output_dir = args.output # -o
+	pdf_data_dir = args.pdf_data # -p
+	template_path = args.template # -t
+
+	jobs = args.jobs # -j
+	if jobs < 0:
+		print("ERROR! -j/--jobs cannot be negative.")
+		exit(1)
+	elif jobs == 0:
+		jobs = cpu_count()
+
+	if args.cache_size < 0:
+		print("ERROR! --cache_size cannot be negative.")
+		exit(1)
+
+	queue_size = None
+	if args.pipeline:
+		queue_size = args.queue_size
+		if queue_size < 1:
+			print("ERROR! --queue_size must be at least 1.")
+			exit(1)
+
+	output_cache = None
+
+	if args.max_memory is not None:
+		try:
+			limit_memory(args.max_memory)
+		except ValueError as e:
+			print("ERROR! " + str(e))
+			exit(1)
+
+	with peak_memory_report(args.peak_memory),\
+			instrumented_run(args.timings, args.profile):
+		with timed_stage("path_checks"):
+			if pdf_data_dir is not None and not pdf_data_dir.is_dir():
+				print("ERROR! -p/--pdf_data must be a directory.")
+				exit(1)
+
+			if combined_path is not None:
+				check_ungenerable_path(combined_path, "-c/--combined",
+					_EXTENSION_PDF, must_exist=False)
+
+			check_template_path(template_path)
+
+			yml_data_paths = _find_yml_files(args.yml_data)
+			if len(yml_data_paths) == 0:
+				print("ERROR! No YAML file matches " + args.yml_data + ".")
+				exit(1)
+
+			if combined_path is None:
+				output_dir.mkdir(parents=True, exist_ok=True)
+
+				# YAML files of different directories can have the same name.
+				# The files' extension is checked when they are read.
+				_, error_msgs = plan_io_paths(
+					((yml_data_path, output_dir)
+						for yml_data_path in yml_data_paths),
+					"-y/--yml_data", None, "-o/--output", _EXTENSION_PDF, None)
+
+				for error_msg in error_msgs:
+					print("ERROR! " + error_msg)
+
+				if len(error_msgs) > 0:
+					exit(1)
+
+		from report_template import ReportTemplate
+
+		with timed_stage("template_load"):
+			template = ReportTemplate(template_path)
+
+		radio_btn_groups = make_radio_btn_groups()
+
+		if combined_path is None and args.cache is not None:
+			from output_cache import OutputCache
+
+			output_cache = OutputCache(
+				args.cache, args.cache_size * _BYTES_PER_MB)
+
+		results = fill_batch(template, radio_btn_groups, yml_data_paths,
+			pdf_data_dir, output_dir, combined_path, output_cache,
+			args.editable, args.incremental, jobs, queue_size)
+		print_summary(results)
+
+		if output_cache is not None:
+			print(output_cache.format_stats())
+
+		if args.watch:
+			watch_inputs(template, template_path, radio_btn_groups,
+				args.yml_data, pdf_data_dir, output_dir, combined_path,
+				output_cache, args.editable, args.incremental, jobs,
+				queue_size)
+
+	if not args.watch and any(result[2] is not None for result in results):
+		exit(1)
@@ -0,0 +1,412 @@
+"""
+This script measures the duration and the memory use of each stage of the
+creation of an expense report. Every stage runs separately over all the YAML
+files in directory field_setting or over the sample reports in this
+repository's directory. The median and 95th percentile of the durations and
+the peak memory allocated by each stage are printed in JSON.
+
+The startup of the scripts is measured too. The import time of the main
+modules is reported by the interpreter's option -X importtime. The duration of
+a run that only prints the help is measured as well.
+
+If a baseline file made by an earlier run is provided, the result is compared
+with it. The script exits with status 1 if a stage's median duration exceeds
+the baseline's by more than the tolerance.
+"""
+
+
+from argparse import ArgumentParser
+from gc import collect
+from io import BytesIO
+from json import dump, load
+from math import ceil
+from pathlib import Path
+from platform import python_version
+from statistics import median
+from subprocess import DEVNULL, PIPE, run
+from sys import executable, exit, stdout
+from time import perf_counter
+from tracemalloc import\
+	get_traced_memory,\
+	start as start_tracing,\
+	stop as stop_tracing
+
+from field_setting_parser import\
+	clear_yaml_cache,\
+	get_yaml_content,\
+	parse_yaml_content
+from fill_expense_report import\
+	get_fields_from_pdf,\
+	make_radio_btn_groups,\
+	set_automatic_field_vals
+from PyPDF2 import __version__ as _PYPDF2_VERSION
+from PyPDF2_Fields import update_page_fields
+from report_template import ReportTemplate
+import yaml
+
+
+_REPO_DIR = Path(__file__).parents[0]
+
+_DFLT_FIELD_SETTING_DIR = _REPO_DIR/"field_setting"
+_DFLT_TEMPLATE_PATH = _REPO_DIR/"rapport_depenses.pdf"
+
+# Sample reports, including the template, whose fields are read
+_SAMPLE_PDF_PATTERN = "rapport_depenses*.pdf"
+
+_EXTENSION_YML = ".yml"
+
+_STAGE_YAML_READING = "get_yaml_content"
+_STAGE_YAML_CACHED_READING = "get_yaml_content (cached)"
+_STAGE_YAML_PARSING = "parse_yaml_content"
+_STAGE_TEMPLATE_LOAD = "template_load"
+_STAGE_PDF_FIELDS = "get_fields_from_pdf"
+_STAGE_FIELD_UPDATE = "update_page_fields"
+_STAGE_INDEXED_FIELD_UPDATE = "FieldIndex.update_fields"
+_STAGE_SKELETON_WRITING = "WriterSkeleton.write"
+_STAGE_WRITING = "writer.write"
+
+# The YAML loaders compared by the benchmark. CSafeLoader is only available if
+# PyYAML was built with libyaml.
+_YAML_LOADER_NAMES = ("FullLoader", "SafeLoader", "CSafeLoader")
+
+# The modules whose import time is measured
+_STARTUP_MODULES = ("field_setting_parser", "fill_expense_report",
+	"path_arg_checks")
+_STARTUP_HELP_SCRIPT = "fill_expense_report.py"
+
+
+def _bench_stage(stage_inputs, prepare, run, repeat):
+	"""
+	Measures a stage with every input. Function prepare makes the argument of
+	function run from an input. Only function run is measured. The inputs are
+	processed once before the measures to warm up the caches.
+
+	Returns:
+		dict: the stage's median and 95th percentile duration in seconds, its
+			peak memory in bytes and the number of measures
+	"""
+	for stage_input in stage_inputs:
+		run(prepare(stage_input))
+
+	durations = list()
+
+	for _ in range(repeat):
+		for stage_input in stage_inputs:
+			run_arg = prepare(stage_input)
+			collect()
+			start_time = perf_counter()
+			run(run_arg)
+			durations.append(perf_counter() - start_time)
+
+	# Memory is traced in a separate pass since tracing slows the stage down.
+	peak_memory = 0
+
+	for stage_input in stage_inputs:
+		run_arg = prepare(stage_input)
+		collect()
+		start_tracing()
+
+		try:
+			run(run_arg)
+			peak_memory = max(peak_memory, get_traced_memory()[1])
+
+		finally:
+			stop_tracing()
+
+	return {
+		"median_s": median(durations),
+		"p95_s": _percentile(durations, 95),
+		"peak_memory_bytes": peak_memory,
+		"samples": len(durations)
+	}
+
+
+def _bench_startup(interpreter_args, repeat, module_name=None):
+	"""
+	Measures new interpreters that run with the given arguments. If
+	module_name is None, the duration of the whole process is measured.
+	Otherwise, the duration is the module's cumulative import time reported
+	by option -X importtime. The peak memory is not measured.
+
+	Returns:
+		dict: the same measures as function _bench_stage. The peak memory is
+			None.
+	"""
+	durations = list()
+
+	for _ in range(repeat):
+		start_time = perf_counter()
+		completed = run([executable, *interpreter_args], cwd=_REPO_DIR,
+			stdout=DEVNULL, stderr=PIPE)
+		duration = perf_counter() - start_time
+
+		if module_name is not None:
+			duration = _parse_import_time(completed.stderr, module_name)
+
+		durations.append(duration)
+
+	return {
+		"median_s": median(durations),
+		"p95_s": _percentile(durations, 95),
+		"peak_memory_bytes": None,
+		"samples": len(durations)
+	}
+
+
+def compare_with_baseline(result, baseline, tolerance):
+	"""
+	Compares the median duration of each stage with a baseline's.
+
+	Args:
+		result (dict): the result of function run_benchmarks
+		baseline (dict): the result of an earlier run
+		tolerance (float): the fraction by which a median duration can exceed
+			the baseline's without being a regression
+
+	Returns:
+		dict: It maps the stages present in both results to the ratio of their
+			median durations and to whether the stage regressed.
+	"""
+	comparison = dict()
+	baseline_stages = baseline.get("stages", dict())
+
+	for stage, measures in result["stages"].items():
+		baseline_measures = baseline_stages.get(stage)
+
+		if baseline_measures is None or baseline_measures["median_s"] <= 0:
+			continue
+
+		ratio = measures["median_s"] / baseline_measures["median_s"]
+		comparison[stage] = {
+			"median_ratio": ratio,
+			"peak_memory_ratio": _make_ratio(measures["peak_memory_bytes"],
+				baseline_measures["peak_memory_bytes"]),
+			"regression": ratio > 1 + tolerance
+		}
+
+	return comparison
+
+
+def _fill_reader_copy(template, field_values, radio_btn_groups):
+	reader = template.make_fill_reader()
+	template.field_index.update_fields(
+		reader, field_values, *radio_btn_groups)
+	return reader
+
+
+def _fill_writer_copy(template, field_values, radio_btn_groups):
+	writer = template.make_writer(True)
+	update_page_fields(writer.getPage(0), field_values, *radio_btn_groups)
+	return writer
+
+
+def _identity(stage_input):
+	return stage_input
+
+
+def _clear_yaml_cache_before(yml_path):
+	clear_yaml_cache()
+	return yml_path
+
+
+def _load_field_values(yml_paths):
+	# The files whose values cannot be computed are excluded.
+	field_values = list()
+
+	for yml_path in yml_paths:
+		try:
+			yml_values = parse_yaml_content(get_yaml_content(yml_path))
+			set_automatic_field_vals(yml_values)
+			field_values.append(yml_values)
+
+		except Exception:
+			pass
+
+	return field_values
+
+
+def _make_ratio(value, baseline_value):
+	if value is None or baseline_value is None:
+		return None
+
+	return value / max(baseline_value, 1)
+
+
+def _make_parser():
+	parser = ArgumentParser(description=__doc__)
+
+	parser.add_argument("-b", "--baseline", type=Path, default=None,
+		help="Path to a JSON result of an earlier run to compare with")
+
+	parser.add_argument("-f", "--field_setting", type=Path,
+		default=_DFLT_FIELD_SETTING_DIR,
+		help="Directory containing the .yml files to process. It defaults to field_setting.")
+
+	parser.add_argument("-o", "--output", type=Path, default=None,
+		help="Path to the JSON file where the result is written. It defaults to the standard output.")
+
+	parser.add_argument("-r", "--repeat", type=int, default=10,
+		help="Number of times each stage processes every input. It defaults to 10.")
+
+	parser.add_argument("-t", "--template", type=Path,
+		default=_DFLT_TEMPLATE_PATH,
+		help="Path to the report template. It must be a PDF file.")
+
+	parser.add_argument("--tolerance", type=float, default=0.1,
+		help="Fraction by which a median duration can exceed the baseline's. It defaults to 0.1.")
+
+	return parser
+
+
+def _parse_import_time(importtime_output, module_name):
+	# The lines have the form "import time: <self> | <cumulative> | <name>"
+	# and the duration is in microseconds.
+	for line in importtime_output.decode("utf8").splitlines():
+		columns = line.split("|")
+
+		if len(columns) == 3 and columns[2].strip() == module_name:
+			return int(columns[1]) / 1000000
+
+	raise ValueError("The import time of " + module_name + " was not found.")
+
+
+def _percentile(values, percent):
+	# Nearest-rank method
+	sorted_values = sorted(values)
+	rank = max(ceil(percent / 100 * len(sorted_values)), 1)
+	return sorted_values[rank - 1]
+
+
+def run_benchmarks(template_path, yml_paths, pdf_paths, repeat):
+	"""
+	Measures every stage of the creation of a report.
+
+	Args:
+		template_path (pathlib.Path): the path to the report template
+		yml_paths (list): the paths to the YAML field setting files
+		pdf_paths (list): the paths to the reports whose fields are read
+		repeat (int): the number of times each stage processes every input
+
+	Returns:
+		dict: the measures of every stage and a description of the
+			environment
+	"""
+	radio_btn_groups = make_radio_btn_groups()
+	template = ReportTemplate(template_path, cache_dir=None)
+	yaml_contents = [get_yaml_content(yml_path) for yml_path in yml_paths]
+	yaml_texts = [yml_path.read_text(encoding="utf8")
+		for yml_path in yml_paths]
+	field_values = _load_field_values(yml_paths)
+
+	stages = dict()
+
+	stages[_STAGE_YAML_READING] = _bench_stage(
+		yml_paths, _clear_yaml_cache_before, get_yaml_content, repeat)
+
+	stages[_STAGE_YAML_CACHED_READING] = _bench_stage(
+		yml_paths, _identity, get_yaml_content, repeat)
+
+	for loader_name in _YAML_LOADER_NAMES:
+		loader = getattr(yaml, loader_name, None)
+
+		if loader is not None:
+			stages["yaml.load " + loader_name] = _bench_stage(yaml_texts,
+				_identity,
+				lambda yaml_text, loader=loader: yaml.load(yaml_text, loader),
+				repeat)
+
+	stages[_STAGE_YAML_PARSING] = _bench_stage(
+		yaml_contents, _identity, parse_yaml_content, repeat)
+
+	stages[_STAGE_TEMPLATE_LOAD] = _bench_stage([template_path], _identity,
+		lambda path: ReportTemplate(path, cache_dir=None), repeat)
+
+	stages[_STAGE_PDF_FIELDS] = _bench_stage(pdf_paths, _identity,
+		lambda path: get_fields_from_pdf(path, *radio_btn_groups[:2]),
+		repeat)
+
+	stages[_STAGE_FIELD_UPDATE] = _bench_stage(field_values,
+		lambda values: (template.make_writer(True).getPage(0), values),
+		lambda page_values: update_page_fields(*page_values, *radio_btn_groups),
+		repeat)
+
+	stages[_STAGE_INDEXED_FIELD_UPDATE] = _bench_stage(field_values,
+		lambda values: (template.make_reader(), values),
+		lambda reader_values: template.field_index.update_fields(
+			*reader_values, *radio_btn_groups),
+		repeat)
+
+	stages[_STAGE_WRITING] = _bench_stage(field_values,
+		lambda values: _fill_writer_copy(template, values, radio_btn_groups),
+		lambda writer: writer.write(BytesIO()),
+		repeat)
+
+	skeleton = template.writer_skeleton(True)
+	stages[_STAGE_SKELETON_WRITING] = _bench_stage(field_values,
+		lambda values: _fill_reader_copy(template, values, radio_btn_groups),
+		lambda reader: skeleton.write(reader, True, None, BytesIO()),
+		repeat)
+
+	for module_name in _STARTUP_MODULES:
+		stages["import " + module_name] = _bench_startup(
+			("-X", "importtime", "-c", "import " + module_name), repeat,
+			module_name)
+
+	stages[_STARTUP_HELP_SCRIPT + " -h"] = _bench_startup(
+		(_STARTUP_HELP_SCRIPT, "-h"), repeat)
+
+	return {
+		"environment": {
+			"python": python_version(),
+			"PyPDF2": _PYPDF2_VERSION
+		},
+		"inputs": {
+			"template": template_path.name,
+			"yml_files": [yml_path.name for yml_path in yml_paths],
+			"pdf_files": [pdf_path.name for pdf_path in pdf_paths]
+		},
+		"repeat": repeat,
+		"stages": stages
+	}
+
+
+if __name__ == "__main__":
+	parser = _make_parser()
+	args = parser.parse_args()
+	baseline_path = args.baseline # -b
+	output_path = args.output # -o
+	template_path = args.template # -t
+
+	if args.repeat < 1:
+		print("ERROR! -r/--repeat must be at least 1.")
+		exit(1)
+
+	yml_paths = sorted(args.field_setting.glob("*" + _EXTENSION_YML))
+	if len(yml_paths) == 0:
+		print("ERROR! No .yml file found in " + str(args.field_setting) + ".")
+		exit(1)
+
+	pdf_paths = sorted(_REPO_DIR.glob(_SAMPLE_PDF_PATTERN))
+
+	result = run_benchmarks(template_path, yml_paths, pdf_paths, args.repeat)
+
+	regression = False
+	if baseline_path is not None:
+		with baseline_path.open(encoding="utf8") as baseline_stream:
+			baseline = load(baseline_stream)
+
+		comparison = compare_with_baseline(result, baseline, args.tolerance)
+		result["comparison"] = comparison
+		regression = any(stage_comparison["regression"]
+			for stage_comparison in comparison.values())
+
+	if output_path is None:
+		dump(result, stdout, indent=2)
+		print()
+
+	else:
+		with output_path.open(mode="w", encoding="utf8") as output_stream:
+			dump(result, output_stream, indent=2)
+
+	if regression:
+		exit(1)
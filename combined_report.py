@@ -0,0 +1,449 @@
+"""
+This module writes several filled reports in one PDF document. The reports
+are made from the same template, so their pages share the template's
+resources: fonts, images, content streams and appearance streams. These
+objects are written once, and every report's page refers to them. Each report
+adds only its page dictionary, its annotations and its fields. These small
+objects are compressed in an object stream per report.
+
+The fields of each report become the kids of a new top-level field named after
+the report. A field "Montant$1" of report "janvier" is thus named
+"janvier.Montant$1" in the combined document, and the reports' values do not
+collide.
+"""
+
+
+from hashlib import md5
+from struct import pack
+from zlib import compress
+
+from incremental_update import\
+	find_form_object_keys,\
+	find_references,\
+	remap_references,\
+	serialize_object
+from PyPDF2.generic import\
+	ArrayObject,\
+	BooleanObject,\
+	ByteStringObject,\
+	DictionaryObject,\
+	IndirectObject,\
+	NameObject,\
+	NullObject,\
+	NumberObject,\
+	StreamObject,\
+	TextStringObject
+
+
+_KEY_ACROFORM = "/AcroForm"
+_KEY_CO = "/CO"
+_KEY_COUNT = "/Count"
+_KEY_FIELDS = "/Fields"
+_KEY_FILTER = "/Filter"
+_KEY_FIRST = "/First"
+_KEY_ID = "/ID"
+_KEY_KIDS = "/Kids"
+_KEY_LENGTH = "/Length"
+_KEY_N = "/N"
+_KEY_NEED_APPEARANCES = "/NeedAppearances"
+_KEY_PAGES = "/Pages"
+_KEY_PARENT = "/Parent"
+_KEY_ROOT = "/Root"
+_KEY_SIZE = "/Size"
+_KEY_T = "/T"
+_KEY_TYPE = "/Type"
+_KEY_W = "/W"
+
+# The entries of the template's AcroForm dictionary that are not copied. They
+# refer to the template's fields or to its signature.
+_ACROFORM_SKIPPED_KEYS = frozenset(
+	(_KEY_CO, _KEY_FIELDS, _KEY_NEED_APPEARANCES, "/SigFlags", "/XFA"))
+
+_FIELD_NAME_SEPARATOR = "."
+
+# The numbers of the objects written when the document is finished
+_NUMBER_CATALOG = 1
+_NUMBER_PAGES = 2
+_NUMBER_ACROFORM = 3
+_FIRST_FREE_NUMBER = 4
+
+_PDF_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+
+# The types of the cross-reference stream's entries
+_XREF_FREE = 0
+_XREF_IN_FILE = 1
+_XREF_IN_OBJ_STREAM = 2
+
+# Byte widths of the fields of a cross-reference stream's entries
+_XREF_STREAM_WIDTHS = (1, 4, 2)
+
+
+def _find_shared_keys(reader, page_keys):
+	"""
+	Finds the objects of a report that every report of a combined document
+	can share. They are the objects reachable from the pages and the AcroForm
+	dictionary, except the pages, the form objects and the objects that refer
+	to them.
+
+	Args:
+		reader (PyPDF2.PdfFileReader): a reader made by a ReportTemplate
+			instance
+		page_keys (list): the keys (generation, idnum) of the reader's pages
+
+	Returns:
+		set: the keys of the shared objects
+	"""
+	objects = reader.resolvedObjects
+	own_keys = find_form_object_keys(objects, reader.trailer, page_keys)
+	own_keys.update(page_keys)
+
+	catalog = reader.trailer[_KEY_ROOT]
+	roots = [IndirectObject(idnum, generation, reader)
+		for generation, idnum in page_keys]
+	if _KEY_ACROFORM in catalog:
+		roots.extend(find_references(
+			catalog[_KEY_ACROFORM], _ACROFORM_SKIPPED_KEYS))
+
+	# It maps the key of each reachable object to the keys that it refers
+	# to. A page's parent is replaced in the combined document.
+	children = dict()
+	pending = [_make_obj_key(root) for root in roots]
+
+	while len(pending) > 0:
+		obj_key = pending.pop()
+
+		if obj_key in children:
+			continue
+
+		skipped_keys = (_KEY_PARENT,) if obj_key in page_keys else ()
+		children[obj_key] = [_make_obj_key(reference) for reference
+			in find_references(objects.get(obj_key), skipped_keys)]
+		pending.extend(children[obj_key])
+
+	# An object that refers to a report's own object cannot be shared.
+	own_count = None
+
+	while own_count != len(own_keys):
+		own_count = len(own_keys)
+
+		for obj_key, child_keys in children.items():
+			if obj_key not in own_keys\
+					and any(key in own_keys for key in child_keys):
+				own_keys.add(obj_key)
+
+	return children.keys() - own_keys
+
+
+def _get_object(reader, obj_key):
+	pdf_object = reader.resolvedObjects.get(obj_key)
+	return NullObject() if pdf_object is None else pdf_object
+
+
+def _make_obj_key(reference):
+	return reference.generation, reference.idnum
+
+
+def _make_object_stream(serialized_objects):
+	"""
+	Makes an object stream that contains serialized objects. The stream is
+	compressed with the Flate filter.
+
+	Args:
+		serialized_objects (list): tuples of an object's number and its
+			serialized form. The objects cannot be streams.
+
+	Returns:
+		bytes: the object stream's serialized form
+	"""
+	header = list()
+	offset = 0
+
+	for number, obj_data in serialized_objects:
+		header.append(b"%d %d" % (number, offset))
+		offset += len(obj_data) + 1
+
+	header = b" ".join(header) + b"\n"
+	stream_data = compress(header
+		+ b"\n".join(obj_data for _, obj_data in serialized_objects))
+
+	stream_dict = DictionaryObject()
+	stream_dict[NameObject(_KEY_TYPE)] = NameObject("/ObjStm")
+	stream_dict[NameObject(_KEY_N)] = NumberObject(len(serialized_objects))
+	stream_dict[NameObject(_KEY_FIRST)] = NumberObject(len(header))
+	stream_dict[NameObject(_KEY_FILTER)] = NameObject("/FlateDecode")
+	stream_dict[NameObject(_KEY_LENGTH)] = NumberObject(len(stream_data))
+
+	return serialize_object(stream_dict)\
+		+ b"\nstream\n" + stream_data + b"\nendstream"
+
+
+def _make_references(numbers):
+	return ArrayObject(IndirectObject(number, 0, None) for number in numbers)
+
+
+class CombinedReportWriter:
+	"""
+	This class writes filled reports made from the same template in one PDF
+	document. The template's shared objects are written when the writer is
+	created, and each report's own objects are written when it is added. The
+	memory used therefore does not depend on the number of reports.
+	"""
+
+	def __init__(self, template, output_stream):
+		"""
+		The constructor writes the beginning of the document and the objects
+		that the reports share.
+
+		Args:
+			template (ReportTemplate): the template of the reports
+			output_stream: a binary stream where the document is written
+		"""
+		self._output_stream = output_stream
+		# The offsets are relative to the beginning of the document.
+		self._doc_start = output_stream.tell()
+		# It maps object numbers to their cross-reference stream entry.
+		self._xref_entries = dict()
+		self._page_numbers = list()
+		self._field_numbers = list()
+		self._calc_order = list()
+		self._need_appearances = False
+		self._report_names = set()
+		# The document's identifier depends only on its content.
+		self._template_id = md5(template.content_hash).digest()
+		self._content_digest = md5(template.content_hash)
+
+		reader = template.make_reader()
+		page_keys = [_make_obj_key(page.indirectRef)
+			for page in reader.pages]
+		shared_keys = _find_shared_keys(reader, page_keys)
+
+		# It maps the keys of the shared objects to their number in the
+		# combined document.
+		self._shared_numbers = {obj_key: number for number, obj_key
+			in enumerate(sorted(shared_keys, key=lambda key: key[1]),
+				_FIRST_FREE_NUMBER)}
+		self._next_number = _FIRST_FREE_NUMBER + len(self._shared_numbers)
+
+		# The combined document's AcroForm dictionary receives the template's
+		# default appearance and resources.
+		self._acroform = DictionaryObject()
+		catalog = reader.trailer[_KEY_ROOT]
+
+		if _KEY_ACROFORM in catalog:
+			for key, value in catalog[_KEY_ACROFORM].items():
+				if key not in _ACROFORM_SKIPPED_KEYS:
+					self._acroform[key] = remap_references(
+						value, self._shared_numbers.__getitem__)
+
+		output_stream.write(_PDF_HEADER)
+
+		self._write_objects([(number, remap_references(
+				reader.resolvedObjects[obj_key],
+				self._shared_numbers.__getitem__))
+			for obj_key, number in self._shared_numbers.items()],
+			self._next_number)
+		self._next_number += 1
+
+	def add_report(self, reader, report_name):
+		"""
+		Writes the pages and the form objects of a filled report. The report's
+		top-level fields become the kids of a new field named report_name.
+
+		Args:
+			reader (PyPDF2.PdfFileReader): a reader made from this writer's
+				template by method ReportTemplate.make_fill_reader and filled
+			report_name (str): the name of the report's field
+
+		Raises:
+			ValueError: if report_name is empty, contains a period or was
+				given to another report
+		"""
+		if len(report_name) == 0 or _FIELD_NAME_SEPARATOR in report_name:
+			raise ValueError("A report name cannot be empty or contain \""
+				+ _FIELD_NAME_SEPARATOR + "\": " + report_name)
+
+		if report_name in self._report_names:
+			raise ValueError("Another report is named " + report_name + ".")
+
+		page_keys = [_make_obj_key(page.indirectRef)
+			for page in reader.pages]
+		catalog = reader.trailer[_KEY_ROOT]
+		acroform = catalog[_KEY_ACROFORM]\
+			if _KEY_ACROFORM in catalog else DictionaryObject()
+		field_keys = [_make_obj_key(field_ref)
+			for field_ref in acroform.get(_KEY_FIELDS, ())]
+
+		# It maps the keys of the report's own objects to their number in the
+		# combined document. The numbers are reserved once the objects are
+		# copied, so a report that cannot be added leaves no trace.
+		own_numbers = dict()
+		next_number = self._next_number
+		pending = page_keys + field_keys
+
+		while len(pending) > 0:
+			obj_key = pending.pop()
+
+			if obj_key in self._shared_numbers or obj_key in own_numbers:
+				continue
+
+			own_numbers[obj_key] = next_number
+			next_number += 1
+			skipped_keys = (_KEY_PARENT,) if obj_key in page_keys else ()
+			pending.extend(_make_obj_key(reference) for reference
+				in find_references(
+					_get_object(reader, obj_key), skipped_keys))
+
+		def get_number(obj_key):
+			number = self._shared_numbers.get(obj_key)
+			return own_numbers[obj_key] if number is None else number
+
+		report_field_ref = IndirectObject(next_number, 0, None)
+		obj_copies = list()
+
+		for obj_key, number in own_numbers.items():
+			if obj_key in page_keys:
+				obj_copy = remap_references(_get_object(reader, obj_key),
+					get_number, (_KEY_PARENT,))
+				obj_copy[NameObject(_KEY_PARENT)]\
+					= IndirectObject(_NUMBER_PAGES, 0, None)
+
+			else:
+				obj_copy = remap_references(
+					_get_object(reader, obj_key), get_number)
+
+				if obj_key in field_keys:
+					obj_copy[NameObject(_KEY_PARENT)] = report_field_ref
+
+			obj_copies.append((number, obj_copy))
+
+		report_field = DictionaryObject()
+		report_field[NameObject(_KEY_T)] = TextStringObject(report_name)
+		report_field[NameObject(_KEY_KIDS)] = ArrayObject(
+			IndirectObject(get_number(obj_key), 0, None)
+			for obj_key in field_keys)
+		obj_copies.append((report_field_ref.idnum, report_field))
+
+		page_numbers = [get_number(obj_key) for obj_key in page_keys]
+		calc_order = [get_number(_make_obj_key(field_ref))
+			for field_ref in acroform.get(_KEY_CO, ())]
+
+		self._write_objects(obj_copies, next_number + 1)
+
+		self._next_number = next_number + 2
+		self._report_names.add(report_name)
+		self._page_numbers.extend(page_numbers)
+		self._field_numbers.append(report_field_ref.idnum)
+		self._calc_order.extend(calc_order)
+		self._need_appearances |= bool(
+			acroform.get(_KEY_NEED_APPEARANCES, False))
+
+	def finish(self):
+		"""
+		Writes the document's catalog, page tree, AcroForm dictionary and
+		cross-reference stream. No report can be added afterwards.
+		"""
+		pages = DictionaryObject()
+		pages[NameObject(_KEY_TYPE)] = NameObject(_KEY_PAGES)
+		pages[NameObject(_KEY_KIDS)] = _make_references(self._page_numbers)
+		pages[NameObject(_KEY_COUNT)] = NumberObject(len(self._page_numbers))
+
+		acroform = self._acroform
+		acroform[NameObject(_KEY_FIELDS)]\
+			= _make_references(self._field_numbers)
+		# If a report has fields without an appearance, viewers must make
+		# them.
+		if self._need_appearances:
+			acroform[NameObject(_KEY_NEED_APPEARANCES)] = BooleanObject(True)
+		if len(self._calc_order) > 0:
+			acroform[NameObject(_KEY_CO)]\
+				= _make_references(self._calc_order)
+
+		catalog = DictionaryObject()
+		catalog[NameObject(_KEY_TYPE)] = NameObject("/Catalog")
+		catalog[NameObject(_KEY_PAGES)]\
+			= IndirectObject(_NUMBER_PAGES, 0, None)
+		catalog[NameObject(_KEY_ACROFORM)]\
+			= IndirectObject(_NUMBER_ACROFORM, 0, None)
+
+		self._write_objects([(_NUMBER_CATALOG, catalog),
+				(_NUMBER_PAGES, pages), (_NUMBER_ACROFORM, acroform)],
+			self._next_number)
+		self._next_number += 1
+
+		self._write_xref_stream()
+
+	@property
+	def report_count(self):
+		"""
+		int: the number of reports added to this writer
+		"""
+		return len(self._report_names)
+
+	def _write_object(self, number, obj_data):
+		output_stream = self._output_stream
+		self._xref_entries[number] = (_XREF_IN_FILE,
+			output_stream.tell() - self._doc_start, 0)
+		self._content_digest.update(obj_data)
+		output_stream.write(("%d 0 obj\n" % number).encode("ascii")
+			+ obj_data + b"\nendobj\n")
+
+	def _write_objects(self, obj_copies, obj_stream_number):
+		"""
+		Writes objects in the document. The streams are written directly,
+		and the other objects are compressed in an object stream.
+
+		Args:
+			obj_copies (list): tuples of an object's number and the object
+			obj_stream_number (int): the number of the object stream
+		"""
+		# The objects are serialized before anything is written.
+		stream_objects = list()
+		compressed_objects = list()
+
+		for number, pdf_object in obj_copies:
+			if isinstance(pdf_object, StreamObject):
+				stream_objects.append((number, serialize_object(pdf_object)))
+			else:
+				compressed_objects.append(
+					(number, serialize_object(pdf_object)))
+
+		obj_stream_data = _make_object_stream(compressed_objects)
+
+		for number, obj_data in stream_objects:
+			self._write_object(number, obj_data)
+
+		self._write_object(obj_stream_number, obj_stream_data)
+
+		for index, (number, _) in enumerate(compressed_objects):
+			self._xref_entries[number] = (
+				_XREF_IN_OBJ_STREAM, obj_stream_number, index)
+
+	def _write_xref_stream(self):
+		# The cross-reference stream is the last object. It is listed in
+		# itself.
+		xref_number = self._next_number
+		xref_offset = self._output_stream.tell() - self._doc_start
+		self._xref_entries[xref_number] = (_XREF_IN_FILE, xref_offset, 0)
+
+		entry_data = [pack(">BIH", _XREF_FREE, 0, 65535)]
+		entry_data.extend(pack(">BIH", *self._xref_entries[number])
+			for number in range(1, xref_number + 1))
+		entry_data = compress(b"".join(entry_data))
+
+		xref_dict = DictionaryObject()
+		xref_dict[NameObject(_KEY_TYPE)] = NameObject("/XRef")
+		xref_dict[NameObject(_KEY_SIZE)] = NumberObject(xref_number + 1)
+		xref_dict[NameObject(_KEY_ROOT)]\
+			= IndirectObject(_NUMBER_CATALOG, 0, None)
+		xref_dict[NameObject(_KEY_ID)] = ArrayObject((
+			ByteStringObject(self._template_id),
+			ByteStringObject(self._content_digest.digest())))
+		xref_dict[NameObject(_KEY_W)] = ArrayObject(
+			NumberObject(width) for width in _XREF_STREAM_WIDTHS)
+		xref_dict[NameObject(_KEY_FILTER)] = NameObject("/FlateDecode")
+		xref_dict[NameObject(_KEY_LENGTH)] = NumberObject(len(entry_data))
+
+		self._output_stream.write(("%d 0 obj\n" % xref_number).encode("ascii")
+			+ serialize_object(xref_dict) + b"\nstream\n" + entry_data
+			+ b"\nendstream\nendobj\n"
+			+ ("startxref\n%d\n%%%%EOF\n" % xref_offset).encode("ascii"))
@@ -0,0 +1,265 @@
+"""
+This script extracts the field values of every PDF report in a directory and
+its subdirectories. The reports are read in parallel by several processes, and
+the values of each report are written as soon as they are read in a JSON Lines
+or CSV file chosen by the output file's extension. The selected buttons of the
+radio button groups are replaced with the indices that the YAML field setting
+files give them.
+
+Each JSON line contains the report's path relative to the directory, an error
+message or null and an object mapping the field names to their value. Each CSV
+row contains the path, the error message and one column for each field of the
+report template. The fields that the template does not have are not written in
+CSV.
+"""
+
+
+from argparse import ArgumentParser
+from os import cpu_count
+from pathlib import Path
+from sys import exit
+
+from fill_expense_report import\
+	check_template_path,\
+	get_fields_from_pdf,\
+	make_radio_btn_groups
+from stage_timings import\
+	add_instrumentation_args,\
+	enable_timings,\
+	instrumented_run,\
+	pop_stage_records,\
+	record_stages,\
+	timed_stage,\
+	timings_enabled
+
+
+_DFLT_TEMPLATE_PATH = Path(__file__).parents[0]/"rapport_depenses.pdf"
+
+_EXTENSION_CSV = ".csv"
+_EXTENSION_JSONL = ".jsonl"
+_EXTENSION_PDF = ".pdf"
+
+_KEY_ERROR = "error"
+_KEY_FIELDS = "fields"
+_KEY_PATH = "path"
+
+# The number of reports sent to a worker process at once
+_TASK_CHUNK_SIZE = 16
+
+# The radio button groups used by the worker process
+_worker_radio_btn_groups = None
+
+
+class _CsvRowWriter:
+	"""
+	This class writes the field values of each report as a CSV row. The
+	columns are the path, the error message and the given field names.
+	"""
+
+	def __init__(self, output_stream, field_names):
+		from csv import DictWriter
+
+		self._writer = DictWriter(output_stream,
+			(_KEY_PATH, _KEY_ERROR, *field_names), extrasaction="ignore")
+		self._writer.writeheader()
+
+	def write_row(self, report_path, field_values, error_msg):
+		row = dict(field_values)
+		row[_KEY_PATH] = report_path
+		row[_KEY_ERROR] = error_msg
+		self._writer.writerow(row)
+
+
+class _JsonLinesRowWriter:
+	"""
+	This class writes the path, the error message and the field values of each
+	report as a line of JSON.
+	"""
+
+	def __init__(self, output_stream):
+		self._output_stream = output_stream
+
+	def write_row(self, report_path, field_values, error_msg):
+		from json import dumps
+
+		self._output_stream.write(dumps({_KEY_PATH: report_path,
+			_KEY_ERROR: error_msg, _KEY_FIELDS: field_values},
+			ensure_ascii=False) + "\n")
+
+
+def extract_field_values(pdf_path, radio_btn_groups):
+	"""
+	Reads the field values of a report in a form that can be written in JSON or
+	CSV. Exceptions are not raised but returned so that one bad file does not
+	stop the extraction.
+
+	Args:
+		pdf_path (pathlib.Path): the path to a report
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+
+	Returns:
+		tuple: the report's path, a dictionary that maps field names to their
+			value and an error message. The error message is None if the values
+			were read. Otherwise, the dictionary is empty.
+	"""
+	try:
+		with timed_stage("pdf_reading"):
+			raw_values = get_fields_from_pdf(
+				pdf_path, radio_btn_groups[0], radio_btn_groups[1])
+
+	except Exception as e:
+		return pdf_path, dict(), type(e).__name__ + ": " + str(e)
+
+	# The values are converted to plain types. The indices of the selected
+	# buttons are the only integers.
+	field_values = {name: value if isinstance(value, int) else str(value)
+		for name, value in raw_values.items()}
+
+	return pdf_path, field_values, None
+
+
+def _extract_in_worker(pdf_path):
+	result = extract_field_values(pdf_path, _worker_radio_btn_groups)
+	return result, pop_stage_records()
+
+
+def extract_reports_in_parallel(pdf_paths, radio_btn_groups, jobs):
+	"""
+	Reads the field values of reports with a pool of worker processes. The
+	results are yielded in the order of pdf_paths as soon as they are
+	available. If the timings are enabled, the stages measured by the workers
+	are added to this process's records.
+
+	Args:
+		pdf_paths (list): the paths to the reports
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		jobs (int): the number of worker processes
+
+	Yields:
+		tuple: the result of function extract_field_values for each report
+	"""
+	from multiprocessing import Pool
+
+	with Pool(jobs, _init_worker, (radio_btn_groups, timings_enabled()))\
+			as pool:
+		for result, stage_records in pool.imap(
+				_extract_in_worker, pdf_paths, chunksize=_TASK_CHUNK_SIZE):
+			record_stages(stage_records)
+			yield result
+
+
+def _init_worker(radio_btn_groups, timings_on):
+	global _worker_radio_btn_groups
+	_worker_radio_btn_groups = radio_btn_groups
+
+	if timings_on:
+		enable_timings()
+
+
+def _make_parser():
+	parser = ArgumentParser(description=__doc__)
+
+	parser.add_argument("-j", "--jobs", type=int, default=0,
+		help="Number of processes that read reports in parallel. It defaults to 0, which means one per processor.")
+
+	parser.add_argument("-o", "--output", type=Path, required=True,
+		help="Path to the output file. Its extension, "
+			+ _EXTENSION_JSONL + " or " + _EXTENSION_CSV
+			+ ", determines its format.")
+
+	parser.add_argument("-p", "--pdf_data", type=Path, required=True,
+		help="Directory containing the reports. Its subdirectories are also searched.")
+
+	parser.add_argument("-t", "--template", type=Path,
+		default=_DFLT_TEMPLATE_PATH,
+		help="Path to the report template. Its fields are the columns of the CSV output.")
+
+	add_instrumentation_args(parser)
+
+	return parser
+
+
+if __name__ == "__main__":
+	parser = _make_parser()
+	args = parser.parse_args()
+	output_path = args.output # -o
+	pdf_data_dir = args.pdf_data # -p
+	template_path = args.template # -t
+
+	jobs = args.jobs # -j
+	if jobs < 0:
+		print("ERROR! -j/--jobs cannot be negative.")
+		exit(1)
+	elif jobs == 0:
+		jobs = cpu_count()
+
+	output_format = output_path.suffix
+	if output_format not in (_EXTENSION_JSONL, _EXTENSION_CSV):
+		print("ERROR! -o/--output must have extension " + _EXTENSION_JSONL
+			+ " or " + _EXTENSION_CSV + ".")
+		exit(1)
+
+	with instrumented_run(args.timings, args.profile):
+		with timed_stage("path_checks"):
+			if not pdf_data_dir.is_dir():
+				print("ERROR! -p/--pdf_data must be a directory.")
+				exit(1)
+
+			if output_format == _EXTENSION_CSV:
+				check_template_path(template_path)
+
+			pdf_paths = sorted(pdf_data_dir.rglob("*" + _EXTENSION_PDF))
+			if len(pdf_paths) == 0:
+				print("ERROR! " + str(pdf_data_dir) + " contains no PDF file.")
+				exit(1)
+
+			output_path.parent.mkdir(parents=True, exist_ok=True)
+
+		radio_btn_groups = make_radio_btn_groups()
+
+		if output_format == _EXTENSION_CSV:
+			from report_template import ReportTemplate
+
+			with timed_stage("template_load"):
+				template_fields = ReportTemplate(template_path)\
+					.make_reader().getFields()
+
+			# The CSV columns are the template's fields.
+			if template_fields is None:
+				print("ERROR! The template " + str(template_path)
+					+ " does not contain a form.")
+				exit(1)
+
+		if jobs > 1 and len(pdf_paths) > 1:
+			results = extract_reports_in_parallel(
+				pdf_paths, radio_btn_groups, min(jobs, len(pdf_paths)))
+		else:
+			results = (extract_field_values(pdf_path, radio_btn_groups)
+				for pdf_path in pdf_paths)
+
+		failure_count = 0
+
+		with output_path.open(mode="w", encoding="utf8", newline="")\
+				as output_stream:
+			if output_format == _EXTENSION_CSV:
+				row_writer = _CsvRowWriter(output_stream, template_fields)
+			else:
+				row_writer = _JsonLinesRowWriter(output_stream)
+
+			for pdf_path, field_values, error_msg in results:
+				if error_msg is not None:
+					failure_count += 1
+					print("FAILED " + str(pdf_path) + ": " + error_msg)
+
+				with timed_stage("writing"):
+					row_writer.write_row(
+						pdf_path.relative_to(pdf_data_dir).as_posix(),
+						field_values, error_msg)
+
+		print(str(len(pdf_paths) - failure_count) + " report(s) read, "
+			+ str(failure_count) + " failure(s)")
+
+	if failure_count > 0:
+		exit(1)
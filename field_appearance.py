@@ -0,0 +1,477 @@
+"""
+This module makes the appearance streams of filled text fields. A viewer
+displays a field through its normal appearance (/AP /N). If a filled field
+keeps its empty appearance, flag NeedAppearances must make the viewer rebuild
+every field when the document is opened, which is slow and which some viewers
+ignore. Checkboxes and radio buttons already have an appearance for each of
+their states, so only their state is verified.
+
+The text is laid out with the widths of the font named in the field's default
+appearance (/DA). The metrics of each font are read once per template. Only
+simple fonts that have a /Widths array and the WinAnsi encoding are
+supported. A field whose font, text or widget is not supported receives no
+appearance, and NeedAppearances must then be set.
+"""
+
+
+from re import compile as compile_regex
+
+from PyPDF2.generic import\
+	ArrayObject,\
+	DecodedStreamObject,\
+	DictionaryObject,\
+	FloatObject,\
+	IndirectObject,\
+	NameObject,\
+	NumberObject
+from PyPDF2_Fields.field_types import PdfFieldType
+
+
+_KEY_ACROFORM = "/AcroForm"
+_KEY_AP = "/AP"
+_KEY_AS = "/AS"
+_KEY_ASCENT = "/Ascent"
+_KEY_BBOX = "/BBox"
+_KEY_BC = "/BC"
+_KEY_BG = "/BG"
+_KEY_BS = "/BS"
+_KEY_DA = "/DA"
+_KEY_DESCENT = "/Descent"
+_KEY_DR = "/DR"
+_KEY_ENCODING = "/Encoding"
+_KEY_FF = "/Ff"
+_KEY_FIRST_CHAR = "/FirstChar"
+_KEY_FONT = "/Font"
+_KEY_FONT_DESCRIPTOR = "/FontDescriptor"
+_KEY_MISSING_WIDTH = "/MissingWidth"
+_KEY_MK = "/MK"
+_KEY_N = "/N"
+_KEY_PARENT = "/Parent"
+_KEY_Q = "/Q"
+_KEY_R = "/R"
+_KEY_RECT = "/Rect"
+_KEY_RESOURCES = "/Resources"
+_KEY_ROOT = "/Root"
+_KEY_SIZE = "/Size"
+_KEY_SUBTYPE = "/Subtype"
+_KEY_TYPE = "/Type"
+_KEY_V = "/V"
+_KEY_W = "/W"
+_KEY_WIDTHS = "/Widths"
+
+_NAME_OFF = "/Off"
+_NAME_WIN_ANSI = "/WinAnsiEncoding"
+
+# Python's name of the WinAnsi encoding
+_CODEC_WIN_ANSI = "cp1252"
+
+_FLAG_MULTILINE = 1 << 12
+_FLAG_COMB = 1 << 24
+
+_ALIGN_CENTER = 1
+_ALIGN_RIGHT = 2
+
+_DFLT_BORDER_WIDTH = 1
+_DFLT_MULTILINE_FONT_SIZE = 12
+_MAX_AUTO_FONT_SIZE = 12
+
+# The distance between a field's border and its text
+_TEXT_PADDING = 2
+
+_DA_FONT_REGEX = compile_regex(r"/(\S+)\s+(\d*\.?\d+)\s+Tf")
+
+_COLOR_OPERATORS = {1: ("g", "G"), 3: ("rg", "RG"), 4: ("k", "K")}
+
+_STRING_ESCAPES = ((b"\\", b"\\\\"), (b"(", b"\\("), (b")", b"\\)"),
+	(b"\r", b"\\r"), (b"\n", b"\\n"))
+
+
+def _escape_pdf_string(text_bytes):
+	for char, escape in _STRING_ESCAPES:
+		text_bytes = text_bytes.replace(char, escape)
+
+	return b"(" + text_bytes + b")"
+
+
+def _format_number(number):
+	return ("%.3f" % number).rstrip("0").rstrip(".")
+
+
+def _get_inherited(field, key, default):
+	while field is not None:
+		if key in field:
+			return field[key]
+
+		field = field[_KEY_PARENT] if _KEY_PARENT in field else None
+
+	return default
+
+
+def _get_object(reader, obj_key):
+	return reader.getObject(IndirectObject(obj_key[1], obj_key[0], reader))
+
+
+def _has_state_appearance(widget):
+	state = widget.get(_KEY_AS)
+
+	if state is None or state == _NAME_OFF:
+		return True
+
+	return _KEY_AP in widget and _KEY_N in widget[_KEY_AP]\
+		and state in widget[_KEY_AP][_KEY_N]
+
+
+def _make_color_operator(color, stroke):
+	operators = _COLOR_OPERATORS.get(len(color))
+
+	if operators is None:
+		return None
+
+	return " ".join(_format_number(component) for component in color)\
+		+ " " + operators[1 if stroke else 0]
+
+
+def _wrap_line(line, metrics, font_size, max_width):
+	"""
+	Splits a line of text at its spaces so that each part fits in the given
+	width. A word wider than max_width gets a line of its own.
+
+	Args:
+		line (bytes): the character codes of the line
+		metrics (_FontMetrics): the metrics of the text's font
+		font_size (float): the size of the font
+		max_width (float): the width available for the text
+
+	Returns:
+		list: the parts of the line
+	"""
+	wrapped_lines = list()
+	current_line = None
+
+	for word in line.split(b" "):
+		candidate = word if current_line is None\
+			else current_line + b" " + word
+
+		if current_line is not None\
+				and metrics.get_width(candidate, font_size) > max_width:
+			wrapped_lines.append(current_line)
+			current_line = word
+
+		else:
+			current_line = candidate
+
+	wrapped_lines.append(b"" if current_line is None else current_line)
+	return wrapped_lines
+
+
+class _FontMetrics:
+	"""
+	This class contains the widths, the ascent and the descent of a simple
+	font, in thousandths of the font size.
+	"""
+
+	def __init__(self, font):
+		"""
+		The constructor reads the metrics of a font dictionary.
+
+		Args:
+			font (PyPDF2.generic.DictionaryObject): a font of a form's
+				default resources
+
+		Raises:
+			ValueError: if the font is not supported
+		"""
+		if font.get(_KEY_ENCODING) != _NAME_WIN_ANSI\
+				or _KEY_WIDTHS not in font\
+				or _KEY_FONT_DESCRIPTOR not in font:
+			raise ValueError("Unsupported font")
+
+		descriptor = font[_KEY_FONT_DESCRIPTOR]
+
+		if _KEY_ASCENT not in descriptor or _KEY_DESCENT not in descriptor:
+			raise ValueError("The font does not have an ascent and descent.")
+
+		self._first_char = font.get(_KEY_FIRST_CHAR, 0)
+		self._widths = tuple(float(width) for width in font[_KEY_WIDTHS])
+		self._missing_width = float(descriptor.get(_KEY_MISSING_WIDTH, 0))
+		self._ascent = float(descriptor[_KEY_ASCENT])
+		self._descent = float(descriptor[_KEY_DESCENT])
+
+	@property
+	def ascent(self):
+		"""
+		float: the height of the font above the baseline
+		"""
+		return self._ascent
+
+	@property
+	def descent(self):
+		"""
+		float: the depth of the font below the baseline. It is negative.
+		"""
+		return self._descent
+
+	def encode(self, text):
+		"""
+		Converts text to the character codes of this font.
+
+		Args:
+			text (str): the text to display
+
+		Returns:
+			bytes: the codes of the text's characters
+
+		Raises:
+			UnicodeEncodeError: if the font cannot display a character
+		"""
+		return text.encode(_CODEC_WIN_ANSI)
+
+	def get_width(self, text_bytes, font_size):
+		"""
+		Computes the width of text displayed in this font.
+
+		Args:
+			text_bytes (bytes): the text's character codes
+			font_size (float): the size of the font
+
+		Returns:
+			float: the text's width in the units of the font size
+		"""
+		widths = self._widths
+		first_char = self._first_char
+		width = 0
+
+		for code in text_bytes:
+			index = code - first_char
+			width += widths[index] if 0 <= index < len(widths)\
+				else self._missing_width
+
+		return width * font_size / 1000
+
+
+class FieldAppearances:
+	"""
+	This class makes the appearance streams of the filled fields of a
+	template. The metrics of the template's fonts are read the first time
+	that they are used, then kept for every report.
+	"""
+
+	def __init__(self):
+		# It maps font names to a _FontMetrics instance or None if the font
+		# is not supported.
+		self._font_metrics = dict()
+
+	def _get_font_metrics(self, font_name, fonts):
+		if font_name not in self._font_metrics:
+			try:
+				metrics = _FontMetrics(fonts[font_name])
+			except (KeyError, ValueError):
+				metrics = None
+
+			self._font_metrics[font_name] = metrics
+
+		return self._font_metrics[font_name]
+
+	def _make_text_appearance(self, field, text, acroform):
+		"""
+		Makes the normal appearance of a text field.
+
+		Args:
+			field (PyPDF2.generic.DictionaryObject): a text field that is also
+				its widget
+			text (str): the field's value
+			acroform (PyPDF2.generic.DictionaryObject): the document's
+				AcroForm dictionary
+
+		Returns:
+			PyPDF2.generic.DecodedStreamObject: the appearance stream or None
+				if the field is not supported
+		"""
+		default_appearance = _get_inherited(
+			field, _KEY_DA, acroform.get(_KEY_DA, ""))
+		da_match = _DA_FONT_REGEX.search(default_appearance)
+		flags = _get_inherited(field, _KEY_FF, 0)
+		appearance_chars = field.get(_KEY_MK, DictionaryObject())
+
+		if da_match is None or flags & _FLAG_COMB\
+				or appearance_chars.get(_KEY_R, 0) % 360 != 0\
+				or _KEY_DR not in acroform\
+				or _KEY_FONT not in acroform[_KEY_DR]:
+			return None
+
+		fonts = acroform[_KEY_DR][_KEY_FONT]
+		font_name = "/" + da_match.group(1)
+		metrics = self._get_font_metrics(font_name, fonts)
+
+		if metrics is None:
+			return None
+
+		multiline = flags & _FLAG_MULTILINE != 0
+
+		if not multiline:
+			text = " ".join(text.splitlines())
+
+		try:
+			lines = [metrics.encode(line) for line in text.splitlines()]
+		except UnicodeEncodeError:
+			return None
+
+		rect = field[_KEY_RECT]
+		width = abs(float(rect[2]) - float(rect[0]))
+		height = abs(float(rect[3]) - float(rect[1]))
+
+		border_width = float(field[_KEY_BS].get(_KEY_W, _DFLT_BORDER_WIDTH))\
+			if _KEY_BS in field else _DFLT_BORDER_WIDTH
+		inner_width = width - 2 * (border_width + _TEXT_PADDING)
+		font_height = (metrics.ascent - metrics.descent) / 1000
+
+		font_size = float(da_match.group(2))
+
+		# Size 0 means that the text is scaled to fit the field.
+		if font_size == 0:
+			if multiline:
+				font_size = _DFLT_MULTILINE_FONT_SIZE
+
+			else:
+				font_size = min(_MAX_AUTO_FONT_SIZE,
+					(height - 2 * border_width) / font_height)
+				text_width = metrics.get_width(
+					lines[0] if len(lines) > 0 else b"", 1)
+
+				if text_width > 0:
+					font_size = min(font_size, inner_width / text_width)
+
+			default_appearance = default_appearance[:da_match.start(2)]\
+				+ _format_number(font_size)\
+				+ default_appearance[da_match.end(2):]
+
+		if multiline:
+			lines = [wrapped_line for line in lines
+				for wrapped_line in _wrap_line(
+					line, metrics, font_size, inner_width)]
+			baseline = height - border_width - _TEXT_PADDING\
+				- metrics.ascent * font_size / 1000
+
+		else:
+			baseline = (height - (metrics.ascent + metrics.descent)
+				* font_size / 1000) / 2
+
+		alignment = _get_inherited(field, _KEY_Q, acroform.get(_KEY_Q, 0))
+		content = list()
+
+		background = _make_color_operator(
+			appearance_chars.get(_KEY_BG, ()), False)
+		if background is not None:
+			content.append(background + " 0 0 " + _format_number(width)
+				+ " " + _format_number(height) + " re f")
+
+		border = _make_color_operator(
+			appearance_chars.get(_KEY_BC, ()), True)
+		if border is not None and border_width > 0:
+			content.append(border + " " + _format_number(border_width)
+				+ " w " + " ".join(_format_number(number) for number in (
+					border_width / 2, border_width / 2, width - border_width,
+					height - border_width)) + " re s")
+
+		content.extend(("/Tx BMC", "q", " ".join(_format_number(number)
+				for number in (border_width, border_width,
+					width - 2 * border_width, height - 2 * border_width))
+				+ " re W n",
+			"BT", default_appearance))
+
+		for line in lines:
+			x = border_width + _TEXT_PADDING
+
+			if alignment == _ALIGN_CENTER:
+				x = (width - metrics.get_width(line, font_size)) / 2
+			elif alignment == _ALIGN_RIGHT:
+				x = width - border_width - _TEXT_PADDING\
+					- metrics.get_width(line, font_size)
+
+			content.append("1 0 0 1 " + _format_number(x) + " "
+				+ _format_number(baseline) + " Tm")
+			content.append(_escape_pdf_string(line).decode("latin-1")
+				+ " Tj")
+			baseline -= font_height * font_size
+
+		content.extend(("ET", "Q", "EMC"))
+
+		font_resources = DictionaryObject()
+		font_resources[NameObject(font_name)] = fonts.raw_get(font_name)
+		resources = DictionaryObject()
+		resources[NameObject(_KEY_FONT)] = font_resources
+
+		appearance = DecodedStreamObject()
+		appearance._data = "\n".join(content).encode("latin-1")
+		appearance[NameObject(_KEY_TYPE)] = NameObject("/XObject")
+		appearance[NameObject(_KEY_SUBTYPE)] = NameObject("/Form")
+		appearance[NameObject(_KEY_BBOX)] = ArrayObject((NumberObject(0),
+			NumberObject(0), FloatObject(width), FloatObject(height)))
+		appearance[NameObject(_KEY_RESOURCES)] = resources
+
+		return appearance
+
+	def update_appearances(self, reader, field_index, field_names):
+		"""
+		Makes the appearance of the text fields named in field_names and
+		verifies that the checkboxes and radio buttons have an appearance for
+		their state. The new appearance streams are added to the reader.
+
+		Args:
+			reader (PyPDF2.PdfFileReader): a reader made from this object's
+				template whose fields were set
+			field_index (FieldIndex): the index of the template's fields
+			field_names: the names of the fields that were set
+
+		Returns:
+			bool: True if every named field has an appearance, False if
+				NeedAppearances must be set
+		"""
+		catalog = reader.trailer[_KEY_ROOT]
+		acroform = catalog[_KEY_ACROFORM]\
+			if _KEY_ACROFORM in catalog else DictionaryObject()
+
+		# The new streams receive numbers greater than the reader's objects'.
+		next_idnum = max(reader.trailer.get(_KEY_SIZE, 0),
+			max((idnum for _, idnum in reader.resolvedObjects), default=0)
+			+ 1)
+		appearances_made = True
+
+		for name in field_names:
+			if name not in field_index:
+				continue
+
+			for indexed_field in field_index[name]:
+				field = _get_object(reader, indexed_field.field_key)
+				field_type = indexed_field.field_type
+
+				if field_type == PdfFieldType.TEXT_FIELD:
+					if _KEY_V not in field:
+						continue
+
+					appearance = self._make_text_appearance(
+						field, field[_KEY_V], acroform)
+
+					if appearance is None:
+						appearances_made = False
+						continue
+
+					reader.resolvedObjects[(0, next_idnum)] = appearance
+					appearance_dict = DictionaryObject(
+						field[_KEY_AP] if _KEY_AP in field else ())
+					appearance_dict[NameObject(_KEY_N)]\
+						= IndirectObject(next_idnum, 0, reader)
+					field[NameObject(_KEY_AP)] = appearance_dict
+					next_idnum += 1
+
+				elif field_type == PdfFieldType.CHECKBOX:
+					appearances_made &= _has_state_appearance(field)
+
+				else:
+					appearances_made &= all(_has_state_appearance(
+							_get_object(reader, kid_key))
+						for kid_key in indexed_field.kid_keys)
+
+		reader.trailer[NameObject(_KEY_SIZE)] = NumberObject(next_idnum)
+		return appearances_made
+
@@ -0,0 +1,248 @@
+"""
+This module indexes the fields of a PDF page by name. Function
+update_page_fields from library PyPDF2_Fields searches all the annotations of
+a page for every update. An index built once per template lets each update
+modify only the fields whose name is in the given values.
+
+The index stores the keys (generation, idnum) of the field objects rather
+than the objects themselves. It can therefore serve every reader made from
+the same template.
+"""
+
+
+from PyPDF2.generic import\
+	IndirectObject,\
+	NameObject,\
+	TextStringObject
+from PyPDF2_Fields.field_types import\
+	PdfFieldType,\
+	get_field_type
+
+
+_KEY_ANNOTS = "/Annots"
+_KEY_AS = "/AS"
+_KEY_KIDS = "/Kids"
+_KEY_PARENT = "/Parent"
+_KEY_T = "/T"
+_KEY_V = "/V"
+
+_NAME_OFF = "/Off"
+
+_INDEXED_TYPES = (PdfFieldType.CHECKBOX, PdfFieldType.RADIO_BTN_GROUP,
+	PdfFieldType.TEXT_FIELD)
+
+
+def _get_object(reader, obj_key):
+	# Method getObject looks up the objects already parsed by the reader
+	# first.
+	return reader.getObject(IndirectObject(obj_key[1], obj_key[0], reader))
+
+
+def _get_qualified_name(field):
+	names = list()
+
+	while field is not None:
+		if _KEY_T in field:
+			names.append(field[_KEY_T])
+
+		field = field[_KEY_PARENT] if _KEY_PARENT in field else None
+
+	return ".".join(reversed(names))
+
+
+def _make_obj_key(reference):
+	return reference.generation, reference.idnum
+
+
+class IndexedField:
+	"""
+	This class locates a field of a PDF page. For a radio button group, it
+	also locates the buttons, or kids.
+	"""
+
+	def __init__(self, name, field_type, field_key, kid_keys):
+		"""
+		The constructor needs the field's name and type and the keys of its
+		objects.
+
+		Args:
+			name (str): the field's fully-qualified name
+			field_type (PdfFieldType): the field's type
+			field_key (tuple): the key (generation, idnum) of the field object
+			kid_keys (tuple): the keys of a radio button group's kids. It is
+				empty for the other fields.
+		"""
+		self._name = name
+		self._field_type = field_type
+		self._field_key = field_key
+		self._kid_keys = kid_keys
+
+	@property
+	def field_key(self):
+		"""
+		tuple: the key (generation, idnum) of the field object
+		"""
+		return self._field_key
+
+	@property
+	def field_type(self):
+		"""
+		PdfFieldType: the type of this field
+		"""
+		return self._field_type
+
+	@property
+	def kid_keys(self):
+		"""
+		tuple: the keys of a radio button group's kids
+		"""
+		return self._kid_keys
+
+	@property
+	def name(self):
+		"""
+		str: the fully-qualified name of this field
+		"""
+		return self._name
+
+
+class FieldIndex:
+	"""
+	This class maps the fully-qualified name of a page's text fields,
+	checkboxes and radio button groups to IndexedField instances. It can
+	update the fields of any reader that contains the indexed page's objects.
+	"""
+
+	def __init__(self, page):
+		"""
+		The constructor reads the page's annotations once. The fields whose
+		widget is an annotation are indexed as well as the radio button groups
+		whose kids are annotations.
+
+		Args:
+			page (PyPDF2.pdf.PageObject): a page of a PdfFileReader instance
+		"""
+		self._fields = dict()
+		indexed_keys = set()
+
+		if _KEY_ANNOTS not in page:
+			return
+
+		for annot_ref in page[_KEY_ANNOTS]:
+			annot = annot_ref.getObject()
+
+			if _KEY_T in annot:
+				if isinstance(annot_ref, IndirectObject):
+					self._index_widget(annot, _make_obj_key(annot_ref),
+						indexed_keys)
+
+			elif _KEY_PARENT in annot:
+				parent_ref = annot.raw_get(_KEY_PARENT)
+
+				if isinstance(parent_ref, IndirectObject):
+					self._index_radio_btn_group(parent_ref.getObject(),
+						_make_obj_key(parent_ref), indexed_keys)
+
+	def __contains__(self, name):
+		return name in self._fields
+
+	def __getitem__(self, name):
+		return self._fields[name]
+
+	def _index_field(self, indexed_field, indexed_keys):
+		indexed_keys.add(indexed_field.field_key)
+		self._fields.setdefault(indexed_field.name, list())\
+			.append(indexed_field)
+
+	def _index_radio_btn_group(self, group, group_key, indexed_keys):
+		if group_key in indexed_keys\
+				or get_field_type(group) != PdfFieldType.RADIO_BTN_GROUP:
+			return
+
+		kids = group[_KEY_KIDS]
+		kid_keys = tuple(_make_obj_key(kid) for kid in kids)
+
+		self._index_field(IndexedField(_get_qualified_name(group),
+				PdfFieldType.RADIO_BTN_GROUP, group_key, kid_keys),
+			indexed_keys)
+
+	def _index_widget(self, widget, widget_key, indexed_keys):
+		field_type = get_field_type(widget)
+
+		if field_type not in _INDEXED_TYPES or widget_key in indexed_keys:
+			return
+
+		# A radio button group that is also a widget is not set by function
+		# update_page_fields.
+		if field_type == PdfFieldType.RADIO_BTN_GROUP:
+			return
+
+		self._index_field(IndexedField(_get_qualified_name(widget),
+				field_type, widget_key, ()),
+			indexed_keys)
+
+	def __iter__(self):
+		return iter(self._fields)
+
+	def __len__(self):
+		return len(self._fields)
+
+	def update_fields(self, reader, field_content, *radio_btn_groups):
+		"""
+		Sets the indexed fields of reader to the values in field_content. This
+		method modifies the fields like function update_page_fields from
+		library PyPDF2_Fields but only visits the fields named in
+		field_content. The names that are not in this index are ignored.
+		Unlike update_page_fields, selecting a radio button turns the group's
+		other buttons off.
+
+		Args:
+			reader (PyPDF2.PdfFileReader): a reader that contains the indexed
+				page's objects
+			field_content (dict): It maps field names to the values to write.
+				The value of a radio button group is the index of the selected
+				button.
+			*radio_btn_groups: RadioBtnGroup instances that represent the
+				page's radio button groups. A group without an instance is not
+				set.
+
+		Raises:
+			IndexError: if field_content sets a radio button group to an
+				incorrect index
+		"""
+		btn_group_dict = {group.name: group for group in radio_btn_groups}
+
+		for name, field_value in field_content.items():
+			for indexed_field in self._fields.get(name, ()):
+				field = _get_object(reader, indexed_field.field_key)
+				field_type = indexed_field.field_type
+
+				if field_type == PdfFieldType.TEXT_FIELD:
+					field[NameObject(_KEY_V)] = TextStringObject(field_value)
+
+				elif field_type == PdfFieldType.CHECKBOX:
+					field[NameObject(_KEY_AS)] = NameObject(field_value)
+					field[NameObject(_KEY_V)] = NameObject(field_value)
+
+				elif (button_group := btn_group_dict.get(name)) is not None:
+					# This instruction can raise an IndexError.
+					button_name = button_group[field_value]
+					kid_keys = indexed_field.kid_keys
+
+					# The index must also match a kid. Like in a list, a
+					# negative index counts from the last kid.
+					if not -len(kid_keys) <= field_value < len(kid_keys):
+						raise IndexError("Radio button group " + name
+							+ " does not have index " + str(field_value) + ".")
+
+					selected_index = field_value % len(kid_keys)
+
+					# The other buttons are turned off so that only the
+					# selected one appears checked.
+					for kid_index, kid_key in enumerate(kid_keys):
+						kid = _get_object(reader, kid_key)
+						kid[NameObject(_KEY_AS)] = NameObject(button_name\
+							if kid_index == selected_index else _NAME_OFF)
+
+					field[NameObject(_KEY_V)] = NameObject(button_name)
+
@@ -0,0 +1,205 @@
+"""
+This module translates the content of a YAML file to the values of a PDF
+form's fields according to a declarative table. The table is a dictionary
+that maps YAML keys to one of the following rules.
+
+* a string: the value is written in the field bearing that name.
+* a Checkbox instance: the checkbox is checked if the value is true.
+* a Rows instance: the value is a list of dictionaries. Each dictionary fills
+a row of indexed fields.
+* a dictionary: the value is a dictionary whose keys are mapped by this
+nested table.
+
+The table is compiled once by class FieldMapping into handler functions and
+precomputed field names. Another form only needs another table.
+"""
+
+
+_ROW_INDEX_START = 1
+
+
+class Checkbox:
+	"""
+	This class is a rule of a mapping table. It checks a checkbox if the YAML
+	value is true.
+	"""
+
+	def __init__(self, field_name, checked_value):
+		"""
+		The constructor needs the checkbox's name and the value that checks
+		it.
+
+		Args:
+			field_name (str): the name of the checkbox field
+			checked_value (str): the checkbox's value when it is checked
+		"""
+		self._field_name = field_name
+		self._checked_value = checked_value
+
+	@property
+	def checked_value(self):
+		"""
+		str: the value that checks the checkbox
+		"""
+		return self._checked_value
+
+	@property
+	def field_name(self):
+		"""
+		str: the name of the checkbox field
+		"""
+		return self._field_name
+
+
+class Rows:
+	"""
+	This class is a rule of a mapping table. It maps a list of dictionaries to
+	rows of indexed fields. The name pattern of each column contains {n},
+	which is replaced with the row's number. The first row's number is 1.
+	"""
+
+	def __init__(self, column_patterns):
+		"""
+		The constructor needs the name pattern of each column's fields.
+
+		Args:
+			column_patterns (dict): It maps the keys of the dictionaries in
+				the list to field name patterns like "Montant${n}". The
+				columns are filled in this dictionary's order.
+		"""
+		self._column_patterns = dict(column_patterns)
+
+	@property
+	def column_patterns(self):
+		"""
+		dict: It maps the rows' keys to field name patterns.
+		"""
+		return self._column_patterns
+
+
+class _RowNames:
+	"""
+	This class provides the field names of a Rows rule's columns for each
+	row. The names of a row are computed the first time that row is used.
+	"""
+
+	def __init__(self, column_patterns):
+		self._column_patterns = tuple(column_patterns.items())
+		self._names = list()
+
+	def __getitem__(self, row_index):
+		while len(self._names) <= row_index:
+			row_number = len(self._names) + _ROW_INDEX_START
+			self._names.append(tuple(
+				(column, pattern.format(n=row_number))
+				for column, pattern in self._column_patterns))
+
+		return self._names[row_index]
+
+
+def _compile_rule(rule):
+	if isinstance(rule, str):
+		return _make_value_handler(rule)
+
+	if isinstance(rule, Checkbox):
+		return _make_checkbox_handler(rule.field_name, rule.checked_value)
+
+	if isinstance(rule, Rows):
+		return _make_rows_handler(_RowNames(rule.column_patterns))
+
+	if isinstance(rule, dict):
+		return _make_nested_handler(tuple((key, _compile_rule(sub_rule))
+			for key, sub_rule in rule.items()))
+
+	raise TypeError("Unexpected mapping rule: " + repr(rule))
+
+
+def _make_checkbox_handler(field_name, checked_value):
+	def handle_checkbox(value, field_values):
+		if value:
+			field_values[field_name] = checked_value
+
+	return handle_checkbox
+
+
+def _make_nested_handler(key_handlers):
+	def handle_nested(value, field_values):
+		for key, handler in key_handlers:
+			sub_value = value.get(key)
+
+			if sub_value is not None:
+				handler(sub_value, field_values)
+
+	return handle_nested
+
+
+def _make_rows_handler(row_names):
+	def handle_rows(rows, field_values):
+		for row_index, row in enumerate(rows):
+			for column, field_name in row_names[row_index]:
+				cell = row.get(column)
+
+				if cell is not None:
+					field_values[field_name] = cell
+
+	return handle_rows
+
+
+def _make_value_handler(field_name):
+	def handle_value(value, field_values):
+		field_values[field_name] = value
+
+	return handle_value
+
+
+class FieldMapping:
+	"""
+	This class translates the content of YAML files to field values according
+	to a mapping table compiled once.
+	"""
+
+	def __init__(self, mapping_table, map_other_keys):
+		"""
+		The constructor compiles the mapping table.
+
+		Args:
+			mapping_table (dict): It maps top-level YAML keys to rules.
+			map_other_keys (bool): If True, the values of the keys absent
+				from the table are written in the fields bearing the same
+				name.
+
+		Raises:
+			TypeError: if the table contains an object that is not a rule
+		"""
+		self._handlers = {key: _compile_rule(rule)
+			for key, rule in mapping_table.items()}
+		self._map_other_keys = map_other_keys
+
+	def map_content(self, yaml_content):
+		"""
+		Translates the content of a YAML file to field values. The keys are
+		processed in the content's order. None values are ignored.
+
+		Args:
+			yaml_content (dict): the content of a YAML file
+
+		Returns:
+			dict: It maps field names to the values to write.
+		"""
+		field_values = dict()
+		handlers = self._handlers
+		map_other_keys = self._map_other_keys
+
+		for key, value in yaml_content.items():
+			if value is None:
+				continue
+
+			handler = handlers.get(key)
+
+			if handler is not None:
+				handler(value, field_values)
+
+			elif map_other_keys:
+				field_values[key] = value
+
+		return field_values
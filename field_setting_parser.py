@@ -4,16 +4,81 @@ club expense report. The YAML file must comply with the format of those
 provided in this repository. If this module is executed and given the path to
 a YAML file as an argument, it will print the name of the report's fields in
 the console with the value they are assigned.
+
+The YAML content is read with PyYAML's safe loader, backed by library libyaml
+if it is available. The content of the files read recently is kept in a cache
+so that a file used for several reports is parsed only once. A file modified
+since it was read is parsed again.
 """
 
 
+from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
-from yaml import FullLoader, load
+from re import compile as compile_regex
+
+from field_mapping import Checkbox, FieldMapping, Rows
 
 
 _CHECKBOX_YES = "/Oui"
 _KEY_CHECKED = "Cochée"
 
+# This table maps the keys of the YAML files to the fields of expense report
+# rapport_depenses.pdf. The keys absent from it bear a field's name.
+_REPORT_MAPPING_TABLE = {
+	"RaisonVoyage": {
+		"Présentation": {
+			_KEY_CHECKED: Checkbox("Boite1", _CHECKBOX_YES),
+			"Sujet": "Présentation"
+		},
+		"Conférence": {
+			_KEY_CHECKED: Checkbox("Boite2", _CHECKBOX_YES),
+			"Nom": "Conférence"
+		},
+		"Sabbatique": Checkbox("Boite3", _CHECKBOX_YES),
+		"Autres": {
+			_KEY_CHECKED: Checkbox("Boite4", _CHECKBOX_YES),
+			"Précision": "Autres"
+		}
+	},
+	"Dépenses": Rows({
+		"Description": "Détails{n}",
+		"Montant": "Montant${n}"
+	}),
+	"Codes comptables": Rows({
+		"UBR": "UBR{n}",
+		"Compte": "CC{n}",
+		"DemFin": "DF{n}",
+		"CBS": "CBS{n}",
+		"Montant": "ccMontant${n}"
+	}),
+	"RaisonDépenses": "Group1",
+	"Statut": "Group2",
+	"ModePaiement": "Group4",
+	"Distance": "KM"
+}
+
+_REPORT_MAPPING = FieldMapping(_REPORT_MAPPING_TABLE, True)
+
+# Maximum number of YAML files whose content is kept in the cache
+_YAML_CACHE_SIZE = 128
+
+# Lines that start a directive or start or end a document in a YAML stream
+_DIRECTIVE_REGEX = compile_regex(r"%")
+_DOC_END_REGEX = compile_regex(r"\.\.\.(\s|$)")
+_DOC_START_REGEX = compile_regex(r"---(\s|$)")
+
+# Lines that do not contain YAML content
+_NO_CONTENT_REGEX = compile_regex(r"\s*(#.*)?$")
+
+
+def clear_yaml_cache():
+	"""
+	Empties the cache of the content of YAML files read by function
+	get_yaml_content.
+	"""
+	_load_yaml_file.cache_clear()
+
 
 def _dict_key_val_str(key, value):
 	"""
@@ -73,7 +138,10 @@ def filter_values_from_dict(a_dict, unwanted_vals):
 
 def get_yaml_content(yaml_file_path):
 	"""
-	Reads a YAML file and returns its content in in a dictionary.
+	Reads a YAML file and returns its content in in a dictionary. If the file
+	has not changed since it was last read, its content is copied from a cache
+	rather than parsed again. The file's modification time and size determine
+	whether it has changed.
 
 	Args:
 		yaml_file_path (pathlib.Path): the path to a YAML file
@@ -88,102 +156,59 @@ def get_yaml_content(yaml_file_path):
 	if yaml_file_path.suffixes not in ([".yaml"], [".yml"]):
 		raise ValueError("The file extension must be \".yaml\" or \".yml\".")
 
-	with yaml_file_path.open(encoding="utf8") as field_setting_stream:
-		yaml_content = load(field_setting_stream, FullLoader)
-
-	if yaml_content is None:
-		yaml_content = dict()
-
-	return yaml_content
-
-
-def _parse_codes_comptables(codes_comptables):
-	fields = dict()
-
-	for i in range(len(codes_comptables)):
-		cc = codes_comptables[i]
-
-		ubr = cc.get("UBR")
-		if ubr is not None:
-			fields["UBR" + str(i+1)] = ubr
-
-		account = cc.get("Compte")
-		if account is not None:
-			fields["CC" + str(i+1)] = account
-
-		df = cc.get("DemFin")
-		if df is not None:
-			fields["DF" + str(i+1)] = df
+	file_stat = yaml_file_path.stat()
+	yaml_content = _load_yaml_file(str(yaml_file_path.resolve()),
+		file_stat.st_mtime_ns, file_stat.st_size)
 
-		cbs = cc.get("CBS")
-		if cbs is not None:
-			fields["CBS" + str(i+1)] = cbs
+	# The caller can modify the content without altering the cache.
+	return deepcopy(yaml_content)
 
-		amount = cc.get("Montant")
-		if amount is not None:
-			fields["ccMontant$" + str(i+1)] = amount
 
-	return fields
-
-
-def _parse_expense_list(expense_list):
-	fields = dict()
-
-	for i, expense in enumerate(expense_list):
-		if (description := expense.get("Description")) is not None:
-			fields["Détails" + str(i+1)] = description
-
-		amount = expense.get("Montant")
-		if amount is not None:
-			fields["Montant$" + str(i+1)] = amount
-
-	return fields
-
-
-def _parse_travel_reasons(travel_reason_dict):
-	fields = dict()
-
-	presentation = travel_reason_dict.get("Présentation")
-	if presentation is not None:
-		presentation_checked = presentation.get(_KEY_CHECKED)
-
-		if presentation_checked:
-			fields["Boite1"] = _CHECKBOX_YES
+def get_yaml_loader():
+	"""
+	Provides PyYAML's safe loader implemented with libyaml if this library is
+	available or the loader implemented in Python otherwise.
 
-		presentation_subject = presentation.get("Sujet")
+	Returns:
+		class: yaml.CSafeLoader or yaml.SafeLoader
+	"""
+	# PyYAML is only imported when YAML content is read.
+	try:
+		from yaml import CSafeLoader as SafeLoader
 
-		if presentation_subject is not None:
-			fields["Présentation"] = presentation_subject
+	except ImportError:
+		from yaml import SafeLoader
 
-	conference = travel_reason_dict.get("Conférence")
-	if conference is not None:
-		conference_checked = conference.get(_KEY_CHECKED)
+	return SafeLoader
 
-		if conference_checked:
-			fields["Boite2"] = _CHECKBOX_YES
 
-		conference_name = conference.get("Nom")
+def load_yaml_content(yaml_stream):
+	"""
+	Reads YAML content from a stream or a string and returns it in a
+	dictionary. The content is read with the loader provided by function
+	get_yaml_loader.
 
-		if conference_name is not None:
-			fields["Conférence"] = conference_name
+	Args:
+		yaml_stream: a text stream or a string that contains YAML
 
-	sabbatical = travel_reason_dict.get("Sabbatique")
-	if sabbatical:
-		fields["Boite3"] = _CHECKBOX_YES
+	Returns:
+		dict: the YAML content
+	"""
+	from yaml import load
 
-	others = travel_reason_dict.get("Autres")
-	if others is not None:
-		others_checked = others.get(_KEY_CHECKED)
+	yaml_content = load(yaml_stream, get_yaml_loader())
 
-		if others_checked:
-			fields["Boite4"] = _CHECKBOX_YES
+	if yaml_content is None:
+		yaml_content = dict()
 
-		others_precision = others.get("Précision")
+	return yaml_content
 
-		if others_precision is not None:
-			fields["Autres"] = others_precision
 
-	return fields
+@lru_cache(maxsize=_YAML_CACHE_SIZE)
+def _load_yaml_file(yaml_file_path, mtime_ns, size):
+	# The modification time and the size are only part of the cache key.
+	with open(yaml_file_path, encoding="utf8") as field_setting_stream:
+		return load_yaml_content(field_setting_stream)
 
 
 def parse_yaml_content(yaml_content):
@@ -202,34 +227,7 @@ def parse_yaml_content(yaml_content):
 	"""
 	# Function update_page_fields from library PyPDF2_Fields must be able to
 	# process the dictionary returned by this function.
-	field_values = dict()
-
-	for key, value in yaml_content.items():
-		if key == "RaisonVoyage" and value is not None:
-			field_values.update(_parse_travel_reasons(value))
-
-		elif key == "Dépenses" and value is not None:
-			field_values.update(_parse_expense_list(value))
-
-		elif key == "Codes comptables" and value is not None:
-			field_values.update(_parse_codes_comptables(value))
-
-		elif key == "RaisonDépenses" and value is not None:
-			field_values["Group1"] = value
-
-		elif key == "Statut" and value is not None:
-			field_values["Group2"] = value
-
-		elif key == "ModePaiement" and value is not None:
-			field_values["Group4"] = value
-
-		elif key == "Distance" and value is not None:
-			field_values["KM"] = value
-
-		elif value is not None:
-			field_values[key] = value
-
-	return field_values
+	return _REPORT_MAPPING.map_content(yaml_content)
 
 
 def print_dictionary(a_dict, print_val_type):
@@ -248,6 +246,73 @@ def print_dictionary(a_dict, print_val_type):
 		print(item_to_str_fnc(key, value))
 
 
+def split_yaml_documents(yaml_stream):
+	"""
+	Splits a YAML stream into its documents without parsing them. The stream
+	is read one line at a time, and every document is provided as soon as it
+	ends. A document starts with a line that begins with "---". The content
+	that precedes the first such line is a document only if it is not made
+	of comments and blank lines. Directive lines, which begin with "%", belong
+	to the document that follows them. Since the documents are parsed
+	separately, a malformed document does not prevent reading the others.
+
+	Args:
+		yaml_stream: a text stream that contains YAML documents
+
+	Yields:
+		str: the text of a document
+	"""
+	doc_lines = list()
+	doc_is_explicit = False
+	# True while doc_lines contains the directives of the next document
+	in_directives = False
+
+	for line in yaml_stream:
+		if _DIRECTIVE_REGEX.match(line):
+			if not in_directives:
+				if doc_is_explicit or _has_content(doc_lines):
+					yield "".join(doc_lines)
+
+				doc_lines = list()
+				doc_is_explicit = False
+				in_directives = True
+
+			doc_lines.append(line)
+
+		elif _DOC_START_REGEX.match(line):
+			if in_directives:
+				# The directives must precede the marker.
+				doc_lines.append(line)
+				in_directives = False
+
+			else:
+				if doc_is_explicit or _has_content(doc_lines):
+					yield "".join(doc_lines)
+
+				# Content can follow the marker on the same line.
+				doc_lines = [line[3:]]
+
+			doc_is_explicit = True
+
+		elif _DOC_END_REGEX.match(line):
+			if doc_is_explicit or _has_content(doc_lines):
+				yield "".join(doc_lines)
+
+			doc_lines = list()
+			doc_is_explicit = False
+			in_directives = False
+
+		else:
+			doc_lines.append(line)
+
+	if doc_is_explicit or _has_content(doc_lines):
+		yield "".join(doc_lines)
+
+
+def _has_content(doc_lines):
+	return any(not _NO_CONTENT_REGEX.match(line) for line in doc_lines)
+
+
 def str_to_bool(bool_str):
 	"""
 	Converts a string to a Boolean value.
@@ -0,0 +1,95 @@
+"""
+This module detects the changes made to a set of files. The files' status,
+their modification time and size, is read periodically and compared with the
+previous reading. This polling works on every platform and filesystem without
+an additional library. A burst of changes, like an editor saving a file in
+several steps, is reported once after the files stop changing.
+"""
+
+
+from time import monotonic, sleep
+
+
+DFLT_POLL_INTERVAL_S = 0.5
+DFLT_QUIET_PERIOD_S = 1.0
+
+
+class FileWatcher:
+	"""
+	This class reports the files that were created, modified or deleted
+	since its previous reading. The set of watched files is provided by a
+	function, so files created later can be watched too.
+	"""
+
+	def __init__(self, find_paths):
+		"""
+		The constructor reads the status of the watched files a first time.
+
+		Args:
+			find_paths: a function without arguments that returns the paths
+				(pathlib.Path) of the files to watch
+		"""
+		self._find_paths = find_paths
+		self._file_states = self._read_file_states()
+
+	def poll(self):
+		"""
+		Reads the status of the watched files and compares it with the
+		previous reading.
+
+		Returns:
+			set: the paths of the files created, modified or deleted since the
+				previous reading
+		"""
+		file_states = self._read_file_states()
+		previous_states = self._file_states
+		self._file_states = file_states
+
+		return {path for path in file_states.keys() | previous_states.keys()
+			if file_states.get(path) != previous_states.get(path)}
+
+	def _read_file_states(self):
+		file_states = dict()
+
+		for path in self._find_paths():
+			try:
+				file_stat = path.stat()
+			except OSError:
+				continue
+
+			file_states[path] = (file_stat.st_mtime_ns, file_stat.st_size)
+
+		return file_states
+
+	def wait_for_changes(self, poll_interval=DFLT_POLL_INTERVAL_S,
+			quiet_period=DFLT_QUIET_PERIOD_S):
+		"""
+		Waits until files change, then until they stop changing for
+		quiet_period seconds.
+
+		Args:
+			poll_interval (float): the time in seconds between two readings.
+				Defaults to DFLT_POLL_INTERVAL_S.
+			quiet_period (float): the time in seconds without changes that
+				ends a burst of changes. Defaults to DFLT_QUIET_PERIOD_S.
+
+		Returns:
+			set: the paths of all the files changed during the burst
+		"""
+		changed_paths = set()
+
+		while len(changed_paths) == 0:
+			sleep(poll_interval)
+			changed_paths = self.poll()
+
+		last_change = monotonic()
+
+		while monotonic() - last_change < quiet_period:
+			sleep(poll_interval)
+			new_changes = self.poll()
+
+			if len(new_changes) > 0:
+				changed_paths.update(new_changes)
+				last_change = monotonic()
+
+		return changed_paths
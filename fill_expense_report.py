@@ -1,24 +1,47 @@
 """
 This script creates a PDF expense report for ÉTS clubs by copying a template
 file and filling the copy's fields. The template is not modified.
+
+In incremental mode, the report is the template's file followed by an
+incremental update that contains only the filled fields. If an existing report
+is provided, it replaces the template as the base of the update.
+
+With a name template (-n), the YAML file can contain several documents
+separated by "---". Each document produces a report in the output directory.
+The documents are read and filled one at a time, and a malformed document does
+not prevent creating the reports of the others.
+
+Other Python programs can fill reports in their own process with function
+fill_report. It returns the report's content or writes it in a stream and
+raises exceptions rather than exiting.
 """
 
 
+# PyPDF2, PyPDF2_Fields and module report_template are imported in the
+# functions that use them. Printing the help or rejecting an argument does not
+# need to load them.
+
+
 from argparse import ArgumentParser
+from io import BytesIO
 from pathlib import Path
+from re import compile as compile_regex
 from sys import exit
 
 from field_setting_parser import\
 	get_yaml_content,\
-	parse_yaml_content
+	load_yaml_content,\
+	parse_yaml_content,\
+	split_yaml_documents
+from memory_guard import\
+	add_memory_args,\
+	limit_memory,\
+	peak_memory_report
 from path_arg_checks import check_ungenerable_path
-from PyPDF2 import PdfFileReader
-from PyPDF2_Fields import\
-	make_writer_from_reader,\
-	pair_fields_name_and_val,\
-	RadioBtnGroup,\
-	set_need_appearances,\
-	update_page_fields
+from stage_timings import\
+	add_instrumentation_args,\
+	instrumented_run,\
+	timed_stage
 
 
 _ADVANCE_FIELD = "Avance"
@@ -33,18 +56,259 @@ _DFLT_TEMPLATE_PATH = Path(__file__).parents[0]/"rapport_depenses.pdf"
 _EXTENSION_PDF = ".pdf"
 _EXTENSION_YML = ".yml"
 
+_FLAG_READ_ONLY = 1
+
+_KEY_ACROFORM = "/AcroForm"
+_KEY_ANNOTS = "/Annots"
+_KEY_FF = "/Ff"
+_KEY_FT = "/FT"
+_KEY_NEED_APPEARANCES = "/NeedAppearances"
+_KEY_PARENT = "/Parent"
+_KEY_ROOT = "/Root"
+_KEY_SUBTYPE = "/Subtype"
+_KEY_T = "/T"
+
 _NAME_CHOICE1 = "/Choix1"
 _NAME_CHOICE2 = "/Choix2"
 
+# The states of group 4's buttons are "Dépôt" and "Chèque" in the PDF encoding
+# of names. Their appearances bear these exact names.
+_NAME_CHEQUE = "/Ch#E8que"
+_NAME_DEPOSIT = "/D#E9p#F4t"
+
 _NAME_GROUP1 = "Group1"
 _NAME_GROUP2 = "Group2"
 _NAME_GROUP4 = "Group4"
 
+_NAME_WIDGET = "/Widget"
+
+# Key of the document's number in the output name template
+_KEY_INDEX = "index"
+
+# Characters replaced in the names made from a name template
+_UNSAFE_NAME_CHARS = compile_regex(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def check_template_path(template_path):
+	"""
+	Verifies the path to the report template. The script is interrupted if the
+	template cannot be used.
+
+	Args:
+		template_path (pathlib.Path): the path provided by argument
+			-t/--template or the default template path
+	"""
+	if template_path == _DFLT_TEMPLATE_PATH:
+		if not template_path.exists():
+			print("ERROR! Default report template "
+				+ str(template_path) + " not found.")
+			exit(1)
+	else:
+		check_ungenerable_path(
+			template_path, "-t/--template", _EXTENSION_PDF, must_exist=True)
+
+
+def choose_report_base(template, pdf_data_path, incremental):
+	"""
+	Determines the document to fill. In incremental mode, the existing report
+	replaces the template as the base of the new report. Its field values must
+	then not be copied since the base already contains them.
+
+	Args:
+		template (ReportTemplate): the loaded report template. It can be None
+			if incremental is True and pdf_data_path is not None.
+		pdf_data_path (pathlib.Path): the path to an existing report. It can
+			be None.
+		incremental (bool): If True, the report will be written as an
+			incremental update.
+
+	Returns:
+		tuple: the ReportTemplate to fill and the path to the report whose
+			field values must be copied. The path is None if no values must
+			be copied.
+	"""
+	if incremental and pdf_data_path is not None:
+		from report_template import ReportTemplate
+
+		with timed_stage("template_load"):
+			return ReportTemplate(pdf_data_path, cache_dir=None), None
+
+	return template, pdf_data_path
+
+
+def _fill_reader(reader, template, field_values, radio_btn_groups,
+		editable):
+	from PyPDF2.generic import BooleanObject, NameObject
+
+	template.field_index.update_fields(
+		reader, field_values, *radio_btn_groups)
+
+	with timed_stage("appearances"):
+		appearances_made = template.field_appearances.update_appearances(
+			reader, template.field_index, field_values)
+
+	catalog = reader.trailer[_KEY_ROOT]
+	if not appearances_made and _KEY_ACROFORM in catalog:
+		# To make the values of the fields without an appearance visible
+		catalog[_KEY_ACROFORM][NameObject(_KEY_NEED_APPEARANCES)]\
+			= BooleanObject(True)
+
+	if not editable:
+		_make_fields_read_only(reader.getPage(0))
+
+
+def fill_report(field_setting, template=None, pdf_data=None, editable=False,
+		incremental=False, output_stream=None):
+	"""
+	Fills a report in the calling process. Unlike the script, this function
+	does not check the paths' extension nor exit. It raises an exception if
+	the report cannot be made. Passing the same loaded template to every call
+	avoids parsing it again. Threads can share a template.
+
+	Args:
+		field_setting: the values to write in the report: YAML content in a
+			str, the pathlib.Path to a YAML field setting file or the
+			dictionary that loading such a file produces
+		template: the loaded ReportTemplate or the pathlib.Path to a report
+			template. It is ignored if incremental is True and pdf_data is not
+			None. Defaults to None, which means the default template.
+		pdf_data (pathlib.Path): the path to an existing report whose field
+			values are copied. Defaults to None.
+		editable (bool): If True, the report can be modified. Defaults to
+			False.
+		incremental (bool): If True, the report is written as an incremental
+			update of the template's file or of pdf_data. Defaults to False.
+		output_stream: a binary stream where the report is written. Defaults
+			to None, which means that the report is returned.
+
+	Returns:
+		bytes: the report if output_stream is None
+		None: otherwise
+
+	Raises:
+		IndexError: if a radio button group is set to an index that matches
+			none of its buttons
+		OSError: if a file cannot be read
+		TypeError: if an amount is not a number, for example a str, since
+			the totals cannot be computed
+		ValueError: if the field setting is invalid or if a file cannot be
+			filled
+		yaml.YAMLError: if the YAML content is malformed
+	"""
+	from report_template import ReportTemplate
+
+	if not isinstance(template, ReportTemplate)\
+			and not (incremental and pdf_data is not None):
+		with timed_stage("template_load"):
+			template = ReportTemplate(_DFLT_TEMPLATE_PATH
+				if template is None else Path(template))
+
+	radio_btn_groups = make_radio_btn_groups()
+	base, pdf_data = choose_report_base(template, pdf_data, incremental)
+	field_values = make_field_values(field_setting, pdf_data, radio_btn_groups)
+
+	report_stream = BytesIO() if output_stream is None else output_stream
+	write_report(base, field_values, radio_btn_groups, editable,
+		incremental, report_stream)
+
+	return report_stream.getvalue() if output_stream is None else None
+
+
+def fill_reports_from_stream(template, yml_stream, pdf_data_path,
+		radio_btn_groups, editable, incremental, output_dir, name_template):
+	"""
+	Creates one report for each document of a multi-document YAML stream. The
+	documents are read, parsed and filled one at a time, so the memory used
+	does not depend on the stream's length. The reports are named with
+	function make_report_name. A document that cannot be parsed, named or
+	filled is reported without stopping the others.
+
+	Args:
+		template (ReportTemplate): the loaded report template. It can be None
+			if incremental is True and pdf_data_path is not None.
+		yml_stream: a text stream that contains YAML documents
+		pdf_data_path (pathlib.Path): the path to an existing report whose
+			field values every report receives. It can be None.
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		editable (bool): If True, the reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates of the template or of the existing report.
+		output_dir (pathlib.Path): the directory where the reports are
+			created
+		name_template (str): the template of the reports' names
+
+	Yields:
+		tuple: a document's number, starting at 1, the path to its report and
+			an error message. The error message is None if the report was
+			created. The path is None if the name could not be made.
+	"""
+	base, pdf_data_path = choose_report_base(
+		template, pdf_data_path, incremental)
+
+	if pdf_data_path is None:
+		pdf_field_values = dict()
+	else:
+		with timed_stage("pdf_reading"):
+			pdf_field_values = get_fields_from_pdf(
+				pdf_data_path, radio_btn_groups[0], radio_btn_groups[1])
+
+	# It maps the names of the reports created to their document's number.
+	doc_numbers = dict()
+
+	for doc_number, document in enumerate(
+			split_yaml_documents(yml_stream), 1):
+		output_path = None
+
+		try:
+			with timed_stage("yaml_reading"):
+				yaml_content = load_yaml_content(document)
+
+			report_name = make_report_name(
+				name_template, yaml_content, doc_number)
+
+			if report_name in doc_numbers:
+				raise ValueError("Document " + str(doc_numbers[report_name])
+					+ " has the same report name: " + report_name)
 
-def _get_fields_from_pdf(pdf_data_path, radio_btn_group1, radio_btn_group2):
-	pdf_data_source =\
-		PdfFileReader(pdf_data_path.open(mode="rb"), strict=False)
-	field_values = pair_fields_name_and_val(pdf_data_source.getFields(), True)
+			doc_numbers[report_name] = doc_number
+			output_path = output_dir/report_name
+
+			with timed_stage("yaml_parsing"):
+				field_values = dict(pdf_field_values)
+				field_values.update(parse_field_values(yaml_content))
+
+			with output_path.open(mode="wb") as output_stream:
+				write_report(base, field_values, radio_btn_groups, editable,
+					incremental, output_stream)
+
+		except Exception as e:
+			yield doc_number, output_path, type(e).__name__ + ": " + str(e)
+			continue
+
+		yield doc_number, output_path, None
+
+
+def get_fields_from_pdf(pdf_data_path, radio_btn_group1, radio_btn_group2):
+	"""
+	Reads the values of an existing report's fields. The selected buttons of
+	the radio button groups are replaced with their index, the form that
+	parse_field_values gives them. A selection that matches no button is left
+	unchanged.
+
+	Args:
+		pdf_data_path (pathlib.Path): the path to an existing report
+		radio_btn_group1 (RadioBtnGroup): the report's radio button group 1
+		radio_btn_group2 (RadioBtnGroup): the report's radio button group 2
+
+	Returns:
+		dict: It maps the names of the fields that have a value to that value.
+	"""
+	from form_reader import read_form_fields
+	from PyPDF2_Fields import pair_fields_name_and_val
+
+	field_values = pair_fields_name_and_val(
+		read_form_fields(pdf_data_path), True)
 
 	try:
 		group1_index = radio_btn_group1.index(field_values.get(_NAME_GROUP1))
@@ -66,24 +330,104 @@ def _get_fields_from_pdf(pdf_data_path, radio_btn_group1, radio_btn_group2):
 
 
 def _index_from_btn_group4(selected_btn):
-	if selected_btn == "/D#E9p#F4t":
+	if selected_btn == _NAME_DEPOSIT:
 		return 0
 
-	elif selected_btn == "/Ch#E8que":
+	elif selected_btn == _NAME_CHEQUE:
 		return 1
 
 	else:
 		return -1
 
 
+def _make_fields_read_only(page):
+	from PyPDF2.generic import NameObject, NumberObject
+
+	if _KEY_ANNOTS not in page:
+		return
+
+	for annot in page[_KEY_ANNOTS]:
+		annot = annot.getObject()
+
+		# Markup annotations, like comments, also have a title (/T).
+		if annot.get(_KEY_SUBTYPE) != _NAME_WIDGET and _KEY_FT not in annot:
+			continue
+
+		if _KEY_T in annot:
+			field = annot
+		elif _KEY_PARENT in annot:
+			field = annot[_KEY_PARENT]
+		else:
+			continue
+
+		field[NameObject(_KEY_FF)] = NumberObject(
+			field.get(_KEY_FF, 0) | _FLAG_READ_ONLY)
+
+
+def _make_document_id(template, field_values, editable):
+	# The identifier depends only on the report's inputs so that the same
+	# inputs always produce the same file.
+	from hashlib import md5
+	from PyPDF2.generic import ArrayObject, ByteStringObject
+
+	content_repr = repr((list(field_values.items()), editable))
+	return ArrayObject((ByteStringObject(md5(template.content_hash).digest()),
+		ByteStringObject(md5(template.content_hash
+			+ content_repr.encode("utf8")).digest())))
+
+
+def make_field_values(field_setting, pdf_data_path, radio_btn_groups):
+	"""
+	Gathers the values to write in a report. The values from the field
+	setting overwrite those from the existing report.
+
+	Args:
+		field_setting: YAML content in a str, the pathlib.Path to a YAML
+			field setting file or the dictionary that loading such a file
+			produces
+		pdf_data_path (pathlib.Path): the path to an existing report whose
+			field values are copied. It can be None.
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+
+	Returns:
+		dict: It maps field names to the values to write.
+	"""
+	if pdf_data_path is None:
+		field_values = dict()
+	else:
+		with timed_stage("pdf_reading"):
+			field_values = get_fields_from_pdf(
+				pdf_data_path, radio_btn_groups[0], radio_btn_groups[1])
+
+	with timed_stage("yaml_reading"):
+		if isinstance(field_setting, Path):
+			yaml_content = get_yaml_content(field_setting)
+		elif isinstance(field_setting, str):
+			yaml_content = load_yaml_content(field_setting)
+		else:
+			yaml_content = field_setting
+
+	with timed_stage("yaml_parsing"):
+		field_values.update(parse_field_values(yaml_content))
+
+	return field_values
+
+
 def _make_parser():
 	parser = ArgumentParser(description=__doc__)
 
 	parser.add_argument("-e", "--editable", action="store_true",
-		help="Makes the filled report editable.")
+		help="Makes the filled report editable. Without this flag, the fields of an incremental (-i) report are made read-only.")
+
+	parser.add_argument("-i", "--incremental", action="store_true",
+		help="Writes the report as the template, or the -p report, followed by an incremental update containing the filled fields.")
+
+	parser.add_argument("-n", "--name_template", type=str, default=None,
+		help="Template of the names of the reports made from a multi-document -y file, like \"{NomUA}_{Date}_{index}.pdf\". The fields are the documents' top-level keys and index, the document's number.")
 
 	parser.add_argument("-o", "--output", type=Path, default=None,
-		help="Path to the filled PDF report created by this script")
+		help="Path to the filled PDF report created by this script. With -n, directory where the reports are created. It then defaults to the current working directory.")
 
 	parser.add_argument("-p", "--pdf_data", type=Path, default=None,
 		help="Path to the .pdf field setting file.")
@@ -95,10 +439,154 @@ def _make_parser():
 	parser.add_argument("-y", "--yml_data", type=Path, default=None,
 		help="Path to the .yml field setting file.")
 
+	add_instrumentation_args(parser)
+	add_memory_args(parser)
+
 	return parser
 
 
-def _set_automatic_field_vals(field_dict):
+def make_filled_reader(template, field_values, radio_btn_groups, editable):
+	"""
+	Fills a copy of the template in a reader. The reader can then be written
+	as an incremental update or added to a combined document.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		field_values (dict): It maps field names to the values to write.
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		editable (bool): If False, the fields are made read-only.
+
+	Returns:
+		PyPDF2.PdfFileReader: a reader that contains the filled report
+	"""
+	with timed_stage("template_copy"):
+		reader = template.make_fill_reader()
+
+	with timed_stage("field_update"):
+		_fill_reader(
+			reader, template, field_values, radio_btn_groups, editable)
+
+	return reader
+
+
+def make_radio_btn_groups():
+	"""
+	Creates the objects that represent the radio button groups of the expense
+	report.
+
+	Returns:
+		tuple: the RadioBtnGroup instances of groups 1, 2 and 4
+	"""
+	from PyPDF2_Fields import RadioBtnGroup
+
+	radio_btn_group1 = RadioBtnGroup(
+		_NAME_GROUP1, _NAME_CHOICE1, _NAME_CHOICE2)
+	radio_btn_group2 = RadioBtnGroup(
+		_NAME_GROUP2, _NAME_CHOICE1, _NAME_CHOICE2)
+	radio_btn_group4 = RadioBtnGroup(
+		_NAME_GROUP4, _NAME_DEPOSIT, _NAME_CHEQUE)
+
+	return radio_btn_group1, radio_btn_group2, radio_btn_group4
+
+
+def make_report_name(name_template, yaml_content, doc_number):
+	"""
+	Makes the file name of a report from a template like
+	"{NomUA}_{Date}_{index}.pdf". The template's fields are the top-level keys
+	of the report's YAML document and index, the document's number. The
+	characters that cannot appear in a file name are replaced with "_".
+	Extension .pdf is appended if the name does not have it.
+
+	Args:
+		name_template (str): a template in the syntax of method str.format
+		yaml_content (dict): the content of the report's YAML document
+		doc_number (int): the document's number in its stream
+
+	Returns:
+		str: the report's file name
+
+	Raises:
+		ValueError: if the template contains a field absent from the
+			document
+	"""
+	name_fields = {str(key): value for key, value in yaml_content.items()}
+	name_fields[_KEY_INDEX] = doc_number
+
+	try:
+		report_name = name_template.format(**name_fields)
+
+	except KeyError as e:
+		raise ValueError("The document does not contain key "
+			+ str(e) + " of the name template.")
+
+	report_name = _UNSAFE_NAME_CHARS.sub("_", report_name)
+
+	if not report_name.endswith(_EXTENSION_PDF):
+		report_name += _EXTENSION_PDF
+
+	return report_name
+
+
+def make_report_base(template, field_setting, pdf_data_path,
+		radio_btn_groups, incremental):
+	"""
+	Determines the document to fill and the values to write in it. In
+	incremental mode, the existing report replaces the template as the base
+	of the new report. Its field values are then not copied since the base
+	already contains them.
+
+	Args:
+		template (ReportTemplate): the loaded report template. It can be None
+			if incremental is True and pdf_data_path is not None.
+		field_setting: YAML content in a str, the pathlib.Path to a YAML
+			field setting file or the dictionary that loading such a file
+			produces
+		pdf_data_path (pathlib.Path): the path to an existing report. It can
+			be None.
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		incremental (bool): If True, the report will be written as an
+			incremental update.
+
+	Returns:
+		tuple: the ReportTemplate to fill and the dictionary that maps field
+			names to the values to write
+	"""
+	base, pdf_data_path = choose_report_base(
+		template, pdf_data_path, incremental)
+	field_values = make_field_values(
+		field_setting, pdf_data_path, radio_btn_groups)
+
+	return base, field_values
+
+
+def parse_field_values(yaml_content):
+	"""
+	Translates the content of a YAML field setting file to field values and
+	computes the values of the automatic fields, like the totals.
+
+	Args:
+		yaml_content (dict): content of a YAML file returned by
+			get_yaml_content
+
+	Returns:
+		dict: It maps field names to the values to write.
+	"""
+	yml_data = parse_yaml_content(yaml_content)
+	set_automatic_field_vals(yml_data)
+	return yml_data
+
+
+def set_automatic_field_vals(field_dict):
+	"""
+	Computes the values of the fields that depend on other fields: the totals
+	and the claimed amount.
+
+	Args:
+		field_dict (dict): It maps field names to the values to write. The
+			computed values are added to it.
+	"""
 	_set_total_montant(field_dict, False)
 	_set_reclamation(field_dict)
 	_set_total_montant(field_dict, True)
@@ -131,58 +619,131 @@ def _set_total_montant(field_dict, cc):
 		field_dict[total_amount_field] = total_montant
 
 
+def write_report(template, field_values, radio_btn_groups, editable,
+		incremental, output_stream):
+	"""
+	Fills a copy of the template and writes it in a stream.
+
+	Args:
+		template (ReportTemplate): the loaded report template. In incremental
+			mode, it can be an existing report.
+		field_values (dict): It maps field names to the values to write.
+		radio_btn_groups (tuple): the report's radio button groups, made by
+			function make_radio_btn_groups
+		editable (bool): If True, the report can be modified.
+		incremental (bool): If True, the report is written as an incremental
+			update of the template's file.
+		output_stream: a binary stream where the report is written
+	"""
+	if incremental:
+		# The fields are made read-only since the template's catalog, which
+		# makes them modifiable, is kept.
+		reader = make_filled_reader(
+			template, field_values, radio_btn_groups, editable)
+
+		with timed_stage("writing"):
+			template.write_update(reader, output_stream)
+
+	else:
+		# The fields are found through the template's index rather than
+		# searched in the writer's page. The template's objects that filling
+		# does not modify are neither copied nor serialized again.
+		with timed_stage("template_copy"):
+			skeleton = template.writer_skeleton(editable)
+			reader = template.make_fill_reader()
+
+		with timed_stage("field_update"):
+			template.field_index.update_fields(
+				reader, field_values, *radio_btn_groups)
+
+		with timed_stage("appearances"):
+			appearances_made = template.field_appearances\
+				.update_appearances(
+					reader, template.field_index, field_values)
+
+		# Viewers must make the appearances that could not be made here.
+		with timed_stage("writing"):
+			skeleton.write(reader, not appearances_made,
+				_make_document_id(template, field_values, editable),
+				output_stream)
+
+
 if __name__ == "__main__":
 	parser = _make_parser()
 	args = parser.parse_args()
+	name_template = args.name_template # -n
 	output_path = args.output # -o
 	pdf_data_path = args.pdf_data # -p
 	template_path = args.template # -t
 	yml_data_path = args.yml_data # -y
 
-	check_ungenerable_path(
-		output_path, "-o/--output", _EXTENSION_PDF, must_exist=False)
-
-	if pdf_data_path is not None:
-		check_ungenerable_path(
-			pdf_data_path, "-p/--pdf_data", _EXTENSION_PDF, must_exist=True)
-
-	if template_path == _DFLT_TEMPLATE_PATH:
-		if not template_path.exists():
-			print("ERROR! Default report template "
-				+ str(template_path) + " not found.")
+	if args.max_memory is not None:
+		try:
+			limit_memory(args.max_memory)
+		except ValueError as e:
+			print("ERROR! " + str(e))
 			exit(1)
-	else:
-		check_ungenerable_path(
-			template_path, "-t/--template", _EXTENSION_PDF, must_exist=True)
-
-	check_ungenerable_path(
-		yml_data_path, "-y/--yml_data", _EXTENSION_YML, must_exist=True)
-
-	template = PdfFileReader(template_path.open(mode="rb"), strict=False)
-	writer = make_writer_from_reader(template, args.editable)
-
-	radio_btn_group1 = RadioBtnGroup(
-		_NAME_GROUP1, _NAME_CHOICE1, _NAME_CHOICE2)
-	radio_btn_group2 = RadioBtnGroup(
-		_NAME_GROUP2, _NAME_CHOICE1, _NAME_CHOICE2)
-	radio_btn_group4 = RadioBtnGroup(
-		_NAME_GROUP4, "/Dépôt", "/Chèque")
-
-	if pdf_data_path is None:
-		field_values = dict()
-	else:
-		field_values = _get_fields_from_pdf(
-			pdf_data_path, radio_btn_group1, radio_btn_group2)
-
-	yaml_content = get_yaml_content(yml_data_path)
-	yml_data = parse_yaml_content(yaml_content)
-	_set_automatic_field_vals(yml_data)
-
-	field_values.update(yml_data)
-
-	page = writer.getPage(0)
-	update_page_fields(page, field_values,
-		radio_btn_group1, radio_btn_group2, radio_btn_group4)
 
-	set_need_appearances(writer, True) # To make field values visible
-	writer.write(output_path.open(mode="wb"))
+	with peak_memory_report(args.peak_memory),\
+			instrumented_run(args.timings, args.profile):
+		with timed_stage("path_checks"):
+			if name_template is None:
+				check_ungenerable_path(output_path, "-o/--output",
+					_EXTENSION_PDF, must_exist=False)
+
+			elif output_path is None:
+				output_path = Path.cwd()
+
+			elif output_path.exists() and not output_path.is_dir():
+				print("ERROR! With -n/--name_template, -o/--output must be a directory.")
+				exit(1)
+
+			if pdf_data_path is not None:
+				check_ungenerable_path(pdf_data_path, "-p/--pdf_data",
+					_EXTENSION_PDF, must_exist=True)
+
+			check_template_path(template_path)
+
+			check_ungenerable_path(yml_data_path, "-y/--yml_data",
+				_EXTENSION_YML, must_exist=True)
+
+		radio_btn_groups = make_radio_btn_groups()
+
+		if args.incremental and pdf_data_path is not None:
+			template = None
+		else:
+			from report_template import ReportTemplate
+
+			with timed_stage("template_load"):
+				template = ReportTemplate(template_path)
+
+		if name_template is None:
+			with output_path.open(mode="wb") as output_stream:
+				fill_report(yml_data_path, template, pdf_data_path,
+					args.editable, args.incremental, output_stream)
+
+		else:
+			output_path.mkdir(parents=True, exist_ok=True)
+			report_count = 0
+			failure_count = 0
+
+			with yml_data_path.open(encoding="utf8") as yml_stream:
+				for doc_number, report_path, error_msg\
+						in fill_reports_from_stream(template, yml_stream,
+							pdf_data_path, radio_btn_groups, args.editable,
+							args.incremental, output_path, name_template):
+					if error_msg is None:
+						report_count += 1
+						print("OK document " + str(doc_number)
+							+ " -> " + str(report_path))
+
+					else:
+						failure_count += 1
+						print("FAILED document " + str(doc_number)
+							+ ": " + error_msg)
+
+			print(str(report_count) + " report(s) created, "
+				+ str(failure_count) + " failure(s)")
+
+	if name_template is not None and failure_count > 0:
+		exit(1)
@@ -0,0 +1,259 @@
+"""
+This script runs a local HTTP server that fills ÉTS club expense reports. The
+report template is loaded once when the server starts. Each POST request must
+contain the YAML content of a field setting file or, with content type
+application/json, the dictionary of field values that function
+parse_yaml_content produces. The response contains the filled PDF report.
+
+The server can listen on a TCP port of the local host or on a Unix socket.
+A fixed number of threads fill the reports. The requests that arrive while
+all the threads and the waiting queue are busy receive status 503.
+"""
+
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from json import loads as json_loads
+from pathlib import Path
+from socketserver import UnixStreamServer
+from threading import BoundedSemaphore
+
+from field_setting_parser import load_yaml_content
+from fill_expense_report import\
+	check_template_path,\
+	make_radio_btn_groups,\
+	parse_field_values,\
+	set_automatic_field_vals,\
+	write_report
+
+
+_DFLT_TEMPLATE_PATH = Path(__file__).parents[0]/"rapport_depenses.pdf"
+
+_CONTENT_TYPE_JSON = "application/json"
+_CONTENT_TYPE_PDF = "application/pdf"
+_CONTENT_TYPE_TEXT = "text/plain; charset=utf-8"
+
+# Maximum size of a request's body in bytes
+_MAX_BODY_SIZE = 1 << 20
+
+
+class _BoundedPoolMixin:
+	"""
+	This mixin makes a socketserver server handle its requests with a fixed
+	number of threads. The requests that cannot be handled or queued are
+	rejected immediately.
+	"""
+
+	def init_pool(self, thread_count, queue_size):
+		self._executor = ThreadPoolExecutor(thread_count)
+		self._slots = BoundedSemaphore(thread_count + queue_size)
+
+	def process_request(self, request, client_address):
+		if self._slots.acquire(blocking=False):
+			self._executor.submit(
+				self._process_request_in_thread, request, client_address)
+
+		else:
+			try:
+				request.sendall(b"HTTP/1.0 503 Service Unavailable\r\n"
+					+ b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+
+			finally:
+				self.shutdown_request(request)
+
+	def _process_request_in_thread(self, request, client_address):
+		try:
+			self.finish_request(request, client_address)
+
+		except Exception:
+			self.handle_error(request, client_address)
+
+		finally:
+			self.shutdown_request(request)
+			self._slots.release()
+
+	def server_close(self):
+		super().server_close()
+		self._executor.shutdown(wait=True)
+
+
+class _TcpFillServer(_BoundedPoolMixin, HTTPServer):
+	"""
+	This class is an HTTP server that listens on a TCP port and handles its
+	requests with a fixed number of threads.
+	"""
+
+
+class _UnixFillServer(_BoundedPoolMixin, UnixStreamServer):
+	"""
+	This class is a server that listens on a Unix socket and handles its
+	requests with a fixed number of threads.
+	"""
+
+
+class _FillRequestHandler(BaseHTTPRequestHandler):
+	"""
+	This class fills a report for every POST request. The server must have
+	attributes template, radio_btn_groups, editable and incremental.
+	"""
+
+	def address_string(self):
+		# Unix socket clients do not have an address.
+		if isinstance(self.client_address, tuple):
+			return super().address_string()
+
+		return "unix"
+
+	def do_POST(self):
+		try:
+			body_size = int(self.headers.get("Content-Length", 0))
+
+		except ValueError:
+			self._send_text(400, "Invalid Content-Length.")
+			return
+
+		if body_size > _MAX_BODY_SIZE:
+			self._send_text(413, "The request body is too large.")
+			return
+
+		body = self.rfile.read(body_size)
+		content_type = self.headers.get("Content-Type", "")
+
+		try:
+			body = body.decode("utf8")
+
+			if content_type.startswith(_CONTENT_TYPE_JSON):
+				field_values = json_loads(body)
+				set_automatic_field_vals(field_values)
+
+			else:
+				field_values = parse_field_values(load_yaml_content(body))
+
+		except Exception as e:
+			self._send_text(400, type(e).__name__ + ": " + str(e))
+			return
+
+		server = self.server
+		report_stream = BytesIO()
+
+		try:
+			write_report(server.template, field_values,
+				server.radio_btn_groups, server.editable, server.incremental,
+				report_stream)
+
+		except Exception as e:
+			self._send_text(422, type(e).__name__ + ": " + str(e))
+			return
+
+		report = report_stream.getvalue()
+		self.send_response(200)
+		self.send_header("Content-Type", _CONTENT_TYPE_PDF)
+		self.send_header("Content-Length", str(len(report)))
+		self.end_headers()
+		self.wfile.write(report)
+
+	def _send_text(self, status, text):
+		text = text.encode("utf8")
+		self.send_response(status)
+		self.send_header("Content-Type", _CONTENT_TYPE_TEXT)
+		self.send_header("Content-Length", str(len(text)))
+		self.end_headers()
+		self.wfile.write(text)
+
+
+def make_fill_server(template, editable, incremental, thread_count,
+		queue_size, port=None, unix_socket=None):
+	"""
+	Creates a server that fills reports from the given template. The server
+	listens on a TCP port of the local host or on a Unix socket.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		editable (bool): If True, the reports can be modified.
+		incremental (bool): If True, the reports are written as incremental
+			updates of the template.
+		thread_count (int): the number of threads that fill reports
+		queue_size (int): the number of requests that can wait for a thread
+		port (int): the TCP port. It is ignored if unix_socket is not None.
+		unix_socket (pathlib.Path): the path to the Unix socket. Defaults to
+			None.
+
+	Returns:
+		socketserver.BaseServer: the server. Call its method serve_forever to
+			start it.
+	"""
+	if unix_socket is None:
+		server = _TcpFillServer(("127.0.0.1", port), _FillRequestHandler)
+
+	else:
+		server = _UnixFillServer(str(unix_socket), _FillRequestHandler)
+
+	server.init_pool(thread_count, queue_size)
+	server.template = template
+	server.radio_btn_groups = make_radio_btn_groups()
+	server.editable = editable
+	server.incremental = incremental
+
+	return server
+
+
+def _make_parser():
+	parser = ArgumentParser(description=__doc__)
+
+	parser.add_argument("-e", "--editable", action="store_true",
+		help="Makes the filled reports editable. Without this flag, the fields of incremental (-i) reports are made read-only.")
+
+	parser.add_argument("-i", "--incremental", action="store_true",
+		help="Writes the reports as the template followed by an incremental update containing the filled fields.")
+
+	parser.add_argument("--port", type=int, default=8000,
+		help="TCP port of the local host on which the server listens. It defaults to 8000.")
+
+	parser.add_argument("-q", "--queue", type=int, default=16,
+		help="Number of requests that can wait for a thread. It defaults to 16.")
+
+	parser.add_argument("-t", "--template", type=Path,
+		default=_DFLT_TEMPLATE_PATH,
+		help="Path to the report template. It must be a PDF file.")
+
+	parser.add_argument("-u", "--unix_socket", type=Path, default=None,
+		help="Path to a Unix socket on which the server listens instead of a TCP port")
+
+	parser.add_argument("-w", "--threads", type=int, default=4,
+		help="Number of threads that fill reports. It defaults to 4.")
+
+	return parser
+
+
+if __name__ == "__main__":
+	parser = _make_parser()
+	args = parser.parse_args()
+	template_path = args.template # -t
+	unix_socket = args.unix_socket # -u
+
+	check_template_path(template_path)
+
+	if unix_socket is not None and unix_socket.is_socket():
+		unix_socket.unlink()
+
+	from report_template import ReportTemplate
+
+	server = make_fill_server(ReportTemplate(template_path),
+		args.editable, args.incremental, max(args.threads, 1),
+		max(args.queue, 0), args.port, unix_socket)
+
+	if unix_socket is None:
+		print("Listening on http://127.0.0.1:" + str(args.port))
+	else:
+		print("Listening on " + str(unix_socket))
+
+	try:
+		server.serve_forever()
+
+	except KeyboardInterrupt:
+		pass
+
+	finally:
+		server.server_close()
@@ -0,0 +1,119 @@
+"""
+This module reads the interactive form of a PDF file without parsing the rest
+of the document. Opening a reader only parses the file's trailer and
+cross-reference sections. The objects are then parsed when the form's tree
+reaches them, so the pages' content and images are never read.
+
+The fields of a report are compressed in object streams. PyPDF2 scans an
+object stream's whole header each time that it extracts an object. The reader
+of this module reads the header once and seeks directly to each object.
+
+PDF files are read through a memory map rather than copied in memory. The
+files are closed as soon as the reader's context ends.
+"""
+
+
+from contextlib import contextmanager
+from io import BytesIO
+from mmap import ACCESS_READ, mmap
+
+from PyPDF2 import PdfFileReader
+from PyPDF2.generic import IndirectObject, NullObject, readObject
+from PyPDF2.utils import PdfStreamError
+
+
+_KEY_FIRST = "/First"
+_KEY_N = "/N"
+
+
+class FormReader(PdfFileReader):
+	"""
+	This class is a PDF reader that parses objects only when they are needed
+	and extracts the objects of an object stream without scanning its header
+	again.
+	"""
+
+	def __init__(self, stream):
+		"""
+		The constructor parses the trailer and the cross-reference sections of
+		the given stream.
+
+		Args:
+			stream: a binary file-like object, such as a memory map, that
+				contains a PDF file. It must stay open while the reader parses
+				objects.
+		"""
+		# It maps the numbers of the object streams read to their decoded
+		# data and to the offsets of their objects in that data.
+		self._obj_stm_contents = dict()
+		PdfFileReader.__init__(self, stream, strict=False)
+
+	def _getObjectFromStream(self, indirectReference):
+		stm_num, _ = self.xref_objStm[indirectReference.idnum]
+		obj_stm_content = self._obj_stm_contents.get(stm_num)
+
+		if obj_stm_content is None:
+			obj_stm_content = self._read_obj_stm(stm_num)
+			self._obj_stm_contents[stm_num] = obj_stm_content
+
+		stm_data, obj_offsets = obj_stm_content
+		obj_offset = obj_offsets.get(indirectReference.idnum)
+
+		if obj_offset is None:
+			return NullObject()
+
+		stm_data.seek(obj_offset)
+
+		try:
+			return readObject(stm_data, self)
+
+		except PdfStreamError:
+			# Like PyPDF2 in non-strict mode
+			return NullObject()
+
+	def _read_obj_stm(self, stm_num):
+		obj_stm = IndirectObject(stm_num, 0, self).getObject()
+		stm_data = obj_stm.getData()
+		first_offset = obj_stm[_KEY_FIRST]
+
+		# The header contains pairs of an object number and an offset
+		# relative to the first object.
+		header = stm_data[:first_offset].split()
+		obj_offsets = {int(header[i]): first_offset + int(header[i + 1])
+			for i in range(0, 2 * obj_stm[_KEY_N], 2)}
+
+		return BytesIO(stm_data), obj_offsets
+
+
+@contextmanager
+def open_form_reader(pdf_path):
+	"""
+	Creates a FormReader that parses a PDF file directly from a memory map of
+	the file. The file is closed when the context ends. Afterwards, the
+	reader can only provide the objects that it has already parsed.
+
+	Args:
+		pdf_path (pathlib.Path): the path to a PDF file
+
+	Yields:
+		FormReader: a reader of the file
+	"""
+	with pdf_path.open(mode="rb") as pdf_stream:
+		with mmap(pdf_stream.fileno(), 0, access=ACCESS_READ) as pdf_map:
+			yield FormReader(pdf_map)
+
+
+def read_form_fields(pdf_path):
+	"""
+	Reads the fields of a PDF file's interactive form. Only the objects of the
+	form are parsed.
+
+	Args:
+		pdf_path (pathlib.Path): the path to a PDF file
+
+	Returns:
+		dict: It maps the fields' name to their PyPDF2.generic.Field object.
+		None: if the file does not have an interactive form
+	"""
+	with open_form_reader(pdf_path) as form_reader:
+		return form_reader.getFields()
@@ -0,0 +1,403 @@
+"""
+This module writes PDF incremental updates. An incremental update copies the
+bytes of an existing document unchanged and appends the objects that were
+modified, followed by a cross-reference section that points to them. Readers
+use the appended objects instead of the original ones. Saving a filled report
+this way avoids rewriting the template's images and fonts.
+"""
+
+
+from io import BytesIO
+from re import compile as compile_regex
+from struct import pack
+
+from PyPDF2.generic import\
+	ArrayObject,\
+	DictionaryObject,\
+	IndirectObject,\
+	NameObject,\
+	NumberObject,\
+	StreamObject
+
+
+_KEY_ACROFORM = "/AcroForm"
+_KEY_ANNOTS = "/Annots"
+_KEY_ENCRYPT = "/Encrypt"
+_KEY_FIELDS = "/Fields"
+_KEY_ID = "/ID"
+_KEY_INDEX = "/Index"
+_KEY_INFO = "/Info"
+_KEY_KIDS = "/Kids"
+_KEY_LENGTH = "/Length"
+_KEY_PARENT = "/Parent"
+_KEY_PREV = "/Prev"
+_KEY_ROOT = "/Root"
+_KEY_SIZE = "/Size"
+_KEY_TYPE = "/Type"
+_KEY_W = "/W"
+
+_STARTXREF = b"startxref"
+_XREF = b"xref"
+
+_SIZE_REGEX = compile_regex(rb"/Size\s+(\d+)")
+
+# Byte widths of the fields of a cross-reference stream's entries
+_XREF_STREAM_WIDTHS = (1, 4, 2)
+
+
+def _add_reference(obj_keys, pending, pdf_object):
+	if isinstance(pdf_object, IndirectObject):
+		obj_key = (pdf_object.generation, pdf_object.idnum)
+
+		if obj_key not in obj_keys:
+			obj_keys.add(obj_key)
+			pending.append(obj_key)
+
+
+def find_form_object_keys(objects, trailer, page_keys):
+	"""
+	Finds the objects that filling a form can modify: the AcroForm
+	dictionary, the fields and their widgets. The fields are found through
+	the AcroForm's field tree and the annotations of the given pages.
+
+	Args:
+		objects (dict): It maps the keys (generation, idnum) of a document's
+			objects to the objects.
+		trailer (PyPDF2.generic.DictionaryObject): the document's trailer
+		page_keys: the keys of the pages whose annotations are searched
+
+	Returns:
+		set: the keys of the form's objects
+	"""
+	obj_keys = set()
+	pending = list()
+
+	root_ref = trailer.raw_get(_KEY_ROOT)
+	root = objects.get((root_ref.generation, root_ref.idnum))
+
+	if root is not None:
+		_add_reference(obj_keys, pending, root.raw_get(_KEY_ACROFORM)\
+			if _KEY_ACROFORM in root else None)
+
+	for page_key in page_keys:
+		page = objects.get(page_key)
+
+		if page is not None and _KEY_ANNOTS in page:
+			annots = page.raw_get(_KEY_ANNOTS)
+
+			if isinstance(annots, IndirectObject):
+				_add_reference(obj_keys, pending, annots)
+				annots = objects.get((annots.generation, annots.idnum))
+
+			for annot in annots:
+				_add_reference(obj_keys, pending, annot)
+
+	while len(pending) > 0:
+		pdf_object = objects.get(pending.pop())
+
+		if not isinstance(pdf_object, DictionaryObject)\
+				or isinstance(pdf_object, StreamObject):
+			continue
+
+		for key in (_KEY_FIELDS, _KEY_KIDS):
+			if key in pdf_object:
+				children = pdf_object.raw_get(key)
+
+				if isinstance(children, IndirectObject):
+					_add_reference(obj_keys, pending, children)
+					children = objects.get(
+						(children.generation, children.idnum))
+
+				if isinstance(children, ArrayObject):
+					for child in children:
+						_add_reference(obj_keys, pending, child)
+
+		if _KEY_PARENT in pdf_object:
+			_add_reference(
+				obj_keys, pending, pdf_object.raw_get(_KEY_PARENT))
+
+	return obj_keys
+
+
+def find_modified_objects(original_objects, objects, obj_keys):
+	"""
+	Compares the serialized form of objects from two versions of a document.
+
+	Args:
+		original_objects (dict): It maps object keys (generation, idnum) to
+			the objects of the unmodified document.
+		objects (dict): It maps object keys to the objects of the modified
+			document.
+		obj_keys: the keys of the objects to compare
+
+	Returns:
+		dict: It maps the keys of the modified objects to the objects from
+			argument objects.
+	"""
+	modified_objects = dict()
+
+	for obj_key in obj_keys:
+		pdf_object = objects.get(obj_key)
+		original_object = original_objects.get(obj_key)
+
+		if pdf_object is not None and (original_object is None
+				or serialize_object(pdf_object)
+				!= serialize_object(original_object)):
+			modified_objects[obj_key] = pdf_object
+
+	return modified_objects
+
+
+def find_references(pdf_object, skipped_keys=()):
+	"""
+	Finds the indirect references in a PDF object's tree. The tree is not
+	searched beyond the references.
+
+	Args:
+		pdf_object: any object from module PyPDF2.generic
+		skipped_keys: the keys of pdf_object, if it is a dictionary, whose
+			values are not searched
+
+	Returns:
+		list: the indirect references
+	"""
+	references = list()
+
+	if isinstance(pdf_object, DictionaryObject):
+		pending = [value for key, value in pdf_object.items()
+			if key not in skipped_keys]
+	else:
+		pending = [pdf_object]
+
+	while len(pending) > 0:
+		pdf_object = pending.pop()
+
+		if isinstance(pdf_object, IndirectObject):
+			references.append(pdf_object)
+
+		elif isinstance(pdf_object, DictionaryObject):
+			pending.extend(pdf_object.values())
+
+		elif isinstance(pdf_object, ArrayObject):
+			pending.extend(pdf_object)
+
+	return references
+
+
+def _find_startxref(base_data):
+	startxref_index = base_data.rfind(_STARTXREF)
+
+	if startxref_index < 0:
+		raise ValueError("The base document does not have a startxref.")
+
+	return int(base_data[startxref_index + len(_STARTXREF):].split()[0])
+
+
+def _find_xref_size(base_data, xref_offset):
+	# The trailer or the cross-reference stream's dictionary at xref_offset
+	# contains the document's size. PyPDF2 does not always keep it.
+	size_match = _SIZE_REGEX.search(base_data, xref_offset)
+
+	if size_match is None:
+		raise ValueError("The base document's size was not found.")
+
+	return int(size_match.group(1))
+
+
+def _group_subsections(idnums):
+	subsections = list()
+
+	for idnum in idnums:
+		if len(subsections) > 0\
+				and subsections[-1][0] + len(subsections[-1][1]) == idnum:
+			subsections[-1][1].append(idnum)
+
+		else:
+			subsections.append((idnum, [idnum]))
+
+	return subsections
+
+
+def remap_references(pdf_object, get_number, skipped_keys=()):
+	"""
+	Copies a PDF object's tree and replaces its indirect references with
+	references to the objects of another document.
+
+	Args:
+		pdf_object: any object from module PyPDF2.generic
+		get_number: a function that provides the number in the other document
+			of the object whose key (generation, idnum) it receives
+		skipped_keys: the keys of pdf_object, if it is a dictionary, that are
+			not copied
+
+	Returns:
+		a copy of pdf_object
+	"""
+	if isinstance(pdf_object, IndirectObject):
+		return IndirectObject(get_number(
+			(pdf_object.generation, pdf_object.idnum)), 0, None)
+
+	if isinstance(pdf_object, DictionaryObject):
+		if isinstance(pdf_object, StreamObject):
+			obj_copy = pdf_object.__class__()
+			obj_copy._data = pdf_object._data
+
+		else:
+			obj_copy = DictionaryObject()
+
+		for key, value in pdf_object.items():
+			if key not in skipped_keys:
+				obj_copy[key] = remap_references(value, get_number)
+
+		return obj_copy
+
+	if isinstance(pdf_object, ArrayObject):
+		return ArrayObject(
+			remap_references(value, get_number) for value in pdf_object)
+
+	return pdf_object
+
+
+def serialize_object(pdf_object):
+	"""
+	Writes a PDF object's representation in the PDF syntax.
+
+	Args:
+		pdf_object: any object from module PyPDF2.generic
+
+	Returns:
+		bytes: the object's representation
+	"""
+	obj_stream = BytesIO()
+	pdf_object.writeToStream(obj_stream, None)
+	return obj_stream.getvalue()
+
+
+def _make_update_trailer(trailer, size, prev_xref):
+	update_trailer = DictionaryObject()
+
+	for key in (_KEY_ROOT, _KEY_INFO, _KEY_ID):
+		if key in trailer:
+			update_trailer[NameObject(key)] = trailer.raw_get(key)
+
+	update_trailer[NameObject(_KEY_SIZE)] = NumberObject(size)
+	update_trailer[NameObject(_KEY_PREV)] = NumberObject(prev_xref)
+
+	return update_trailer
+
+
+def _write_xref_stream(output_stream, xref_entries, trailer, size, prev_xref,
+		xref_offset):
+	# The cross-reference stream is a new object. It is listed in itself.
+	xref_idnum = size
+	if len(xref_entries) > 0:
+		xref_idnum = max(xref_idnum,
+			max(idnum for idnum, _, _ in xref_entries) + 1)
+
+	xref_entries = xref_entries + [(xref_idnum, 0, xref_offset)]
+
+	entry_data = list()
+	index = ArrayObject()
+
+	for first_idnum, idnums in _group_subsections(
+			[idnum for idnum, _, _ in xref_entries]):
+		index.append(NumberObject(first_idnum))
+		index.append(NumberObject(len(idnums)))
+
+	for _, generation, offset in xref_entries:
+		entry_data.append(pack(">BIH", 1, offset, generation))
+
+	entry_data = b"".join(entry_data)
+
+	xref_dict = _make_update_trailer(trailer, xref_idnum + 1, prev_xref)
+	xref_dict[NameObject(_KEY_TYPE)] = NameObject("/XRef")
+	xref_dict[NameObject(_KEY_INDEX)] = index
+	xref_dict[NameObject(_KEY_W)] = ArrayObject(
+		NumberObject(width) for width in _XREF_STREAM_WIDTHS)
+	xref_dict[NameObject(_KEY_LENGTH)] = NumberObject(len(entry_data))
+
+	output_stream.write(str(xref_idnum).encode("ascii") + b" 0 obj\n")
+	xref_dict.writeToStream(output_stream, None)
+	output_stream.write(b"\nstream\n" + entry_data + b"\nendstream\nendobj\n")
+
+
+def _write_xref_table(output_stream, xref_entries, trailer, size, prev_xref):
+	offsets = {idnum: (generation, offset)
+		for idnum, generation, offset in xref_entries}
+
+	output_stream.write(_XREF + b"\n")
+
+	for first_idnum, idnums in _group_subsections(sorted(offsets)):
+		output_stream.write(
+			("%d %d\n" % (first_idnum, len(idnums))).encode("ascii"))
+
+		for idnum in idnums:
+			generation, offset = offsets[idnum]
+			output_stream.write(
+				("%010d %05d n \n" % (offset, generation)).encode("ascii"))
+
+	output_stream.write(b"trailer\n")
+	_make_update_trailer(trailer, size, prev_xref)\
+		.writeToStream(output_stream, None)
+	output_stream.write(b"\n")
+
+
+def write_incremental_update(
+		base_data, trailer, modified_objects, output_stream):
+	"""
+	Writes a document made of base_data followed by an incremental update that
+	contains the modified objects. The update's cross-reference section has
+	the same form, table or stream, as the base document's last one.
+
+	Args:
+		base_data: the content of the unmodified document, a bytes-like
+			object like bytes or a memory map
+		trailer (PyPDF2.generic.DictionaryObject): the base document's trailer
+		modified_objects (dict): It maps the keys (generation, idnum) of the
+			modified objects to their new version.
+		output_stream: a binary stream where the document is written
+
+	Raises:
+		ValueError: if the base document is encrypted or does not end with a
+			cross-reference section
+	"""
+	if _KEY_ENCRYPT in trailer:
+		raise ValueError("Encrypted documents cannot be updated.")
+
+	prev_xref = _find_startxref(base_data)
+	size = _find_xref_size(base_data, prev_xref)
+	xref_is_table = base_data[prev_xref:prev_xref+len(_XREF)] == _XREF
+
+	# The offsets are relative to the beginning of the document.
+	doc_start = output_stream.tell()
+	output_stream.write(base_data)
+	if base_data[-1:] != b"\n":
+		output_stream.write(b"\n")
+
+	xref_entries = list()
+
+	for (generation, idnum), pdf_object\
+			in sorted(modified_objects.items(), key=lambda item: item[0][1]):
+		xref_entries.append(
+			(idnum, generation, output_stream.tell() - doc_start))
+		output_stream.write(
+			("%d %d obj\n" % (idnum, generation)).encode("ascii"))
+		pdf_object.writeToStream(output_stream, None)
+		output_stream.write(b"\nendobj\n")
+
+	xref_offset = output_stream.tell() - doc_start
+
+	# New objects can extend the document.
+	if len(modified_objects) > 0:
+		size = max(size, max(idnum for _, idnum in modified_objects) + 1)
+
+	if xref_is_table:
+		_write_xref_table(
+			output_stream, xref_entries, trailer, size, prev_xref)
+
+	else:
+		_write_xref_stream(output_stream, xref_entries, trailer, size,
+			prev_xref, xref_offset)
+
+	output_stream.write(
+		_STARTXREF + ("\n%d\n%%%%EOF\n" % xref_offset).encode("ascii"))
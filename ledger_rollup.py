@@ -0,0 +1,537 @@
+"""
+This script adds up the amounts of the accounting codes of many expense
+reports. It reads the "Codes comptables" of YAML field setting files or of
+filled PDF reports and groups their amounts by UBR, account (Compte), funding
+request (DemFin) and CBS, or by some of these codes. For each group, it
+computes the total amount and the number of accounting code lines. The
+reports can be restricted to a range of dates.
+
+The lines of all the reports are stored in columns, one list per code, before
+the groups are made. The amounts are decimal numbers, so their totals are
+exact. The files are read in parallel by several processes.
+
+The result is printed in the console or written in a CSV or JSON file chosen
+by the output file's extension.
+"""
+
+
+from argparse import ArgumentParser
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from glob import glob
+from itertools import compress
+from os import cpu_count
+from pathlib import Path
+from sys import exit
+
+from stage_timings import\
+	add_instrumentation_args,\
+	enable_timings,\
+	instrumented_run,\
+	pop_stage_records,\
+	record_stages,\
+	timed_stage,\
+	timings_enabled
+
+
+# The codes of an accounting code line and the name patterns of their fields
+_CODE_PATTERNS = {
+	"UBR": "UBR{n}",
+	"Compte": "CC{n}",
+	"DemFin": "DF{n}",
+	"CBS": "CBS{n}"
+}
+_AMOUNT_PATTERN = "ccMontant${n}"
+
+# The number of accounting code lines in a report
+_CODE_LINE_COUNT = 5
+
+_COLUMN_COUNT = "count"
+_COLUMN_TOTAL = "total"
+
+_EXTENSION_CSV = ".csv"
+_EXTENSION_JSON = ".json"
+_EXTENSION_PDF = ".pdf"
+_EXTENSION_YML = ".yml"
+
+_FIELD_DATE = "Date"
+
+# The number of files sent to a worker process at once
+_TASK_CHUNK_SIZE = 64
+
+_ZERO = Decimal(0)
+
+
+class LedgerColumns:
+	"""
+	This class stores the accounting code lines of many reports in columns:
+	one list for the reports' date, one for each code and one for the
+	amounts. The lines can then be filtered and grouped without handling the
+	reports again.
+	"""
+
+	def __init__(self):
+		"""
+		The constructor creates empty columns.
+		"""
+		self._dates = list()
+		self._codes = {code_name: list() for code_name in _CODE_PATTERNS}
+		self._amounts = list()
+
+	def __len__(self):
+		return len(self._amounts)
+
+	def add_lines(self, report_date, code_lines):
+		"""
+		Appends the accounting code lines of a report to the columns.
+
+		Args:
+			report_date (datetime.date): the report's date. It is None if the
+				report does not have a date in ISO format.
+			code_lines (list): tuples made by function make_code_lines
+		"""
+		if len(code_lines) == 0:
+			return
+
+		self._dates.extend([report_date] * len(code_lines))
+		code_columns = list(zip(*code_lines))
+
+		for code_column, code_name in zip(code_columns, _CODE_PATTERNS):
+			self._codes[code_name].extend(code_column)
+
+		self._amounts.extend(code_columns[-1])
+
+	def roll_up(self, group_codes, start_date, end_date):
+		"""
+		Computes the total amount and the number of lines of each group of
+		lines that have the same codes.
+
+		Args:
+			group_codes (tuple): the names of the codes that form the groups,
+				such as "UBR" and "Compte"
+			start_date (datetime.date): If it is not None, the lines of the
+				reports dated before it are ignored.
+			end_date (datetime.date): If it is not None, the lines of the
+				reports dated after it are ignored. If either date is not
+				None, the lines of the reports without a date are ignored.
+
+		Returns:
+			list: tuples that contain a group's codes in a tuple, its number
+				of lines and its total amount. They are sorted by codes.
+		"""
+		dates = self._dates
+
+		if start_date is None and end_date is None:
+			selection = None
+		else:
+			# The lines without a date are outside any range of dates.
+			selection = [line_date is not None
+					and (start_date is None or line_date >= start_date)
+					and (end_date is None or line_date <= end_date)
+				for line_date in dates]
+
+		def select(column):
+			return column if selection is None\
+				else compress(column, selection)
+
+		group_keys = zip(*(select(self._codes[code_name])
+			for code_name in group_codes))
+		counts = dict()
+		totals = dict()
+
+		for group_key, amount in zip(group_keys, select(self._amounts)):
+			totals[group_key] = totals.get(group_key, _ZERO) + amount
+			counts[group_key] = counts.get(group_key, 0) + 1
+
+		return [(group_key, counts[group_key], totals[group_key])
+			for group_key in sorted(totals)]
+
+
+def _find_pdf_files(pdf_data_dir):
+	if pdf_data_dir is None:
+		return list()
+
+	return sorted(pdf_data_dir.rglob("*" + _EXTENSION_PDF))
+
+
+def _find_yml_files(yml_data_arg):
+	if yml_data_arg is None:
+		return list()
+
+	yml_data_path = Path(yml_data_arg)
+
+	if yml_data_path.is_dir():
+		yml_paths = yml_data_path.glob("*" + _EXTENSION_YML)
+	else:
+		yml_paths = (Path(match) for match in glob(yml_data_arg))
+
+	return sorted(yml_paths)
+
+
+def format_rollup(rollup, group_codes):
+	"""
+	Formats the result of a rollup as a table with a header row.
+
+	Args:
+		rollup (list): the tuples returned by LedgerColumns.roll_up
+		group_codes (tuple): the names of the codes that form the groups
+
+	Returns:
+		str: the table, whose columns are separated with tabulations
+	"""
+	lines = ["\t".join((*group_codes, _COLUMN_COUNT, _COLUMN_TOTAL))]
+
+	for group_key, count, total in rollup:
+		lines.append("\t".join((*group_key, str(count), str(total))))
+
+	return "\n".join(lines)
+
+
+def _init_worker(timings_on):
+	if timings_on:
+		enable_timings()
+
+
+def _is_blank(value):
+	return value is None\
+		or (isinstance(value, str) and len(value.strip()) == 0)
+
+
+def _make_amount(value, field_name):
+	if value is None:
+		return _ZERO
+
+	if isinstance(value, float):
+		# The shortest representation of a float is the number written in
+		# the YAML file.
+		return Decimal(repr(value))
+
+	amount_str = str(value).strip()
+
+	# The amount fields left blank in a PDF report contain an empty string.
+	if len(amount_str) == 0:
+		return _ZERO
+
+	try:
+		return Decimal(amount_str)
+
+	except InvalidOperation:
+		raise ValueError(
+			"Field " + field_name + " is not an amount: " + repr(amount_str))
+
+
+def make_code_lines(field_values):
+	"""
+	Extracts the accounting code lines from a report's field values. The
+	lines without codes nor amount are ignored. An empty amount is zero.
+
+	Args:
+		field_values (dict): It maps field names to their value, like the
+			dictionaries returned by parse_yaml_content and
+			get_fields_from_pdf.
+
+	Returns:
+		list: a tuple for each line. It contains the UBR, the account, the
+			funding request and the CBS as strings, empty if they are absent,
+			followed by the amount (decimal.Decimal).
+
+	Raises:
+		ValueError: if an amount is not a number. The message contains the
+			name of its field.
+	"""
+	code_lines = list()
+
+	for n in range(1, _CODE_LINE_COUNT + 1):
+		codes = tuple("" if code is None else str(code).strip()
+			for code in (field_values.get(pattern.format(n=n))
+				for pattern in _CODE_PATTERNS.values()))
+		amount_field = _AMOUNT_PATTERN.format(n=n)
+		amount = field_values.get(amount_field)
+
+		if _is_blank(amount) and all(len(code) == 0 for code in codes):
+			continue
+
+		code_lines.append((*codes, _make_amount(amount, amount_field)))
+
+	return code_lines
+
+
+def _make_date(value):
+	if value is None or isinstance(value, date):
+		return value
+
+	# The date is free text in the reports. A date that is not in ISO format
+	# is unknown, which only matters when the reports are filtered by date.
+	try:
+		return date.fromisoformat(str(value).strip())
+
+	except ValueError:
+		return None
+
+
+def _make_parser():
+	parser = ArgumentParser(description=__doc__)
+
+	parser.add_argument("--end", type=date.fromisoformat, default=None,
+		help="Date in format aaaa-mm-jj. The reports dated after it are ignored.")
+
+	parser.add_argument("-g", "--group_by", nargs="+",
+		choices=tuple(_CODE_PATTERNS), default=tuple(_CODE_PATTERNS),
+		help="Codes that form the groups. It defaults to all of them.")
+
+	parser.add_argument("-j", "--jobs", type=int, default=0,
+		help="Number of processes that read files in parallel. It defaults to 0, which means one per processor.")
+
+	parser.add_argument("-o", "--output", type=Path, default=None,
+		help="Path to a " + _EXTENSION_CSV + " or " + _EXTENSION_JSON
+			+ " file where the result is written. If it is omitted, the result is printed.")
+
+	parser.add_argument("-p", "--pdf_data", type=Path, default=None,
+		help="Directory containing filled reports. Its subdirectories are also searched.")
+
+	parser.add_argument("--start", type=date.fromisoformat, default=None,
+		help="Date in format aaaa-mm-jj. The reports dated before it are ignored.")
+
+	parser.add_argument("-y", "--yml_data", type=str, default=None,
+		help="Directory containing .yml field setting files or a glob pattern matching them")
+
+	add_instrumentation_args(parser)
+
+	return parser
+
+
+def read_ledger_file(file_path):
+	"""
+	Reads the date and the accounting code lines of the reports in a file. A
+	YAML file contains one report for each of its documents. A PDF file is
+	a filled report. Exceptions are not raised but returned so that one bad
+	file or document does not stop the rollup.
+
+	Args:
+		file_path (pathlib.Path): the path to a YAML field setting file or to
+			a PDF report
+
+	Returns:
+		list: a tuple for each report: a description of the report, its date,
+			its lines made by function make_code_lines and an error message.
+			The error message is None if the report was read. If the report
+			could not be read, the message starts with the exception's type,
+			the date is None and the list of lines is empty.
+	"""
+	if file_path.suffix == _EXTENSION_PDF:
+		from form_reader import read_form_fields
+		from PyPDF2_Fields import pair_fields_name_and_val
+
+		try:
+			with timed_stage("pdf_reading"):
+				field_values = pair_fields_name_and_val(
+					read_form_fields(file_path), True)
+
+			reports = [(str(file_path), field_values)]
+
+		except Exception as e:
+			return [(str(file_path), None, list(),
+				type(e).__name__ + ": " + str(e))]
+
+	else:
+		from field_setting_parser import\
+			load_yaml_content,\
+			parse_yaml_content,\
+			split_yaml_documents
+
+		reports = list()
+
+		try:
+			with file_path.open(encoding="utf8") as yml_stream:
+				documents = list(split_yaml_documents(yml_stream))
+
+		except Exception as e:
+			return [(str(file_path), None, list(),
+				type(e).__name__ + ": " + str(e))]
+
+		for doc_number, document in enumerate(documents, 1):
+			report_name = str(file_path) if len(documents) == 1\
+				else str(file_path) + " #" + str(doc_number)
+
+			try:
+				with timed_stage("yaml_parsing"):
+					field_values = parse_yaml_content(
+						load_yaml_content(document))
+
+			except Exception as e:
+				field_values = type(e).__name__ + ": " + str(e)
+
+			reports.append((report_name, field_values))
+
+	results = list()
+
+	for report_name, field_values in reports:
+		if isinstance(field_values, str):
+			results.append((report_name, None, list(), field_values))
+			continue
+
+		try:
+			results.append((report_name,
+				_make_date(field_values.get(_FIELD_DATE)),
+				make_code_lines(field_values), None))
+
+		except Exception as e:
+			results.append((report_name, None, list(),
+				type(e).__name__ + ": " + str(e)))
+
+	return results
+
+
+def _read_ledger_file_in_worker(file_path):
+	return read_ledger_file(file_path), pop_stage_records()
+
+
+def read_ledger_files(file_paths, jobs):
+	"""
+	Reads the reports of the given files and stores their lines in columns.
+	If jobs is greater than 1, the files are read by a pool of worker
+	processes. The failures are printed.
+
+	Args:
+		file_paths (list): the paths to YAML field setting files and PDF
+			reports
+		jobs (int): the number of worker processes
+
+	Returns:
+		tuple: the LedgerColumns instance, the number of reports read and the
+			number of failures
+	"""
+	ledger = LedgerColumns()
+	report_count = 0
+	failure_count = 0
+
+	if jobs > 1 and len(file_paths) > 1:
+		file_results = read_ledger_files_in_parallel(
+			file_paths, min(jobs, len(file_paths)))
+	else:
+		file_results = (read_ledger_file(file_path)
+			for file_path in file_paths)
+
+	for results in file_results:
+		for report_name, report_date, code_lines, error_msg in results:
+			if error_msg is None:
+				report_count += 1
+				ledger.add_lines(report_date, code_lines)
+
+			else:
+				failure_count += 1
+				print("FAILED " + report_name + ": " + error_msg)
+
+	return ledger, report_count, failure_count
+
+
+def read_ledger_files_in_parallel(file_paths, jobs):
+	"""
+	Reads the reports of the given files with a pool of worker processes. The
+	results are yielded in the order of file_paths as soon as they are
+	available. If the timings are enabled, the stages measured by the workers
+	are added to this process's records.
+
+	Args:
+		file_paths (list): the paths to YAML field setting files and PDF
+			reports
+		jobs (int): the number of worker processes
+
+	Yields:
+		list: the result of function read_ledger_file for each file
+	"""
+	from multiprocessing import Pool
+
+	with Pool(jobs, _init_worker, (timings_enabled(),)) as pool:
+		for results, stage_records in pool.imap(_read_ledger_file_in_worker,
+				file_paths, chunksize=_TASK_CHUNK_SIZE):
+			record_stages(stage_records)
+			yield results
+
+
+def write_rollup(rollup, group_codes, output_path):
+	"""
+	Writes the result of a rollup in a CSV file or in a JSON file, according
+	to the output file's extension. The amounts are written as strings in
+	JSON so that they remain exact.
+
+	Args:
+		rollup (list): the tuples returned by LedgerColumns.roll_up
+		group_codes (tuple): the names of the codes that form the groups
+		output_path (pathlib.Path): the path to a .csv or .json file
+	"""
+	with output_path.open(mode="w", encoding="utf8", newline="")\
+			as output_stream:
+		if output_path.suffix == _EXTENSION_CSV:
+			from csv import writer
+
+			csv_writer = writer(output_stream)
+			csv_writer.writerow((*group_codes, _COLUMN_COUNT, _COLUMN_TOTAL))
+			csv_writer.writerows((*group_key, count, str(total))
+				for group_key, count, total in rollup)
+
+		else:
+			from json import dump
+
+			dump([{**dict(zip(group_codes, group_key)),
+					_COLUMN_COUNT: count, _COLUMN_TOTAL: str(total)}
+				for group_key, count, total in rollup],
+				output_stream, ensure_ascii=False, indent="\t")
+
+
+if __name__ == "__main__":
+	parser = _make_parser()
+	args = parser.parse_args()
+	output_path = args.output # -o
+	pdf_data_dir = args.pdf_data # -p
+	group_codes = tuple(dict.fromkeys(args.group_by)) # -g
+
+	jobs = args.jobs # -j
+	if jobs < 0:
+		print("ERROR! -j/--jobs cannot be negative.")
+		exit(1)
+	elif jobs == 0:
+		jobs = cpu_count()
+
+	if args.yml_data is None and pdf_data_dir is None:
+		print("ERROR! -y/--yml_data or -p/--pdf_data must be provided.")
+		exit(1)
+
+	if output_path is not None\
+			and output_path.suffix not in (_EXTENSION_CSV, _EXTENSION_JSON):
+		print("ERROR! -o/--output must have extension " + _EXTENSION_CSV
+			+ " or " + _EXTENSION_JSON + ".")
+		exit(1)
+
+	with instrumented_run(args.timings, args.profile):
+		with timed_stage("path_checks"):
+			if pdf_data_dir is not None and not pdf_data_dir.is_dir():
+				print("ERROR! -p/--pdf_data must be a directory.")
+				exit(1)
+
+			file_paths = _find_yml_files(args.yml_data)
+			file_paths.extend(_find_pdf_files(pdf_data_dir))
+
+			if len(file_paths) == 0:
+				print("ERROR! No YAML or PDF file was found.")
+				exit(1)
+
+		ledger, report_count, failure_count = read_ledger_files(
+			file_paths, jobs)
+
+		with timed_stage("rollup"):
+			rollup = ledger.roll_up(group_codes, args.start, args.end)
+
+		with timed_stage("writing"):
+			if output_path is None:
+				print(format_rollup(rollup, group_codes))
+			else:
+				output_path.parent.mkdir(parents=True, exist_ok=True)
+				write_rollup(rollup, group_codes, output_path)
+
+		print(str(report_count) + " report(s) read, " + str(failure_count)
+			+ " failure(s), " + str(len(ledger)) + " line(s) in "
+			+ str(len(rollup)) + " group(s)")
+
+	if failure_count > 0:
+		exit(1)
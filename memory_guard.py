@@ -0,0 +1,137 @@
+"""
+This module limits and measures the memory used by the scripts in this
+repository. Argument --max_memory limits the memory that each process of a
+run can allocate. An allocation beyond the limit raises a MemoryError in the
+process that exceeds it rather than exhausting the memory of the machine or
+container shared with other processes. Argument --peak_memory prints the peak
+resident set size of the run's main process and of its largest worker
+process.
+
+The limit and the measures rely on module resource, which is only available on
+Unix.
+"""
+
+
+from contextlib import contextmanager
+from sys import platform
+
+
+_BYTES_PER_MB = 1 << 20
+
+# Function getrusage gives the resident set size in kibibytes, except on
+# macOS, which gives it in bytes.
+_MAXRSS_UNIT = 1 if platform == "darwin" else 1024
+
+
+def add_memory_args(parser):
+	"""
+	Adds arguments --max_memory and --peak_memory to a script's argument
+	parser.
+
+	Args:
+		parser (argparse.ArgumentParser): the parser of a script
+	"""
+	parser.add_argument("--max_memory", type=int, default=None,
+		help="Maximum memory in megabytes that each process of the run can allocate. A report that needs more fails with a MemoryError. Unix only.")
+
+	parser.add_argument("--peak_memory", action="store_true",
+		help="Prints the peak resident memory of the main process and of the largest worker process at the end of the run. Unix only.")
+
+
+def format_peak_memory(peak_memory):
+	"""
+	Describes the measures made by function measure_peak_memory.
+
+	Args:
+		peak_memory (tuple): the value returned by function
+			measure_peak_memory
+
+	Returns:
+		str: a line that gives the peak memory in megabytes
+	"""
+	if peak_memory is None:
+		return "Peak memory: not measurable on this platform"
+
+	main_peak, worker_peak = peak_memory
+	description = "Peak memory: {:.1f} MB in the main process"\
+		.format(main_peak / _BYTES_PER_MB)
+
+	if worker_peak > 0:
+		description += ", {:.1f} MB in the largest child process"\
+			.format(worker_peak / _BYTES_PER_MB)
+
+	return description
+
+
+def limit_memory(max_memory_mb):
+	"""
+	Limits the memory that this process and the processes that it starts
+	afterwards can allocate. The files mapped in memory for reading do not
+	count towards the limit.
+
+	Args:
+		max_memory_mb (int): the limit in megabytes
+
+	Raises:
+		ValueError: if max_memory_mb is not positive, exceeds the limit
+			already set for this process or if the platform cannot limit the
+			memory
+	"""
+	if max_memory_mb <= 0:
+		raise ValueError("--max_memory must be positive.")
+
+	try:
+		from resource import\
+			RLIMIT_DATA,\
+			RLIM_INFINITY,\
+			getrlimit,\
+			setrlimit
+
+	except ImportError:
+		raise ValueError("--max_memory is not supported on this platform.")
+
+	max_memory = max_memory_mb * _BYTES_PER_MB
+	_, hard_limit = getrlimit(RLIMIT_DATA)
+
+	if hard_limit != RLIM_INFINITY and max_memory > hard_limit:
+		raise ValueError("--max_memory exceeds this process's limit of "
+			+ str(hard_limit // _BYTES_PER_MB) + " MB.")
+
+	setrlimit(RLIMIT_DATA, (max_memory, hard_limit))
+
+
+def measure_peak_memory():
+	"""
+	Measures the peak resident set size of this process and of its largest
+	worker process. Only the worker processes that have ended are measured.
+
+	Returns:
+		tuple: the peak of this process and the worker's in bytes. The
+			worker's is 0 if no worker process has ended.
+		None: if the platform cannot measure the memory
+	"""
+	try:
+		from resource import RUSAGE_CHILDREN, RUSAGE_SELF, getrusage
+
+	except ImportError:
+		return None
+
+	return (getrusage(RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT,
+		getrusage(RUSAGE_CHILDREN).ru_maxrss * _MAXRSS_UNIT)
+
+
+@contextmanager
+def peak_memory_report(enabled):
+	"""
+	Prints the peak memory of the run when the returned context ends, even if
+	the script exits early.
+
+	Args:
+		enabled (bool): If False, nothing is printed.
+	"""
+	try:
+		yield
+
+	finally:
+		if enabled:
+			print(format_peak_memory(measure_peak_memory()))
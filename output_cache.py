@@ -0,0 +1,198 @@
+"""
+This module keeps copies of generated reports in a cache directory. A report
+is stored under a key computed from everything that determines its content:
+the template, the YAML file, the existing report given with -p and the flags
+that change the output. Since the reports are generated deterministically,
+a report whose key is in the cache can be copied rather than generated again.
+
+The cache directory has a size limit. When it is exceeded, the least recently
+used reports are deleted.
+"""
+
+
+from collections import OrderedDict
+from hashlib import sha256
+from os import utime
+from shutil import copyfile
+
+
+# Change this value if the reports generated from the same inputs change.
+_CACHE_FORMAT = "5"
+
+_EXTENSION_PDF = ".pdf"
+_EXTENSION_TMP = ".tmp"
+
+# Separates the parts of a cache key so that they cannot be confused.
+_KEY_PART_SEPARATOR = b"\x00"
+
+
+def make_cache_key(template, yml_data_path, pdf_data_path, editable,
+		incremental):
+	"""
+	Computes the key of the report made from the given inputs.
+
+	Args:
+		template (ReportTemplate): the loaded report template
+		yml_data_path (pathlib.Path): the path to the YAML field setting file
+		pdf_data_path (pathlib.Path): the path to an existing report. It can
+			be None.
+		editable (bool): If True, the report can be modified.
+		incremental (bool): If True, the report is written as an incremental
+			update.
+
+	Returns:
+		str: the key, a hexadecimal SHA-256 hash
+
+	Raises:
+		OSError: if a file cannot be read
+	"""
+	key_hash = sha256(_CACHE_FORMAT.encode("ascii"))
+
+	for key_part in (template.content_hash, yml_data_path.read_bytes(),
+			b"" if pdf_data_path is None else pdf_data_path.read_bytes(),
+			b"%d%d" % (editable, incremental)):
+		key_hash.update(_KEY_PART_SEPARATOR)
+		key_hash.update(sha256(key_part).digest())
+
+	return key_hash.hexdigest()
+
+
+class OutputCache:
+	"""
+	This class copies reports to and from a cache directory whose size is
+	limited. It counts the hits and misses of the lookups.
+	"""
+
+	def __init__(self, cache_dir, max_size):
+		"""
+		The constructor creates the cache directory if it does not exist and
+		lists the reports that it contains.
+
+		Args:
+			cache_dir (pathlib.Path): the cache directory
+			max_size (int): the maximum total size of the cached reports in
+				bytes
+		"""
+		self._cache_dir = cache_dir
+		self._max_size = max_size
+		self._hits = 0
+		self._misses = 0
+
+		cache_dir.mkdir(parents=True, exist_ok=True)
+
+		# It maps the names of the cached reports to their size, from the
+		# least to the most recently used.
+		self._entries = OrderedDict()
+		self._total_size = 0
+		cached_files = list()
+
+		for cached_path in cache_dir.glob("*" + _EXTENSION_PDF):
+			try:
+				file_stat = cached_path.stat()
+			except OSError:
+				continue
+
+			cached_files.append(
+				(file_stat.st_mtime_ns, cached_path.name, file_stat.st_size))
+
+		for _, file_name, file_size in sorted(cached_files):
+			self._entries[file_name] = file_size
+			self._total_size += file_size
+
+	def _evict(self):
+		while self._total_size > self._max_size and len(self._entries) > 0:
+			file_name, file_size = self._entries.popitem(last=False)
+			self._total_size -= file_size
+			(self._cache_dir/file_name).unlink(missing_ok=True)
+
+	def fetch(self, cache_key, output_path):
+		"""
+		Copies the report stored under the given key to output_path if the
+		cache contains it. The report becomes the most recently used.
+
+		Args:
+			cache_key (str): a key made by function make_cache_key
+			output_path (pathlib.Path): the path where the report is copied
+
+		Returns:
+			bool: True if the report was copied, False otherwise
+		"""
+		file_name = cache_key + _EXTENSION_PDF
+		cached_path = self._cache_dir/file_name
+
+		try:
+			copyfile(cached_path, output_path)
+			utime(cached_path)
+
+		except OSError:
+			# A missing or unreadable report is generated again.
+			self._misses += 1
+			self._remove_entry(file_name)
+			return False
+
+		self._hits += 1
+
+		if file_name in self._entries:
+			self._entries.move_to_end(file_name)
+
+		return True
+
+	def format_stats(self):
+		"""
+		Returns:
+			str: a line that states the numbers of hits and misses and the
+				cache's size
+		"""
+		return "Cache: " + str(self._hits) + " hit(s), "\
+			+ str(self._misses) + " miss(es), "\
+			+ str(len(self._entries)) + " report(s) in "\
+			+ str(self._total_size) + " bytes"
+
+	@property
+	def hits(self):
+		"""
+		int: the number of lookups that found a report
+		"""
+		return self._hits
+
+	@property
+	def misses(self):
+		"""
+		int: the number of lookups that did not find a report
+		"""
+		return self._misses
+
+	def _remove_entry(self, file_name):
+		file_size = self._entries.pop(file_name, None)
+
+		if file_size is not None:
+			self._total_size -= file_size
+
+	def store(self, cache_key, output_path):
+		"""
+		Copies a generated report to the cache under the given key, then
+		deletes the least recently used reports if the cache is too large.
+		Failing to write the cache is not an error.
+
+		Args:
+			cache_key (str): a key made by function make_cache_key
+			output_path (pathlib.Path): the path to the generated report
+		"""
+		file_name = cache_key + _EXTENSION_PDF
+		cached_path = self._cache_dir/file_name
+		temp_path = cached_path.with_name(file_name + _EXTENSION_TMP)
+
+		try:
+			copyfile(output_path, temp_path)
+			# The cached report appears complete or not at all.
+			temp_path.replace(cached_path)
+			file_size = cached_path.stat().st_size
+
+		except OSError:
+			temp_path.unlink(missing_ok=True)
+			return
+
+		self._remove_entry(file_name)
+		self._entries[file_name] = file_size
+		self._total_size += file_size
+		self._evict()
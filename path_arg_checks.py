@@ -1,19 +1,28 @@
 """
 This module uses library Jazal to check path arguments provided to other
 modules of this repository.
+
+Library Jazal is imported in the functions that use it rather than when this
+module is imported.
+
+Function plan_io_paths checks many pairs of paths at once for batch jobs. It
+reads each directory once rather than querying the status of every file, which
+is slow on network filesystems, and it returns all the errors instead of
+interrupting the script.
 """
 
 
+from os import scandir
+from os.path import abspath, normcase
 from pathlib import Path
 from sys import exit
 
-from jazal import\
-	MissingPathArgWarner,\
-	make_altered_name
-
 
 _ERROR_INTRO = "ERROR! "
 
+# The names that do not designate an entry of their parent directory
+_SPECIAL_NAMES = ("", ".", "..")
+
 
 def check_generable_path(
 		path_obj, path_arg_name, path_exten, base_path, termination):
@@ -51,6 +60,8 @@ def check_generable_path(
 		ValueError: if base_path or termination is None while path_obj is None
 			or points to a directory
 	"""
+	from jazal import MissingPathArgWarner, make_altered_name
+
 	path_provided = path_obj is not None
 	path_is_dir = path_obj.is_dir() if path_provided else False
 
@@ -157,6 +168,8 @@ def check_ungenerable_path(path_obj, path_arg_name, path_exten, must_exist):
 		must_exist (bool): If it is set to True, the existence of the file to
 			which the path argument points is verified.
 	"""
+	from jazal import MissingPathArgWarner
+
 	missing_path_warner = MissingPathArgWarner(path_arg_name, path_exten)
 
 	if path_obj is None:
@@ -175,3 +188,141 @@ def check_ungenerable_path(path_obj, path_arg_name, path_exten, must_exist):
 	except Exception as e:
 		print(_ERROR_INTRO + str(e))
 		exit(1)
+
+
+def _make_extension_error_msg(path_obj, path_arg_name, path_exten):
+	return path_arg_name + ": " + str(path_obj)\
+		+ " does not have the extension '" + path_exten + "'."
+
+
+def _make_path_key(path_obj):
+	return normcase(abspath(path_obj))
+
+
+def plan_io_paths(io_paths, input_path_name, input_path_exten,
+		output_path_name, output_path_exten, dflt_output_termin):
+	"""
+	Performs the verifications of function check_io_path_pair on many pairs of
+	paths and detects the pairs whose output paths are the same. Each
+	directory is scanned once, and a file's status is only queried if the
+	file is not found in the scan. The script is not interrupted.
+
+	Args:
+		io_paths: pairs (tuples) of an input path and an output path
+			(pathlib.Path). An output path can be None or point to a
+			directory. The default output file name is then made from the
+			input path as function check_generable_path does.
+		input_path_name (str): the input path argument's name
+		input_path_exten (str): the extension that the input paths are
+			supposed to have. If it is None, their extension is not checked.
+		output_path_name (str): the output path argument's name
+		output_path_exten (str): the extension that the output paths are
+			supposed to have
+		dflt_output_termin (str): a string appended to the input path's file
+			stem to make a default output file name. It can be None.
+
+	Returns:
+		tuple: the list of the output paths, in the order of io_paths, and the
+			list of the error messages. The output path of a pair that has an
+			error is None.
+	"""
+	from jazal import MissingPathArgWarner, extension_to_str, make_altered_name
+
+	input_warner = MissingPathArgWarner(input_path_name,
+		"" if input_path_exten is None else input_path_exten)
+
+	# It maps directories to the names of their entries and whether each
+	# entry is a directory.
+	dir_scans = dict()
+	# It maps the keys of the planned output paths to their input path.
+	planned_outputs = dict()
+	output_paths = list()
+	error_msgs = list()
+
+	for input_path, output_path in io_paths:
+		pair_errors = list()
+
+		if input_path is None:
+			pair_errors.append(input_warner.make_missing_arg_msg())
+
+		else:
+			if _scan_for_entry(dir_scans, input_path) is None\
+					and not input_path.exists():
+				pair_errors.append(input_path_name + ": "
+					+ str(input_path) + " does not exist.")
+
+			if input_path_exten is not None\
+					and extension_to_str(input_path) != input_path_exten:
+				pair_errors.append(_make_extension_error_msg(
+					input_path, input_path_name, input_path_exten))
+
+		if output_path is None or _scan_for_entry(dir_scans, output_path):
+			if input_path is not None:
+				output_path = (Path.cwd() if output_path is None
+					else output_path)/make_altered_name(input_path,
+						after_stem=dflt_output_termin,
+						extension=output_path_exten)
+
+		elif extension_to_str(output_path) != output_path_exten:
+			pair_errors.append(_make_extension_error_msg(
+				output_path, output_path_name, output_path_exten))
+
+		if len(pair_errors) == 0:
+			output_key = _make_path_key(output_path)
+			other_input_path = planned_outputs.get(output_key)
+
+			if other_input_path is None:
+				planned_outputs[output_key] = input_path
+
+			else:
+				pair_errors.append(output_path_name + ": " + str(output_path)
+					+ " is the output of both " + str(other_input_path)
+					+ " and " + str(input_path) + ".")
+
+		if len(pair_errors) == 0:
+			output_paths.append(output_path)
+
+		else:
+			output_paths.append(None)
+			error_msgs.extend(pair_errors)
+
+	return output_paths, error_msgs
+
+
+def _scan_for_entry(dir_scans, path_obj):
+	"""
+	Looks for a path's entry in the scan of its parent directory. The
+	directory is scanned the first time that one of its entries is requested.
+
+	Args:
+		dir_scans (dict): It maps the keys of the scanned directories to a
+			dictionary that maps the keys of their entries' names to whether
+			the entry is a directory.
+		path_obj (pathlib.Path): the path to a file or a directory
+
+	Returns:
+		bool: True if the path points to a directory, False if it points to
+			another kind of entry
+		None: if the scan does not contain the entry
+	"""
+	if path_obj.name in _SPECIAL_NAMES:
+		return path_obj.is_dir() if path_obj.exists() else None
+
+	dir_key = _make_path_key(path_obj.parent)
+	dir_entries = dir_scans.get(dir_key)
+
+	if dir_entries is None:
+		dir_entries = dict()
+
+		try:
+			with scandir(path_obj.parent) as entries:
+				for entry in entries:
+					dir_entries[normcase(entry.name)] = entry.is_dir()
+
+		except OSError:
+			# A missing or unreadable directory has no entries.
+			pass
+
+		dir_scans[dir_key] = dir_entries
+
+	return dir_entries.get(normcase(path_obj.name))
@@ -5,13 +5,18 @@ file.
 Args:
 	1: the path to a PDF file
 	2: (optional) the path to the output .txt file
+	--timings, --profile: (optional) see module stage_timings
 """
 
 
+from argparse import ArgumentParser
 from path_arg_checks import check_io_path_pair
 from pathlib import Path
-from PyPDF2 import PdfFileReader
-from sys import argv, exit
+from stage_timings import\
+	add_instrumentation_args,\
+	instrumented_run,\
+	timed_stage
+from sys import exit
 
 
 class PdfField:
@@ -85,30 +90,37 @@ def get_pdf_field_list(pdf_reader):
 	return field_list
 
 
+def _make_parser():
+	parser = ArgumentParser(description=__doc__)
+	parser.add_argument("input", type=Path, nargs="?", default=None)
+	parser.add_argument("output", type=Path, nargs="?", default=None)
+	add_instrumentation_args(parser)
+	return parser
+
+
 if __name__ == "__main__":
-	try:
-		input_path = Path(argv[1])
-	except IndexError:
-		input_path = None
+	args = _make_parser().parse_args()
+	input_path = args.input
 
-	try:
-		output_path = Path(argv[2])
-	except IndexError:
-		output_path = None
+	with instrumented_run(args.timings, args.profile):
+		with timed_stage("path_checks"):
+			output_path = check_io_path_pair(
+				input_path, "Input file", ".pdf",
+				args.output, "Output file", ".txt",
+				"_field_values")
 
-	output_path = check_io_path_pair(
-		input_path, "Input file", ".pdf",
-		output_path, "Output file", ".txt",
-		"_field_values")
+		from form_reader import open_form_reader
 
-	reader = PdfFileReader(input_path.open(mode="rb"))
-	field_list = get_pdf_field_list(reader)
+		with timed_stage("pdf_reading"):
+			with open_form_reader(input_path) as reader:
+				field_list = get_pdf_field_list(reader)
 
-	if field_list is None:
-		print(str(input_path) + " does not contain fields.")
-		exit()
+		if field_list is None:
+			print(str(input_path) + " does not contain fields.")
+			exit()
 
-	field_str = "\n".join(map(str, field_list))
+		with timed_stage("writing"):
+			field_str = "\n".join(map(str, field_list))
 
-	header = "Fields in file " + str(input_path) + "\n\n"
-	output_path.write_text(header + field_str)
+			header = "Fields in file " + str(input_path) + "\n\n"
+			output_path.write_text(header + field_str)
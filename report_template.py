@@ -0,0 +1,454 @@
+"""
+This module loads an expense report template once so that several reports can
+be filled from it without reading and parsing the template file again. Every
+reader or writer made from a loaded template holds its own copy of the
+template's objects. Filling a report therefore never alters the template or
+the other reports. A reader meant to be filled can also copy only the objects
+that filling modifies and share the template's other objects, like fonts,
+images and content streams, with the other readers.
+
+The parsed objects of a template are saved in a cache directory. The cache
+file's name contains the hash of the template's path and the hash of its
+content, so a modified template is parsed again rather than loaded from an
+outdated cache file. Saving a template's objects deletes the template's other
+cache files.
+
+PDF files are read through a memory map rather than copied in memory. The
+files are closed as soon as they have been read.
+"""
+
+
+from contextlib import contextmanager
+from hashlib import sha256
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from pickle import HIGHEST_PROTOCOL, dump, load
+
+from field_appearance import FieldAppearances
+from field_index import FieldIndex
+from incremental_update import\
+	find_form_object_keys,\
+	find_modified_objects,\
+	write_incremental_update
+from PyPDF2 import PdfFileReader, __version__ as _PYPDF2_VERSION
+from PyPDF2.generic import\
+	ArrayObject,\
+	DictionaryObject,\
+	IndirectObject,\
+	NameObject,\
+	NumberObject,\
+	StreamObject
+from PyPDF2_Fields import make_writer_from_reader
+
+
+DFLT_CACHE_DIR = Path(__file__).parents[0]/".template_cache"
+
+# Change this value if the content of the cache files changes.
+_CACHE_FORMAT = "2"
+
+_EXTENSION_CACHE = ".pickle"
+
+# Separates the hash of a template's path from the rest of a cache file's name
+_CACHE_NAME_SEPARATOR = "-"
+
+# The number of hexadecimal digits of a path's hash in a cache file's name
+_PATH_KEY_LENGTH = 16
+
+_KEY_KIDS = "/Kids"
+_KEY_PAGES = "/Pages"
+_KEY_ROOT = "/Root"
+_KEY_SIZE = "/Size"
+
+
+def _copy_pdf_object(pdf_object, reader):
+	"""
+	Copies the dictionaries and arrays of a PDF object's tree. The indirect
+	references in the copy point to the given reader. The other objects,
+	including the data of streams, are immutable and shared with the original.
+
+	Args:
+		pdf_object: any object from module PyPDF2.generic
+		reader (PyPDF2.PdfFileReader): the reader that will own the copy. It
+			can be None if the copy is meant to be saved in the cache.
+
+	Returns:
+		a copy of pdf_object
+	"""
+	if isinstance(pdf_object, IndirectObject):
+		return IndirectObject(
+			pdf_object.idnum, pdf_object.generation, reader)
+
+	if isinstance(pdf_object, DictionaryObject):
+		if isinstance(pdf_object, StreamObject):
+			# Attribute decodedSelf is not copied. It is a cache that can
+			# refer to the original reader.
+			obj_copy = pdf_object.__class__()
+			obj_copy._data = pdf_object._data
+
+		else:
+			obj_copy = DictionaryObject()
+
+		for key, value in pdf_object.items():
+			obj_copy[key] = _copy_pdf_object(value, reader)
+
+		return obj_copy
+
+	if isinstance(pdf_object, ArrayObject):
+		return ArrayObject(
+			_copy_pdf_object(value, reader) for value in pdf_object)
+
+	return pdf_object
+
+
+def _delete_other_snapshots(cache_path, path_key):
+	for snapshot_path in cache_path.parent.glob("*" + _EXTENSION_CACHE):
+		name_parts = snapshot_path.stem.split(_CACHE_NAME_SEPARATOR)
+
+		# The cache files named after the content alone were saved before
+		# the names contained the template's path. They are never loaded.
+		if snapshot_path != cache_path\
+				and (len(name_parts) == 1 or name_parts[0] == path_key):
+			try:
+				snapshot_path.unlink(missing_ok=True)
+
+			except OSError:
+				# Another process can be using the file.
+				pass
+
+
+def _find_page_tree_keys(objects, trailer):
+	# The keys of the catalog, the page tree's nodes and the pages
+	root_ref = trailer.raw_get(_KEY_ROOT)
+	obj_keys = set()
+	pending = [root_ref]
+
+	while len(pending) > 0:
+		reference = pending.pop()
+		obj_key = (reference.generation, reference.idnum)
+
+		if obj_key in obj_keys:
+			continue
+
+		obj_keys.add(obj_key)
+		node = objects.get(obj_key)
+
+		if not isinstance(node, DictionaryObject):
+			continue
+
+		children = node.raw_get(_KEY_PAGES) if reference is root_ref\
+			else node.get(_KEY_KIDS, ())
+		children = children if isinstance(children, ArrayObject)\
+			else (children,)
+		pending.extend(child for child in children
+			if isinstance(child, IndirectObject))
+
+	return obj_keys
+
+
+def _resolve_reachable_objects(reader):
+	"""
+	Makes the given reader parse every object that can be reached from its
+	trailer. Afterwards, the reader does not need its stream anymore.
+
+	Args:
+		reader (PyPDF2.PdfFileReader): a reader that has not parsed its
+			objects yet
+	"""
+	visited = set()
+	pending = [reader.trailer]
+
+	while len(pending) > 0:
+		pdf_object = pending.pop()
+
+		if isinstance(pdf_object, IndirectObject):
+			obj_key = (pdf_object.generation, pdf_object.idnum)
+
+			if obj_key not in visited:
+				visited.add(obj_key)
+				pending.append(pdf_object.getObject())
+
+		elif isinstance(pdf_object, DictionaryObject):
+			pending.extend(pdf_object.values())
+
+		elif isinstance(pdf_object, ArrayObject):
+			pending.extend(pdf_object)
+
+
+def _load_cached_snapshot(cache_path):
+	try:
+		with cache_path.open(mode="rb") as cache_stream:
+			return load(cache_stream)
+
+	except Exception:
+		# A missing, incomplete or unreadable cache file is ignored.
+		return None
+
+
+def _make_empty_reader():
+	# The reader is built without method read because it does not need the
+	# template file.
+	reader = PdfFileReader.__new__(PdfFileReader)
+	reader.strict = False
+	reader.flattenedPages = None
+	reader.xrefIndex = 0
+	reader._pageId2Num = None
+	reader._override_encryption = False
+	reader.stream = None
+	reader.xref = dict()
+	reader.xref_objStm = dict()
+	return reader
+
+
+@contextmanager
+def _map_file(file_path):
+	with file_path.open(mode="rb") as file_stream:
+		with mmap(file_stream.fileno(), 0, access=ACCESS_READ) as file_map:
+			yield file_map
+
+
+def _parse_snapshot(template_stream):
+	reader = PdfFileReader(template_stream, strict=False)
+	_resolve_reachable_objects(reader)
+
+	objects = {obj_key: _copy_pdf_object(pdf_object, None)
+		for obj_key, pdf_object in reader.resolvedObjects.items()}
+	trailer = _copy_pdf_object(reader.trailer, None)
+
+	# PyPDF2 does not keep the size of a document whose cross-reference
+	# section is a stream. The objects added to a copy of the template must
+	# not reuse the numbers of its unreachable objects.
+	idnums = [idnum for xref in reader.xref.values() for idnum in xref]
+	idnums.extend(reader.xref_objStm)
+	trailer[NameObject(_KEY_SIZE)] = NumberObject(max(
+		trailer.get(_KEY_SIZE, 0), max(idnums, default=0) + 1))
+
+	return objects, trailer
+
+
+def _save_snapshot(cache_path, snapshot):
+	temp_path = cache_path.with_name(cache_path.name + ".tmp")
+
+	try:
+		cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+		with temp_path.open(mode="wb") as cache_stream:
+			dump(snapshot, cache_stream, HIGHEST_PROTOCOL)
+
+		# The cache file appears complete or not at all.
+		temp_path.replace(cache_path)
+
+	except Exception:
+		# The cache is an optimization. Failing to write it is not an error.
+		if temp_path.exists():
+			temp_path.unlink()
+
+
+class ReportTemplate:
+	"""
+	This class contains a parsed PDF report template. It creates readers and
+	writers that hold an independent copy of the template's content.
+	"""
+
+	def __init__(self, template_path, cache_dir=DFLT_CACHE_DIR):
+		"""
+		The constructor loads the template's objects from the cache if the
+		cache contains them. Otherwise, it parses the whole template file and
+		saves the result in the cache. The file is not kept open.
+
+		Args:
+			template_path (pathlib.Path): the path to the report template
+			cache_dir (pathlib.Path): the directory that contains the cache
+				files. If it is None, the cache is not used. Defaults to
+				DFLT_CACHE_DIR.
+		"""
+		self._path = template_path
+		self._field_appearances = None
+		self._field_index = None
+		self._shared_reader = None
+		self._writer_skeletons = dict()
+		# The keys of the objects that filling a report can modify
+		self._writable_keys = None
+
+		with _map_file(template_path) as template_map:
+			self._content_hash = sha256(template_map).digest()
+
+			if cache_dir is None:
+				snapshot = _parse_snapshot(template_map)
+
+			else:
+				# The template's previous cache files are found through the
+				# hash of its path.
+				path_key = sha256(str(Path(template_path).resolve())\
+					.encode("utf8")).hexdigest()[:_PATH_KEY_LENGTH]
+				cache_key = sha256(self._content_hash
+					+ (_CACHE_FORMAT + _PYPDF2_VERSION).encode("utf8"))
+				cache_path = cache_dir/(path_key + _CACHE_NAME_SEPARATOR
+					+ cache_key.hexdigest() + _EXTENSION_CACHE)
+
+				snapshot = _load_cached_snapshot(cache_path)
+
+				if snapshot is None:
+					snapshot = _parse_snapshot(template_map)
+					_save_snapshot(cache_path, snapshot)
+					_delete_other_snapshots(cache_path, path_key)
+
+		self._objects, self._trailer = snapshot
+
+	@property
+	def content_hash(self):
+		"""
+		bytes: the SHA-256 hash of this template's file
+		"""
+		return self._content_hash
+
+	@property
+	def field_appearances(self):
+		"""
+		FieldAppearances: the maker of the appearance streams of this
+			template's fields. It keeps the metrics of the template's fonts.
+		"""
+		if self._field_appearances is None:
+			self._field_appearances = FieldAppearances()
+
+		return self._field_appearances
+
+	@property
+	def field_index(self):
+		"""
+		FieldIndex: the index of the fields of this template's first page. It
+			is built the first time that it is requested.
+		"""
+		if self._field_index is None:
+			self._field_index = FieldIndex(self.make_reader().getPage(0))
+
+		return self._field_index
+
+	def make_fill_reader(self):
+		"""
+		Creates a reader in which a report can be filled. Only the objects
+		that filling can modify are copied: the catalog, the page tree, the
+		pages and the form's objects. The other objects are shared by all the
+		readers made by this method and must not be modified.
+
+		Returns:
+			PyPDF2.PdfFileReader: a reader whose form is independent from the
+				other readers made by this template
+		"""
+		if self._shared_reader is None:
+			shared_reader = self.make_reader()
+			page_keys = [(page.indirectRef.generation, page.indirectRef.idnum)
+				for page in shared_reader.pages]
+			writable_keys = find_form_object_keys(
+				self._objects, self._trailer, page_keys)
+			writable_keys.update(
+				_find_page_tree_keys(self._objects, self._trailer))
+
+			# Threads that share this template can fill reports at the same
+			# time. The shared reader is set last since it signals that the
+			# keys are ready.
+			self._writable_keys = writable_keys
+			self._shared_reader = shared_reader
+
+		reader = _make_empty_reader()
+		reader.resolvedObjects = dict(self._shared_reader.resolvedObjects)
+
+		for obj_key in self._writable_keys:
+			reader.resolvedObjects[obj_key] = _copy_pdf_object(
+				self._objects[obj_key], reader)
+
+		reader.trailer = _copy_pdf_object(self._trailer, reader)
+		return reader
+
+	def make_reader(self):
+		"""
+		Creates a reader that contains a copy of this template. The template is
+		not parsed again.
+
+		Returns:
+			PyPDF2.PdfFileReader: a reader independent from the other readers
+				made by this template
+		"""
+		reader = _make_empty_reader()
+		reader.resolvedObjects = {
+			obj_key: _copy_pdf_object(pdf_object, reader)
+			for obj_key, pdf_object in self._objects.items()}
+		reader.trailer = _copy_pdf_object(self._trailer, reader)
+		return reader
+
+	def make_writer(self, editable):
+		"""
+		Creates a writer that contains a copy of this template. This method
+		calls function make_writer_from_reader from library PyPDF2_Fields.
+
+		Args:
+			editable (bool): If True, the fields in the file created by the
+				returned writer can be modified.
+
+		Returns:
+			PyPDF2.PdfFileWriter: a writer independent from the other writers
+				made by this template
+		"""
+		return make_writer_from_reader(self.make_reader(), editable)
+
+	def write_update(self, reader, output_stream):
+		"""
+		Writes this template's file unchanged followed by an incremental
+		update. The update contains the form objects of reader that differ
+		from this template's, namely the AcroForm dictionary, the fields and
+		their widgets, and the objects added to reader, like appearance
+		streams.
+
+		Args:
+			reader (PyPDF2.PdfFileReader): a reader made by method make_reader
+				or make_fill_reader whose fields were modified
+			output_stream: a binary stream where the document is written
+
+		Raises:
+			ValueError: if this template's file is encrypted or was modified
+				after this object was created
+		"""
+		page_keys = [(page.indirectRef.generation, page.indirectRef.idnum)
+			for page in reader.pages]
+		obj_keys = find_form_object_keys(
+			reader.resolvedObjects, reader.trailer, page_keys)
+		obj_keys.update(reader.resolvedObjects.keys() - self._objects.keys())
+		modified_objects = find_modified_objects(
+			self._objects, reader.resolvedObjects, obj_keys)
+
+		# The file is copied from a memory map rather than read in memory.
+		with _map_file(self._path) as template_map:
+			if sha256(template_map).digest() != self._content_hash:
+				raise ValueError("Template " + str(self._path)
+					+ " was modified after it was loaded.")
+
+			write_incremental_update(template_map, reader.trailer,
+				modified_objects, output_stream)
+
+	def writer_skeleton(self, editable):
+		"""
+		Provides the skeleton of the documents written from this template. It
+		is built the first time that it is requested.
+
+		Args:
+			editable (bool): If True, the fields in the documents written by
+				the skeleton can be modified.
+
+		Returns:
+			WriterSkeleton: the skeleton for argument editable
+		"""
+		skeleton = self._writer_skeletons.get(editable)
+
+		if skeleton is None:
+			from writer_skeleton import WriterSkeleton
+
+			skeleton = WriterSkeleton(self.make_reader(), editable)
+			self._writer_skeletons[editable] = skeleton
+
+		return skeleton
+
+	@property
+	def path(self):
+		"""
+		pathlib.Path: the path to this template's file
+		"""
+		return self._path
@@ -0,0 +1,225 @@
+"""
+This module measures the stages of the scripts in this repository. A stage is
+a block of code enclosed in the context returned by function timed_stage. The
+wall time, the CPU time and the net number of memory blocks allocated by each
+stage are recorded only while the timings are enabled. Otherwise, function
+timed_stage returns an inert context that costs nothing.
+
+The scripts enable the timings with argument --timings and save a cProfile
+dump of the run with argument --profile.
+"""
+
+
+from contextlib import contextmanager, nullcontext
+from json import dumps
+from pathlib import Path
+from sys import getallocatedblocks
+from time import perf_counter, process_time
+
+
+TIMINGS_JSON = "json"
+TIMINGS_TABLE = "table"
+
+_INERT_CONTEXT = nullcontext()
+
+# The recorder of the stages while the timings are enabled
+_recorder = None
+
+
+class StageRecorder:
+	"""
+	This class accumulates the measures of stages. The measures of the stages
+	that bear the same name are added up.
+	"""
+
+	def __init__(self):
+		self._records = dict()
+
+	def format_table(self):
+		"""
+		Makes a table of the recorded measures.
+
+		Returns:
+			str: a table that has one line per stage
+		"""
+		lines = ["{:<22}{:>7}{:>12}{:>12}{:>12}".format(
+			"Stage", "Calls", "Wall (ms)", "CPU (ms)", "Blocks")]
+
+		for name, record in self._records.items():
+			lines.append("{:<22}{:>7}{:>12.3f}{:>12.3f}{:>12}".format(name,
+				record["calls"], record["wall_s"] * 1000,
+				record["cpu_s"] * 1000, record["allocated_blocks"]))
+
+		return "\n".join(lines)
+
+	def merge(self, records):
+		"""
+		Adds measures recorded elsewhere, for instance in another process, to
+		this recorder's.
+
+		Args:
+			records (dict): the value of property records of another recorder
+		"""
+		for name, record in records.items():
+			self._add(name, record["calls"], record["wall_s"],
+				record["cpu_s"], record["allocated_blocks"])
+
+	@property
+	def records(self):
+		"""
+		dict: It maps stage names to a dictionary of measures: the number of
+			calls, the wall and CPU times in seconds and the net number of
+			allocated memory blocks.
+		"""
+		return self._records
+
+	@contextmanager
+	def stage(self, name):
+		"""
+		Measures the code executed in the returned context.
+
+		Args:
+			name (str): the stage's name
+		"""
+		start_blocks = getallocatedblocks()
+		start_cpu = process_time()
+		start_wall = perf_counter()
+
+		try:
+			yield
+
+		finally:
+			self._add(name, 1, perf_counter() - start_wall,
+				process_time() - start_cpu,
+				getallocatedblocks() - start_blocks)
+
+	def _add(self, name, calls, wall_s, cpu_s, allocated_blocks):
+		record = self._records.get(name)
+
+		if record is None:
+			record = {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+				"allocated_blocks": 0}
+			self._records[name] = record
+
+		record["calls"] += calls
+		record["wall_s"] += wall_s
+		record["cpu_s"] += cpu_s
+		record["allocated_blocks"] += allocated_blocks
+
+
+def add_instrumentation_args(parser):
+	"""
+	Adds arguments --timings and --profile to a script's argument parser.
+
+	Args:
+		parser (argparse.ArgumentParser): the parser of a script
+	"""
+	parser.add_argument("--timings", nargs="?", default=None,
+		const=TIMINGS_TABLE, choices=(TIMINGS_JSON, TIMINGS_TABLE),
+		help="Prints the duration of each stage of the run in a table or in JSON. It defaults to table.")
+
+	parser.add_argument("--profile", type=Path, default=None,
+		help="Path to a file where a cProfile dump of the run is saved. Module pstats can read it.")
+
+
+def enable_timings():
+	"""
+	Makes function timed_stage record the stages in a new recorder.
+
+	Returns:
+		StageRecorder: the recorder
+	"""
+	global _recorder
+	_recorder = StageRecorder()
+	return _recorder
+
+
+@contextmanager
+def instrumented_run(timings_format, profile_path):
+	"""
+	Enables the instrumentation requested by arguments --timings and
+	--profile in the returned context. When the context ends, the timings are
+	printed and the profile is saved, even if the script exits early.
+
+	Args:
+		timings_format (str): TIMINGS_JSON, TIMINGS_TABLE or None to disable
+			the timings
+		profile_path (pathlib.Path): the path to the profile dump. If it is
+			None, the run is not profiled.
+	"""
+	global _recorder
+	recorder = None if timings_format is None else enable_timings()
+	profiler = None
+
+	if profile_path is not None:
+		from cProfile import Profile
+		profiler = Profile()
+		profiler.enable()
+
+	try:
+		yield
+
+	finally:
+		if profiler is not None:
+			profiler.disable()
+			profiler.dump_stats(str(profile_path))
+
+		if recorder is not None:
+			_recorder = None
+
+			if timings_format == TIMINGS_JSON:
+				print(dumps(recorder.records, indent=2))
+			else:
+				print(recorder.format_table())
+
+
+def pop_stage_records():
+	"""
+	Provides the measures recorded so far and clears them.
+
+	Returns:
+		dict: the records of the enabled recorder or None if the timings are
+			disabled
+	"""
+	if _recorder is None:
+		return None
+
+	records = dict(_recorder.records)
+	_recorder.records.clear()
+	return records
+
+
+def record_stages(records):
+	"""
+	Adds measures recorded in another process to the enabled recorder. Nothing
+	happens if the timings are disabled or records is None.
+
+	Args:
+		records (dict): measures returned by function pop_stage_records
+	"""
+	if _recorder is not None and records is not None:
+		_recorder.merge(records)
+
+
+def timed_stage(name):
+	"""
+	Provides a context that measures a stage if the timings are enabled.
+
+	Args:
+		name (str): the stage's name
+
+	Returns:
+		a context manager
+	"""
+	if _recorder is None:
+		return _INERT_CONTEXT
+
+	return _recorder.stage(name)
+
+
+def timings_enabled():
+	"""
+	Returns:
+		bool: True if the stages are recorded, False otherwise
+	"""
+	return _recorder is not None
@@ -0,0 +1,46 @@
+"""
+This module tests function split_yaml_documents of module
+field_setting_parser. Run it with python -m unittest.
+"""
+
+
+from io import StringIO
+from unittest import TestCase, main
+
+from field_setting_parser import load_yaml_content, split_yaml_documents
+
+
+def _load_documents(yaml_text):
+	return [load_yaml_content(document)
+		for document in split_yaml_documents(StringIO(yaml_text))]
+
+
+class SplitYamlDocumentsTest(TestCase):
+	"""
+	This class verifies that split_yaml_documents provides the documents that
+	PyYAML's function load_all would read.
+	"""
+
+	def test_directives(self):
+		yaml_text = "# Rapports\n%YAML 1.1\n%TAG !e! tag:example.com,2000:\n"\
+			+ "---\nnom: A\n...\n%YAML 1.1\n---\nnom: B\n"
+		self.assertEqual(_load_documents(yaml_text),
+			[{"nom": "A"}, {"nom": "B"}])
+
+	def test_directive_after_document(self):
+		yaml_text = "nom: A\n%YAML 1.1\n--- \nnom: B\n"
+		self.assertEqual(_load_documents(yaml_text),
+			[{"nom": "A"}, {"nom": "B"}])
+
+	def test_implicit_first_document(self):
+		yaml_text = "nom: A\n---\nnom: B\n"
+		self.assertEqual(_load_documents(yaml_text),
+			[{"nom": "A"}, {"nom": "B"}])
+
+	def test_leading_comments(self):
+		yaml_text = "# Rapports\n\n---\nnom: A\n"
+		self.assertEqual(_load_documents(yaml_text), [{"nom": "A"}])
+
+
+if __name__ == "__main__":
+	main()
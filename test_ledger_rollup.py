@@ -0,0 +1,64 @@
+"""
+This module tests the reading and the rollup of script ledger_rollup. Run it
+with python -m unittest.
+"""
+
+
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from ledger_rollup import LedgerColumns, read_ledger_file
+
+
+_YAML_TEXT = """Date: {date}
+Codes comptables:
+  - UBR: 111111
+    Montant: 12.5
+"""
+
+
+def _read_ledger(report_dates):
+	ledger = LedgerColumns()
+	results = list()
+
+	with TemporaryDirectory() as temp_dir:
+		yml_path = Path(temp_dir)/"rapports.yml"
+		yml_path.write_text("---\n".join(_YAML_TEXT.format(date=report_date)
+			for report_date in report_dates), encoding="utf8")
+
+		for report_name, report_date, code_lines, error_msg\
+				in read_ledger_file(yml_path):
+			results.append((report_date, error_msg))
+			ledger.add_lines(report_date, code_lines)
+
+	return ledger, results
+
+
+class ReportDateTest(TestCase):
+	"""
+	This class verifies that a report whose date is not in ISO format is
+	counted unless the reports are filtered by date.
+	"""
+
+	def test_non_iso_date_is_read(self):
+		_, results = _read_ledger(("2021-03-01", "1er mars 2021"))
+		self.assertEqual(results,
+			[(date(2021, 3, 1), None), (None, None)])
+
+	def test_non_iso_date_without_filter(self):
+		ledger, _ = _read_ledger(("2021-03-01", "1er mars 2021"))
+		self.assertEqual(ledger.roll_up(("UBR",), None, None),
+			[(("111111",), 2, Decimal("25.0"))])
+
+	def test_non_iso_date_with_filter(self):
+		ledger, _ = _read_ledger(("2021-03-01", "1er mars 2021"))
+		self.assertEqual(
+			ledger.roll_up(("UBR",), date(2021, 1, 1), date(2021, 12, 31)),
+			[(("111111",), 1, Decimal("12.5"))])
+
+
+if __name__ == "__main__":
+	main()
@@ -5,16 +5,17 @@ in them. The original file is not modified.
 Args:
 	1: the path to the input PDF file
 	2: (optional) the path to the output PDF file
+	--timings, --profile: (optional) see module stage_timings
 """
 
 
+from argparse import ArgumentParser
 from path_arg_checks import check_io_path_pair
 from pathlib import Path
-from PyPDF2 import PdfFileReader
-from PyPDF2_Fields import\
-	make_writer_from_reader,\
-	set_need_appearances
-from sys import argv
+from stage_timings import\
+	add_instrumentation_args,\
+	instrumented_run,\
+	timed_stage
 
 
 _EXTENSION_PDF = ".pdf"
@@ -34,28 +35,36 @@ def make_field_name_list(pdf_reader):
 
 	return name_list
 
-try:
-	input_path = Path(argv[1])
-except IndexError:
-	input_path = None
-
-try:
-	output_path = Path(argv[2])
-except IndexError:
-	output_path = None
-
-output_path = check_io_path_pair(
-	input_path, "Input file", _EXTENSION_PDF,
-	output_path, "Output file", _EXTENSION_PDF,
-	"_field_names")
-
-reader = PdfFileReader(input_path.open(mode="rb"))
-writer = make_writer_from_reader(reader, False)
-
-field_list = make_field_name_list(reader)
-field_update = dict(zip(field_list, field_list))
-
-page = reader.getPage(0)
-writer.updatePageFormFieldValues(page, field_update)
-set_need_appearances(writer, True) # To make field values visible
-writer.write(output_path.open(mode="wb"))
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("input", type=Path, nargs="?", default=None)
+parser.add_argument("output", type=Path, nargs="?", default=None)
+add_instrumentation_args(parser)
+args = parser.parse_args()
+
+with instrumented_run(args.timings, args.profile):
+	with timed_stage("path_checks"):
+		output_path = check_io_path_pair(
+			args.input, "Input file", _EXTENSION_PDF,
+			args.output, "Output file", _EXTENSION_PDF,
+			"_field_names")
+
+	# The PDF libraries are imported once the paths are known to be valid.
+	from PyPDF2_Fields import make_writer_from_reader, set_need_appearances
+	from report_template import ReportTemplate
+
+	with timed_stage("template_load"):
+		# The input is not the report template, so it is not cached.
+		template = ReportTemplate(args.input, cache_dir=None)
+		reader = template.make_reader()
+		writer = make_writer_from_reader(reader, False)
+
+	with timed_stage("field_update"):
+		field_list = make_field_name_list(reader)
+		field_update = dict(zip(field_list, field_list))
+
+		template.field_index.update_fields(reader, field_update)
+		set_need_appearances(writer, True) # To make field values visible
+
+	with timed_stage("writing"):
+		with output_path.open(mode="wb") as output_stream:
+			writer.write(output_stream)
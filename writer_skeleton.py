@@ -0,0 +1,294 @@
+"""
+This module writes filled reports without making a PyPDF2 writer for each
+report. A writer is made once from a copy of the template, and the objects
+that it would write are serialized once. This skeleton is then shared by every
+report written from the template.
+
+A report's document is the skeleton in which only the objects that filling
+modified are serialized again: the fields, their widgets and the new
+appearance streams. The pages' resources, content streams and images are never
+copied nor serialized again. The skeleton refers to the template's stream data
+rather than copying it, so the data is held once in memory however many
+reports are written. The skeleton's objects that the report's objects no
+longer reach, like replaced appearance streams, are left out. The readers
+filled for the skeleton should therefore be made by method
+ReportTemplate.make_fill_reader, which copies only the objects that filling
+modifies.
+"""
+
+
+from io import BytesIO
+
+from incremental_update import\
+	find_form_object_keys,\
+	find_references,\
+	remap_references,\
+	serialize_object
+from PyPDF2.generic import\
+	BooleanObject,\
+	DictionaryObject,\
+	IndirectObject,\
+	NameObject,\
+	NullObject,\
+	NumberObject,\
+	StreamObject
+from PyPDF2.pdf import PageObject
+from PyPDF2_Fields import make_writer_from_reader, set_need_appearances
+
+
+_KEY_ACROFORM = "/AcroForm"
+_KEY_ID = "/ID"
+_KEY_INFO = "/Info"
+_KEY_NEED_APPEARANCES = "/NeedAppearances"
+_KEY_ROOT = "/Root"
+_KEY_SIZE = "/Size"
+
+
+def _find_reachable_numbers(root_numbers, get_references):
+	reachable_numbers = set(root_numbers)
+	pending = list(root_numbers)
+
+	while len(pending) > 0:
+		for number in get_references(pending.pop()):
+			if number not in reachable_numbers:
+				reachable_numbers.add(number)
+				pending.append(number)
+
+	return reachable_numbers
+
+
+def _find_reference_numbers(pdf_object):
+	return [reference.idnum for reference in find_references(pdf_object)]
+
+
+def _make_object_data(number, obj_data):
+	return b"%d 0 obj\n" % number + obj_data + b"\nendobj\n"
+
+
+def _make_object_pieces(number, pdf_object):
+	obj_data = _make_object_data(number, serialize_object(pdf_object))
+
+	if not isinstance(pdf_object, StreamObject):
+		return (obj_data,)
+
+	# The stream's data is shared with the template's object. Only the
+	# dictionary and the keywords around the data are kept.
+	stream_data = pdf_object._data
+	data_end = obj_data.rindex(b"\nendstream")
+	return (obj_data[:data_end-len(stream_data)], stream_data,
+		obj_data[data_end:])
+
+
+def _map_object_numbers(reader, writer):
+	"""
+	Finds the number that a writer gave to each of a reader's objects. The
+	writer must have written its document, which made it number the objects.
+
+	Args:
+		reader (PyPDF2.PdfFileReader): the reader from which writer was made
+		writer (PyPDF2.PdfFileWriter): a writer made from reader's objects
+
+	Returns:
+		dict: It maps the keys (generation, idnum) of reader's objects to
+			their number in the writer's document. The objects that the writer
+			did not write are absent.
+	"""
+	# The writer keeps the reader's objects, except the pages, which are
+	# copies that know the key of the original.
+	writer_numbers = dict()
+	obj_numbers = dict()
+
+	for number, pdf_object in enumerate(writer._objects, 1):
+		writer_numbers[id(pdf_object)] = number
+
+		if isinstance(pdf_object, PageObject)\
+				and pdf_object.indirectRef is not None:
+			page_ref = pdf_object.indirectRef
+			obj_numbers[(page_ref.generation, page_ref.idnum)] = number
+
+	for obj_key, pdf_object in reader.resolvedObjects.items():
+		number = writer_numbers.get(id(pdf_object))
+
+		if number is not None:
+			obj_numbers.setdefault(obj_key, number)
+
+	return obj_numbers
+
+
+class WriterSkeleton:
+	"""
+	This class writes the documents of filled reports made from the same
+	template. The template's objects are serialized once, when the skeleton
+	is created, in the layout that a PyPDF2 writer gives them.
+	"""
+
+	def __init__(self, reader, editable):
+		"""
+		The constructor makes a writer from the given reader as function
+		make_writer_from_reader of library PyPDF2_Fields does and serializes
+		the writer's objects.
+
+		Args:
+			reader (PyPDF2.PdfFileReader): a reader made by method
+				ReportTemplate.make_reader. The skeleton modifies its objects,
+				so it must not be used afterwards.
+			editable (bool): If True, the fields in the written documents can
+				be modified.
+		"""
+		page_keys = [(page.indirectRef.generation, page.indirectRef.idnum)
+			for page in reader.pages]
+		form_keys = find_form_object_keys(
+			reader.resolvedObjects, reader.trailer, page_keys)
+
+		# It maps the keys of the form's objects to their serialized form in
+		# the template. Filled reports whose objects differ are rewritten.
+		self._form_data = {obj_key: serialize_object(
+				reader.resolvedObjects[obj_key])
+			for obj_key in form_keys if obj_key in reader.resolvedObjects}
+
+		writer = make_writer_from_reader(reader, editable)
+
+		# This function adds the AcroForm dictionary to an editable writer.
+		# The object that receives /NeedAppearances is thus known only after.
+		set_need_appearances(writer, False)
+		need_appearances_object\
+			= writer._root_object[_KEY_ACROFORM].getObject()
+
+		# Writing the document makes the writer number the objects that it
+		# reaches and replace the references to the reader's objects.
+		writer.write(BytesIO())
+
+		self._header = writer._header + b"\n"
+		self._obj_numbers = _map_object_numbers(reader, writer)
+		self._root_ref = IndirectObject(writer._root.idnum, 0, None)
+		self._info_ref = IndirectObject(writer._info.idnum, 0, None)
+
+		# Each object is a tuple of the pieces of its serialized form.
+		self._obj_pieces = [_make_object_pieces(number, pdf_object)
+			for number, pdf_object in enumerate(writer._objects, 1)]
+		self._references = [_find_reference_numbers(pdf_object)
+			for pdf_object in writer._objects]
+
+		self._need_appearances_number = next(number
+			for number, pdf_object in enumerate(writer._objects, 1)
+			if pdf_object is need_appearances_object)
+
+		# The two versions of the object that receives /NeedAppearances
+		self._need_appearances_pieces = dict()
+
+		for bool_val in (False, True):
+			need_appearances_object[NameObject(_KEY_NEED_APPEARANCES)]\
+				= BooleanObject(bool_val)
+			self._need_appearances_pieces[bool_val] = _make_object_pieces(
+				self._need_appearances_number, need_appearances_object)
+
+	def _find_rewritten_objects(self, reader):
+		objects = reader.resolvedObjects
+		obj_numbers = dict(self._obj_numbers)
+		next_number = len(self._obj_pieces) + 1
+		pending = [obj_key for obj_key, obj_data in self._form_data.items()
+			if obj_key in obj_numbers and obj_key in objects
+			and serialize_object(objects[obj_key]) != obj_data]
+
+		def get_number(obj_key):
+			nonlocal next_number
+			number = obj_numbers.get(obj_key)
+
+			if number is None:
+				# An object added to the report, like an appearance stream,
+				# or one that the template's document did not reach
+				number = next_number
+				next_number += 1
+				obj_numbers[obj_key] = number
+				pending.append(obj_key)
+
+			return number
+
+		rewritten_objects = dict()
+
+		while len(pending) > 0:
+			obj_key = pending.pop()
+			pdf_object = objects.get(obj_key)
+			rewritten_objects[obj_numbers[obj_key]] = remap_references(
+				NullObject() if pdf_object is None else pdf_object,
+				get_number)
+
+		return rewritten_objects, next_number
+
+	def write(self, reader, need_appearances, document_id, output_stream):
+		"""
+		Writes the document of a filled report. The objects that filling did
+		not modify are copied from the skeleton.
+
+		Args:
+			reader (PyPDF2.PdfFileReader): a reader made from the skeleton's
+				template and filled
+			need_appearances (bool): the value of the AcroForm's entry
+				/NeedAppearances, which makes viewers create the fields'
+				appearances
+			document_id (PyPDF2.generic.ArrayObject): the document's
+				identifier, written in the trailer. If it is None, the document
+				does not have an identifier.
+			output_stream: a binary stream where the document is written
+		"""
+		rewritten_objects, size = self._find_rewritten_objects(reader)
+
+		def get_references(number):
+			pdf_object = rewritten_objects.get(number)
+			return self._references[number - 1] if pdf_object is None\
+				else _find_reference_numbers(pdf_object)
+
+		reachable_numbers = _find_reachable_numbers(
+			(self._root_ref.idnum, self._info_ref.idnum), get_references)
+
+		need_appearances_object\
+			= rewritten_objects.get(self._need_appearances_number)
+		if need_appearances_object is not None:
+			need_appearances_object[NameObject(_KEY_NEED_APPEARANCES)]\
+				= BooleanObject(need_appearances)
+
+		output_stream.write(self._header)
+		offset = len(self._header)
+		# The unreachable objects are free entries of the cross-reference
+		# table. Each free entry holds the number of the next one.
+		xref_entries = [None]
+		free_numbers = [0]
+
+		for number in range(1, size):
+			pdf_object = rewritten_objects.get(number)
+
+			if number not in reachable_numbers:
+				xref_entries.append(None)
+				free_numbers.append(number)
+				continue
+
+			if pdf_object is not None:
+				obj_pieces = _make_object_pieces(number, pdf_object)
+			elif number == self._need_appearances_number:
+				obj_pieces = self._need_appearances_pieces[need_appearances]
+			else:
+				obj_pieces = self._obj_pieces[number - 1]
+
+			xref_entries.append(b"%010d 00000 n \n" % offset)
+
+			for obj_piece in obj_pieces:
+				output_stream.write(obj_piece)
+				offset += len(obj_piece)
+
+		free_numbers.append(0)
+
+		for free_number, next_free_number in zip(
+				free_numbers, free_numbers[1:]):
+			xref_entries[free_number] = b"%010d %05d f \n" % (
+				next_free_number, 65535 if free_number == 0 else 1)
+
+		trailer = DictionaryObject()
+		trailer[NameObject(_KEY_SIZE)] = NumberObject(size)
+		trailer[NameObject(_KEY_ROOT)] = self._root_ref
+		trailer[NameObject(_KEY_INFO)] = self._info_ref
+		if document_id is not None:
+			trailer[NameObject(_KEY_ID)] = document_id
+
+		output_stream.write(b"xref\n0 %d\n" % size + b"".join(xref_entries)
+			+ b"trailer\n" + serialize_object(trailer)
+			+ b"\nstartxref\n%d\n%%%%EOF\n" % offset)